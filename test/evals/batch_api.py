@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+OpenAI Batch API helpers for full-dataset runs
+
+Writes one JSONL request per case, uploads it through /files, creates a
+/batches job, polls it until it finishes and maps the output lines back to
+their custom_id. Batch jobs run within a 24h window at lower cost and do not
+count against the synchronous rate limits.
+"""
+
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+from http_client import EvalHttpClient
+
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+DEFAULT_POLL_INTERVAL = 30.0
+
+
+def build_batch_jsonl(requests: List[Tuple[str, Dict]], endpoint: str) -> bytes:
+    """One Batch API request line per (custom_id, body)"""
+    lines = [
+        json.dumps({"custom_id": custom_id, "method": "POST", "url": endpoint, "body": body})
+        for custom_id, body in requests
+    ]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def submit_batch(client: EvalHttpClient, requests: List[Tuple[str, Dict]], endpoint: str,
+                 metadata: Optional[Dict[str, str]] = None) -> Dict:
+    """Upload the requests file and create the batch job"""
+    content = build_batch_jsonl(requests, endpoint)
+    response = client.post(
+        "/files",
+        files={"file": ("eval_batch_input.jsonl", content, "application/jsonl")},
+        data={"purpose": "batch"}
+    )
+    if response.status_code not in [200, 201]:
+        raise RuntimeError(f"Batch file upload failed: {response.status_code} {response.text[:200]}")
+    input_file_id = response.json()["id"]
+    print(f"✓ Uploaded batch input file {input_file_id} ({len(requests)} requests, {len(content)/1024:.1f} KB)")
+
+    response = client.post("/batches", json={
+        "input_file_id": input_file_id,
+        "endpoint": endpoint,
+        "completion_window": "24h",
+        "metadata": metadata or {},
+    })
+    if response.status_code not in [200, 201]:
+        raise RuntimeError(f"Batch creation failed: {response.status_code} {response.text[:200]}")
+    batch = response.json()
+    print(f"✓ Created batch {batch['id']}")
+    return batch
+
+
+def wait_for_batch(client: EvalHttpClient, batch_id: str,
+                   poll_interval: float = DEFAULT_POLL_INTERVAL) -> Dict:
+    """Poll the batch until it reaches a terminal status"""
+    started = time.time()
+    last_status = None
+    while True:
+        response = client.get(f"/batches/{batch_id}")
+        if response.status_code != 200:
+            raise RuntimeError(f"Batch status check failed: {response.status_code} {response.text[:200]}")
+        batch = response.json()
+        counts = batch.get("request_counts") or {}
+        status = batch["status"]
+        if status != last_status or status == "in_progress":
+            print(f"  Batch {batch_id}: {status} "
+                  f"({counts.get('completed', 0)}/{counts.get('total', 0)} done, "
+                  f"{counts.get('failed', 0)} failed, {(time.time() - started)/60:.1f} min)")
+            last_status = status
+        if status in TERMINAL_STATUSES:
+            return batch
+        time.sleep(poll_interval)
+
+
+def download_results(client: EvalHttpClient, batch: Dict) -> Dict[str, Dict]:
+    """Map custom_id to {"status_code", "body", "error"} from the output and error files"""
+    results: Dict[str, Dict] = {}
+    for file_key in ("output_file_id", "error_file_id"):
+        file_id = batch.get(file_key)
+        if not file_id:
+            continue
+        response = client.get(f"/files/{file_id}/content")
+        if response.status_code != 200:
+            raise RuntimeError(f"Batch result download failed: {response.status_code} {response.text[:200]}")
+        for line in response.text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            result = record.get("response") or {}
+            results[record["custom_id"]] = {
+                "status_code": result.get("status_code"),
+                "body": result.get("body"),
+                "error": record.get("error"),
+            }
+    return results
+
+
+def run_batch(client: EvalHttpClient, requests: List[Tuple[str, Dict]], endpoint: str,
+              poll_interval: float = DEFAULT_POLL_INTERVAL,
+              metadata: Optional[Dict[str, str]] = None,
+              batch_id: Optional[str] = None) -> Dict[str, Dict]:
+    """Submit (or resume `batch_id`), wait and return results by custom_id"""
+    if batch_id is None:
+        batch_id = submit_batch(client, requests, endpoint, metadata)["id"]
+    else:
+        print(f"Resuming batch {batch_id}")
+    batch = wait_for_batch(client, batch_id, poll_interval)
+    if batch["status"] != "completed":
+        print(f"⚠️  Batch {batch_id} ended with status {batch['status']}: {batch.get('errors')}")
+    return download_results(client, batch)
+
+
+def add_batch_arguments(parser) -> None:
+    """Add the shared Batch API options to an argparse parser"""
+    parser.add_argument("--batch", action="store_true",
+                        help="submit the whole dataset as one Batch API job instead of live requests")
+    parser.add_argument("--batch-poll-interval", type=float, default=DEFAULT_POLL_INTERVAL, metavar="SECONDS",
+                        help=f"seconds between batch status checks (default: {DEFAULT_POLL_INTERVAL:.0f})")
+    parser.add_argument("--batch-id", default=None,
+                        help="resume polling an already submitted batch instead of creating one")
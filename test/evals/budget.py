@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Wall-clock and dollar budgets for partial eval runs
+
+With --budget-seconds and/or --budget-usd a runner evaluates only as many
+cases as the budget covers. The number comes from the model's latency
+history (.cache/latency_history.json): mean seconds per request spread over
+the concurrency, and mean cost per request from recorded token usage.
+Without history a request is assumed to take 5 seconds, and its cost is
+estimated from the prompt length at the model's price.
+
+The cases are a stratified random sample. Almost every test_type in the
+dataset is unique, so cases are grouped by test-type family instead: a
+test_type that repeats, else the longest prefix shared with another type
+(modal_verb_must and modal_verb_should are both modal_verb), else "other".
+Each family gets its proportional share, and at least one case when the
+budget allows. The sample runs round-robin across the families, in an order
+drawn from the budget's seed, so a time budget that runs out early still
+leaves every family it reached with a share. The pass rate is estimated as
+the size-weighted mean of the family pass rates. Its 95% interval comes
+from the stratified standard error with a finite population correction, so
+a run that covers everything has no uncertainty left.
+"""
+
+import math
+import random
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+from pricing import MODEL_PRICES
+from timeout_policy import TimeoutPolicy
+
+DEFAULT_CASE_SECONDS = 5.0
+# Cost fallback without usage history: ~4 characters per input token, and
+# room for reasoning tokens in the output
+CHARS_PER_TOKEN = 4
+FALLBACK_OUTPUT_TOKENS = 500
+Z_95 = 1.96
+
+
+def _prefixes(test_type: str) -> List[str]:
+    """Proper underscore prefixes of a test_type, longest first"""
+    parts = test_type.split("_")
+    return ["_".join(parts[:n]) for n in range(len(parts) - 1, 0, -1)]
+
+
+def test_type_families(test_types: Sequence[str]) -> List[str]:
+    """Stratum of each case: its test_type if repeated, else the longest shared prefix, else "other\""""
+    counts = Counter(test_types)
+    types_with_prefix = Counter(prefix for test_type in counts for prefix in _prefixes(test_type))
+    families = []
+    for test_type in test_types:
+        if counts[test_type] > 1:
+            families.append(test_type)
+            continue
+        shared = [prefix for prefix in _prefixes(test_type) if types_with_prefix[prefix] > 1]
+        families.append(shared[0] if shared else "other")
+    return families
+
+
+def allocate(available: Dict[str, int], n: int, rng: random.Random) -> Dict[str, int]:
+    """Cases to draw per stratum: proportional to what's available, at least one each when n allows"""
+    if n >= sum(available.values()):
+        return dict(available)
+    strata = sorted(stratum for stratum, size in available.items() if size)
+    if n < len(strata):
+        chosen = set(rng.sample(strata, n))
+        return {stratum: int(stratum in chosen) for stratum in available}
+    counts = {stratum: int(stratum in strata) for stratum in available}
+    spare = n - len(strata)
+    rest = sum(available[stratum] - 1 for stratum in strata)
+    quotas = {stratum: spare * (available[stratum] - 1) / rest for stratum in strata}
+    for stratum, quota in quotas.items():
+        counts[stratum] += int(quota)
+    # Largest remainders take the cases left over from rounding down
+    leftover = n - sum(counts.values())
+    for stratum in sorted(strata, key=lambda s: quotas[s] - int(quotas[s]), reverse=True)[:leftover]:
+        counts[stratum] += 1
+    return counts
+
+
+def fallback_cost(model: str, prompt_chars: float) -> Optional[float]:
+    """Rough cost of one request from its length, for a model without usage history"""
+    if model not in MODEL_PRICES:
+        return None
+    input_price, output_price = MODEL_PRICES[model]
+    return (prompt_chars / CHARS_PER_TOKEN * input_price + FALLBACK_OUTPUT_TOKENS * output_price) / 1_000_000
+
+
+class RunBudget:
+    """Sizes a stratified subset of the dataset to a time/dollar budget and estimates its pass rate"""
+
+    def __init__(self, seconds: Optional[float] = None, usd: Optional[float] = None,
+                 seed: Optional[int] = None):
+        self.seconds = seconds
+        self.usd = usd
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.families: List[str] = []
+        self.seconds_per_case: Optional[float] = None
+        self.cost_per_case: Optional[float] = None
+        self.affordable: Dict[str, int] = {}
+        self.selected = 0
+        self.deadline: Optional[float] = None
+
+    @classmethod
+    def from_args(cls, args) -> Optional["RunBudget"]:
+        """Budget for --budget-seconds/--budget-usd, or None when neither is given"""
+        if args.budget_seconds is None and args.budget_usd is None:
+            return None
+        return cls(args.budget_seconds, args.budget_usd, args.budget_seed)
+
+    def plan(self, model: str, test_cases: Sequence[Dict], pending: Sequence[int], system_prompt: str,
+             timeouts: TimeoutPolicy, concurrency: int) -> List[int]:
+        """Indices of the pending cases to run, round-robin across test-type families
+
+        Cases that already have an outcome (resumed from a journal) count
+        towards their family's sample without costing anything. Call start()
+        when the cases start running.
+        """
+        self.families = test_type_families([test["item"].get("test_type", "unknown") for test in test_cases])
+        latency = timeouts.mean_latency(model)
+        self.seconds_per_case = latency if latency is not None else DEFAULT_CASE_SECONDS
+        self.cost_per_case = timeouts.mean_cost(model)
+        if self.cost_per_case is None and pending:
+            prompt_chars = len(system_prompt) + sum(len(test_cases[index]["item"]["input_text"])
+                                                    for index in pending) / len(pending)
+            self.cost_per_case = fallback_cost(model, prompt_chars)
+
+        n = len(pending)
+        if self.seconds is not None:
+            self.affordable["seconds"] = int(self.seconds * concurrency / self.seconds_per_case)
+            n = min(n, self.affordable["seconds"])
+        if self.usd is not None:
+            if self.cost_per_case:
+                self.affordable["usd"] = int(self.usd / self.cost_per_case)
+                n = min(n, self.affordable["usd"])
+            else:
+                print(f"⚠️  No price or usage history for {model}; --budget-usd is ignored")
+
+        by_family: Dict[str, List[int]] = {}
+        for index in pending:
+            by_family.setdefault(self.families[index], []).append(index)
+        counts = allocate({family: len(indices) for family, indices in by_family.items()}, n, self.rng)
+        samples = [self.rng.sample(indices, counts[family]) for family, indices in sorted(by_family.items())]
+        self.rng.shuffle(samples)
+        # One case from each family in turn, so every prefix stays stratified
+        selected = [sample[turn] for turn in range(max(map(len, samples), default=0))
+                    for sample in samples if turn < len(sample)]
+        self.selected = len(selected)
+        return selected
+
+    def start(self) -> None:
+        """Start the wall-clock budget"""
+        if self.seconds is not None:
+            self.deadline = time.time() + self.seconds
+
+    def expired(self) -> bool:
+        """True once the wall-clock budget is used up (cases in flight still finish)"""
+        return self.deadline is not None and time.time() >= self.deadline
+
+    def estimate(self, passed: Sequence[Optional[bool]]) -> Dict:
+        """Stratified pass-rate estimate (percent) with a 95% interval; passed[i] is None if case i didn't run"""
+        sizes = Counter(self.families)
+        covered = 0
+        sampled = 0
+        weighted = 0.0
+        variance = 0.0
+        evaluated = 0
+        for family, size in sizes.items():
+            results = [result for label, result in zip(self.families, passed)
+                       if label == family and result is not None]
+            if not results:
+                continue
+            n = len(results)
+            evaluated += n
+            sampled += 1
+            covered += size
+            weighted += size * sum(results) / n
+            # Smoothed rate so an all-pass or all-fail family still has some spread
+            rate = (sum(results) + 1) / (n + 2)
+            variance += size ** 2 * rate * (1 - rate) / n * (1 - n / size)
+        if not covered:
+            return {"evaluated": 0, "pass_rate": None}
+        pass_rate = weighted / covered * 100
+        standard_error = math.sqrt(variance) / covered * 100
+        return {
+            "evaluated": evaluated,
+            "population": covered,
+            "families_sampled": sampled,
+            "families": len(sizes),
+            "pass_rate": round(pass_rate, 1),
+            "standard_error": round(standard_error, 1),
+            "ci_low": round(max(0.0, pass_rate - Z_95 * standard_error), 1),
+            "ci_high": round(min(100.0, pass_rate + Z_95 * standard_error), 1),
+        }
+
+    def summary(self, passed: Sequence[Optional[bool]]) -> Dict:
+        return {
+            "budget_seconds": self.seconds,
+            "budget_usd": self.usd,
+            "seed": self.seed,
+            "seconds_per_case": round(self.seconds_per_case, 2) if self.seconds_per_case else None,
+            "cost_per_case": round(self.cost_per_case, 6) if self.cost_per_case else None,
+            "affordable_cases": self.affordable,
+            "selected": self.selected,
+            "estimate": self.estimate(passed),
+        }
+
+    def print_plan(self, total: int, concurrency: int) -> None:
+        """Print how many cases the budget buys and why"""
+        limits = []
+        if "seconds" in self.affordable:
+            limits.append(f"{self.seconds:g}s buys ~{self.affordable['seconds']} at "
+                          f"{self.seconds_per_case:.1f}s/case x {concurrency} in flight")
+        if "usd" in self.affordable:
+            limits.append(f"${self.usd:g} buys ~{self.affordable['usd']} at ${self.cost_per_case:.4f}/case")
+        print(f"Budget: running {self.selected} of {total} cases "
+              f"({'; '.join(limits) or 'no limit applies'}), "
+              f"stratified over {len(set(self.families))} test-type families")
+
+    def print_estimate(self, passed: Sequence[Optional[bool]]) -> None:
+        """Print the estimated full-dataset pass rate and its uncertainty"""
+        estimate = self.estimate(passed)
+        if not estimate["evaluated"]:
+            print("\nBudget estimate: no cases finished")
+            return
+        print(f"\nEstimated full-dataset pass rate: {estimate['pass_rate']:.1f}% "
+              f"± {Z_95 * estimate['standard_error']:.1f} "
+              f"(95% CI {estimate['ci_low']:.1f}-{estimate['ci_high']:.1f}%)")
+        print(f"  From {estimate['evaluated']} cases in {estimate['families_sampled']}/{estimate['families']} "
+              f"test-type families covering {estimate['population']}/{len(self.families)} cases")
+
+
+def add_budget_arguments(parser) -> None:
+    """Add the shared --budget-* options to an argparse parser"""
+    parser.add_argument("--budget-seconds", type=float, default=None, metavar="SECONDS",
+                        help="run only the stratified subset of cases that fits in this much wall-clock time "
+                             "and estimate the full pass rate")
+    parser.add_argument("--budget-usd", type=float, default=None, metavar="USD",
+                        help="run only the stratified subset of cases that fits in this many dollars")
+    parser.add_argument("--budget-seed", type=int, default=None,
+                        help="random seed for picking the budgeted subset")
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Append-only JSONL checkpoint journal for resumable eval runs
+
+Every completed case adds one line keyed by the hash of the case content, so
+a run interrupted by Ctrl-C or a timeout storm picks up where it stopped and
+dataset edits only re-run the cases that changed. Lines are flushed as they
+are written and fsync'd in batches; a torn last line from a crash is ignored
+on load. The first line records a fingerprint of the run configuration
+(model, prompt, ...) so results from a different configuration are never
+resumed. At the end of a run the journal is compacted to one line per case.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional
+
+DEFAULT_FSYNC_EVERY = 32
+DEFAULT_FSYNC_INTERVAL = 2.0
+
+
+def content_hash(value: Any) -> str:
+    """Short SHA-256 of a JSON-serialisable value"""
+    canonical = json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def case_hash(case: Dict) -> str:
+    """Stable ID of a dataset case, with or without the {"item": ...} wrapper"""
+    return content_hash(case.get("item", case))
+
+
+def is_retryable(outcome: Any) -> bool:
+    """Errors and timeouts are run again on resume; passes and failures are kept"""
+    if isinstance(outcome, dict):
+        return outcome.get("status") in ("error", "timeout") or bool(outcome.get("error"))
+    if isinstance(outcome, (list, tuple)) and len(outcome) == 2 and isinstance(outcome[1], dict):
+        return "error" in outcome[1]
+    return False
+
+
+class CheckpointJournal:
+    """Completed case outcomes keyed by case hash, persisted as an append-only JSONL file"""
+
+    def __init__(self, path: Path, fingerprint: str, resume: bool = True,
+                 retryable: Callable[[Any], bool] = is_retryable,
+                 fsync_every: int = DEFAULT_FSYNC_EVERY,
+                 fsync_interval: float = DEFAULT_FSYNC_INTERVAL):
+        self.path = Path(path)
+        self.fingerprint = fingerprint
+        self.retryable = retryable
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.outcomes: Dict[str, Any] = {}
+        self.resumed = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._torn_tail = False
+
+        if resume and self.path.exists():
+            self._load()
+        if self.outcomes:
+            self._file = open(self.path, "a", encoding="utf-8")
+            if self._torn_tail:
+                # Start on a fresh line rather than extending the partial one
+                self._file.write("\n")
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "w", encoding="utf-8")
+            self._write_line({"type": "header", "fingerprint": fingerprint, "created": time.time()})
+            self._sync()
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace, default_path: Path, fingerprint: str,
+                  **kwargs) -> "CheckpointJournal":
+        return cls(args.journal or default_path, fingerprint, resume=args.resume, **kwargs)
+
+    def _load(self) -> None:
+        with open(self.path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        self._torn_tail = bool(lines) and not lines[-1].endswith("\n")
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # Torn write from a crash; everything before it is intact
+                continue
+        if not records or records[0].get("type") != "header":
+            print(f"⚠️  {self.path} is not a checkpoint journal; starting fresh")
+            return
+        if records[0].get("fingerprint") != self.fingerprint:
+            print(f"⚠️  {self.path} was written for a different configuration; starting fresh")
+            return
+        for record in records[1:]:
+            if "key" in record:
+                self.outcomes[record["key"]] = record["outcome"]
+
+    def _write_line(self, record: Dict) -> None:
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._file.flush()
+
+    def _sync(self) -> None:
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Journaled outcome for `key` that doesn't need re-running, or None"""
+        outcome = self.outcomes.get(key)
+        if outcome is None or self.retryable(outcome):
+            return None
+        self.resumed += 1
+        return outcome
+
+    def print_resume_summary(self, remaining: int) -> None:
+        """Report how many cases get() took from the journal"""
+        if self.resumed:
+            print(f"Resuming from {self.path}: {self.resumed} cases already completed, {remaining} to run\n")
+
+    def record(self, key: str, outcome: Any) -> None:
+        """Append one completed case; fsync every `fsync_every` lines or `fsync_interval` seconds"""
+        self.outcomes[key] = outcome
+        self._write_line({"key": key, "outcome": outcome})
+        self._unsynced += 1
+        if (self._unsynced >= self.fsync_every or
+                time.monotonic() - self._last_sync >= self.fsync_interval):
+            self._sync()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.flush()
+            self._sync()
+            self._file.close()
+
+    def compact(self, keys: Optional[Iterable[str]] = None) -> None:
+        """Rewrite the journal with one line per case (only `keys` if given), atomically"""
+        self.close()
+        keep = list(self.outcomes) if keys is None else [key for key in keys if key in self.outcomes]
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"type": "header", "fingerprint": self.fingerprint,
+                                "created": time.time()}, separators=(",", ":")) + "\n")
+            for key in dict.fromkeys(keep):
+                f.write(json.dumps({"key": key, "outcome": self.outcomes[key]}, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+def read_journal(path: Path) -> Dict[str, Any]:
+    """Outcomes in a journal by key, read-only and whatever its fingerprint; {} if missing"""
+    outcomes: Dict[str, Any] = {}
+    if not Path(path).exists():
+        return outcomes
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if "key" in record:
+                outcomes[record["key"]] = record["outcome"]
+    return outcomes
+
+
+def add_checkpoint_arguments(parser, resume_default: bool = False) -> None:
+    """Add the shared --resume/--journal options to an argparse parser"""
+    parser.add_argument("--resume", action=argparse.BooleanOptionalAction, default=resume_default,
+                        help="skip cases already completed in the checkpoint journal "
+                             f"(default: {'on' if resume_default else 'off'})")
+    parser.add_argument("--journal", type=Path, default=None, metavar="PATH",
+                        help="checkpoint journal location (default: next to the results file)")
@@ -3,33 +3,27 @@
 Compare different OpenAI models on the task detection evaluation dataset
 """
 
+import argparse
 import json
 import time
-import requests
 from pathlib import Path
-from typing import Dict, List, Tuple
-import concurrent.futures
+from typing import Dict, List, Optional, Tuple
 
-# Load API key from .env file
-def load_api_key():
-    env_path = Path(__file__).parent.parent.parent / '.env'
-    if env_path.exists():
-        with open(env_path, 'r') as f:
-            for line in f:
-                if line.startswith('OPENAI_API_KEY='):
-                    return line.strip().split('=')[1]
-    return None
+from eval_engine import add_concurrency_argument, run_case_groups
+from rate_limiter import (AdaptiveRateLimiter, add_model_budget_arguments, add_rate_limit_arguments,
+                          parse_model_values)
+from http_client import AsyncEvalHttpClient, EvalHttpClient, TimeoutException, require_api_key
+from response_cache import ResponseCache, add_cache_arguments
+from checkpoint import CheckpointJournal, add_checkpoint_arguments, case_hash, content_hash
+from timeout_policy import TimeoutPolicy, add_timeout_arguments
+from retry import RetryPolicy, add_retry_arguments, attempts_of
+from providers import ChatCompletionsProvider
+from dataset import dataset_version, load_cases
+from warehouse import ResultsWarehouse, add_warehouse_arguments
+from incremental import StoredOutput, add_incremental_arguments, stored_outputs
+from significance import compare_paired, format_interval, pass_rate_interval
 
-API_KEY = load_api_key()
-if not API_KEY:
-    print("Error: OPENAI_API_KEY not found in .env file")
-    exit(1)
-
-BASE_URL = "https://api.openai.com/v1"
-HEADERS = {
-    "Authorization": f"Bearer {API_KEY}",
-    "Content-Type": "application/json"
-}
+API_KEY = require_api_key()
 
 # Models to compare
 MODELS = {
@@ -38,19 +32,11 @@ MODELS = {
     "gpt-4.1": "Latest GPT-4.1 with improved instruction following",
     "o3": "Latest O3 reasoning model (most intelligent)"
 }
+BASELINE_MODEL = "gpt-4o-mini"
 
 def load_test_cases() -> List[Dict]:
     """Load test cases from eval_dataset.jsonl"""
-    dataset_path = Path(__file__).parent / "eval_dataset.jsonl"
-    test_cases = []
-    
-    with open(dataset_path, "r") as f:
-        for line in f:
-            if line.strip():
-                data = json.loads(line)
-                test_cases.append(data["item"])
-    
-    return test_cases
+    return [case["item"] for case in load_cases()]
 
 def get_system_prompt() -> str:
     """Get the production system prompt"""
@@ -171,167 +157,218 @@ Output a single JSON object (not an array) with:
   "is_task": true or false
 }}"""
 
-def test_model(model_id: str, test_case: Dict) -> Tuple[bool, Dict]:
-    """Test a single model on a single test case"""
+def grade(test_case: Dict, entries: Optional[List[Dict]]) -> Tuple[bool, bool]:
+    """(category_match, task_match) of the first entry against the first expected entry"""
+    output = entries[0] if entries else {}
+    expected_entry = test_case["expected_entries"][0]
+    return output.get("category") == expected_entry["category"], output.get("is_task") == expected_entry["is_task"]
+
+def reused_outcome(test_case: Dict, stored: StoredOutput) -> Tuple[bool, Dict]:
+    """test_model's result for an output stored by an earlier run, graded against the current labels"""
+    category_match, task_match = grade(test_case, stored.entries)
+    return (category_match and task_match), {
+        "entries": stored.entries,
+        "category_match": category_match,
+        "task_match": task_match,
+        "test_type": test_case.get("test_type", "unknown"),
+        "attempts": 0,
+        "timing": {"cached": True},
+        "reused_from_run": stored.run_id
+    }
+
+async def test_model(model_id: str, test_case: Dict, limiter: AdaptiveRateLimiter,
+                     client: AsyncEvalHttpClient, cache: ResponseCache,
+                     timeouts: TimeoutPolicy, retries: RetryPolicy) -> Tuple[bool, Dict]:
+    """Test a single model on a single test case; details include the attempts it took"""
+    # o3 might not support system messages or response_format
+    provider = ChatCompletionsProvider(model_id, get_system_prompt(), client, limiter, cache, temperature=0,
+                                       timeouts=timeouts, retries=retries,
+                                       system_role=model_id != "o3", json_mode=model_id != "o3")
+    timeout = provider.timeout(test_case["input_text"])  # Per model, from its latency history
     try:
-        # Special handling for o3 which might not support system messages
-        if model_id == "o3":
-            messages = [{
-                "role": "user", 
-                "content": f"{get_system_prompt()}\n\nUser input: {test_case['input_text']}"
-            }]
-            response_format = None  # o3 might not support response_format
-        else:
-            messages = [
-                {"role": "system", "content": get_system_prompt()},
-                {"role": "user", "content": test_case["input_text"]}
-            ]
-            response_format = {"type": "json_object"}
+        completion = await provider.complete(test_case["input_text"], timeout)
+        attempts = completion.attempts
         
-        request_body = {
-            "model": model_id,
-            "messages": messages,
-            "temperature": 0
-        }
+        if completion.status_code != 200:
+            return False, {"error": completion.error, "attempts": attempts}
+        if not completion.ok:
+            print(f"\nJSON decode error for {model_id}: {completion.content[:100]}...")
+            return False, {"error": "JSON decode error", "raw": completion.content, "attempts": attempts}
         
-        if response_format:
-            request_body["response_format"] = response_format
-            
-        response = requests.post(
-            f"{BASE_URL}/chat/completions",
-            headers=HEADERS,
-            json=request_body,
-            timeout=60  # Longer timeout for o1-mini
-        )
+        # Check if the output matches expected values
+        category_match, task_match = grade(test_case, completion.entries)
         
-        if response.status_code == 200:
-            result = response.json()
-            content = result['choices'][0]['message']['content']
-            
-            # Try to parse JSON from the response
-            try:
-                # For o3, extract JSON from the response
-                if model_id == "o3" and "```json" in content:
-                    json_start = content.find("```json") + 7
-                    json_end = content.find("```", json_start)
-                    content = content[json_start:json_end].strip()
-                elif model_id == "o3" and "{" in content:
-                    # Try to extract JSON object
-                    json_start = content.find("{")
-                    json_end = content.rfind("}") + 1
-                    content = content[json_start:json_end]
-                    
-                output = json.loads(content)
-            except json.JSONDecodeError:
-                print(f"\nJSON decode error for {model_id}: {content[:100]}...")
-                return False, {"error": "JSON decode error", "raw": content}
-            
-            # Check if the output matches expected values
-            expected_entry = test_case["expected_entries"][0]
-            category_match = output.get("category") == expected_entry["category"]
-            task_match = output.get("is_task") == expected_entry["is_task"]
-            
-            return (category_match and task_match), {
-                "output": output,
-                "category_match": category_match,
-                "task_match": task_match,
-                "test_type": test_case.get("test_type", "unknown")
-            }
-        else:
-            error_detail = f"{response.status_code}: {response.text[:200]}"
-            return False, {"error": error_detail}
+        return (category_match and task_match), {
+            "output": completion.output,
+            "entries": completion.entries,
+            "category_match": category_match,
+            "task_match": task_match,
+            "test_type": test_case.get("test_type", "unknown"),
+            "attempts": attempts,
+            "timing": completion.timing()
+        }
             
+    except TimeoutException as e:
+        # Still an "error" so a resumed run retries it, but tallied on its own
+        return False, {"error": f"Timeout after {timeout:.1f}s", "timeout": timeout, "attempts": attempts_of(e)}
     except Exception as e:
-        return False, {"error": str(e)}
+        return False, {"error": str(e), "attempts": attempts_of(e)}
+
+def check_availability(model_id: str, client: EvalHttpClient) -> bool:
+    """One tiny request to see whether the key can use `model_id`"""
+    test_messages = [{"role": "user", "content": "test"}]
+    if model_id == "o3":
+        test_body = {"model": model_id, "messages": test_messages, "max_tokens": 10}
+    else:
+        test_body = {"model": model_id, "messages": test_messages, "max_tokens": 1}
+        
+    test_response = client.post("/chat/completions", json=test_body)
+    
+    if test_response.status_code != 200:
+        print(f"⚠️  Model {model_id} not available. Error: {test_response.text[:100]}")
+        return False
+    return True
+
+def run_model_comparison(concurrency: int, rate_limit_log: Optional[Path] = None,
+                         cache: Optional[ResponseCache] = None,
+                         model_concurrency: Optional[Dict[str, int]] = None,
+                         model_rpm: Optional[Dict[str, float]] = None,
+                         resume: bool = False, journal_path: Optional[Path] = None,
+                         timeouts: Optional[TimeoutPolicy] = None,
+                         retries: Optional[RetryPolicy] = None,
+                         warehouse: Optional[ResultsWarehouse] = None, incremental: bool = False):
+    """Run all test cases against all models
 
-def run_model_comparison():
-    """Run all test cases against all models"""
+    Every available model's cases are scheduled at once. Each model gets its
+    own worker pool (--concurrency, or its --model-concurrency entry) and
+    limiter window, plus an optional requests-per-minute cap, so a slow
+    model doesn't hold up the others. Outcomes are journaled per model and
+    case, so an interrupted comparison can continue with resume=True.
+    Each model is a separate run in the results warehouse, if one is given.
+    With incremental=True, outputs the warehouse already holds for this
+    prompt are re-graded instead of sent.
+    """
     print("=== OpenAI Model Comparison for Task Detection ===\n")
     
+    model_concurrency = model_concurrency or {}
+    model_rpm = model_rpm or {}
+    limiter = AdaptiveRateLimiter(max_concurrency=concurrency)
+    client = AsyncEvalHttpClient(API_KEY)
+    sync_client = EvalHttpClient(API_KEY)
+    cache = cache or ResponseCache()
+    timeouts = timeouts or TimeoutPolicy()
+    retries = retries or RetryPolicy()
+    
     # Load test cases
     test_cases = load_test_cases()
     print(f"Loaded {len(test_cases)} test cases\n")
     
     # Results storage
-    results = {model: {"passed": 0, "failed": 0, "errors": 0, "failures_by_type": {}} 
+    results = {model: {"passed": 0, "failed": 0, "errors": 0, "timeouts": 0, "failures_by_type": {}} 
                for model in MODELS}
+    case_passed = {model: {} for model in MODELS}  # Case key -> passed, for the confidence intervals
+    
+    # Test availability first
+    available = [model_id for model_id in MODELS if check_availability(model_id, sync_client)]
     
-    # Test each model
-    for model_id, description in MODELS.items():
-        print(f"\nTesting {model_id}: {description}")
-        print("-" * 60)
+    budgets = {}
+    for model_id in available:
+        budgets[model_id] = model_concurrency.get(model_id, concurrency)
+        limiter.set_budget(model_id, budgets[model_id], model_rpm.get(model_id))
+        rpm = f", {model_rpm[model_id]:g} requests/min" if model_id in model_rpm else ""
+        print(f"Testing {model_id}: {MODELS[model_id]} (up to {budgets[model_id]} in flight{rpm})")
+    print("-" * 60)
+    
+    journal = CheckpointJournal(journal_path or Path(__file__).parent / "model_comparison_journal.jsonl",
+                                fingerprint=content_hash(get_system_prompt()), resume=resume)
+    case_keys = [case_hash(case) for case in test_cases]
+    warehouse = warehouse or ResultsWarehouse(enabled=False)
+    run_ids = {model_id: warehouse.start_run("model_comparison", model_id, content_hash(get_system_prompt()),
+                                             script=Path(__file__).name,
+                                             dataset_version=dataset_version(test_cases))
+               for model_id in available}
+    
+    def record_in_warehouse(model_id, case, outcome):
+        passed, details = outcome
+        status = ("timeout" if "timeout" in details else "error" if "error" in details
+                  else "passed" if passed else "failed")
+        match = {key: details[key] for key in ("category_match", "task_match") if key in details}
+        warehouse.record(run_ids[model_id], case, status, output=details.get("entries"),
+                         error=details.get("error"), timing=details.get("timing"),
+                         attempts=details.get("attempts"), detail=match if not passed else None)
+    
+    def tally(model_id, key, outcome):
+        passed, details = outcome
         
-        # Test availability first
-        test_messages = [{"role": "user", "content": "test"}]
-        if model_id == "o3":
-            test_body = {"model": model_id, "messages": test_messages, "max_tokens": 10}
+        if "timeout" in details:
+            results[model_id]["timeouts"] += 1
+        elif "error" in details:
+            results[model_id]["errors"] += 1
+        elif passed:
+            results[model_id]["passed"] += 1
+            case_passed[model_id][key] = True
         else:
-            test_body = {"model": model_id, "messages": test_messages, "max_tokens": 1}
-            
-        test_response = requests.post(
-            f"{BASE_URL}/chat/completions",
-            headers=HEADERS,
-            json=test_body
-        )
-        
-        if test_response.status_code != 200:
-            print(f"⚠️  Model {model_id} not available. Error: {test_response.text[:100]}")
-            continue
+            results[model_id]["failed"] += 1
+            case_passed[model_id][key] = False
+            test_type = details.get("test_type", "unknown")
+            results[model_id]["failures_by_type"][test_type] = \
+                results[model_id]["failures_by_type"].get(test_type, 0) + 1
+    
+    # Cases already in the journal, or with a stored output to re-grade, are tallied up front
+    # and not sent again
+    reuse = stored_outputs(incremental, warehouse, Path(__file__).name, content_hash(get_system_prompt()))
+    pending = {}
+    for model_id in available:
+        pending[model_id] = []
+        for key, case in zip(case_keys, test_cases):
+            outcome = journal.get(f"{model_id}:{key}")
+            if outcome is None:
+                stored = reuse.lookup(model_id, case) if reuse else None
+                if stored is None:
+                    pending[model_id].append((key, case))
+                    continue
+                outcome = reused_outcome(case, stored)
+                reuse.regraded(stored, outcome[0])
+                journal.record(f"{model_id}:{key}", outcome)
+            tally(model_id, key, outcome)
+            record_in_warehouse(model_id, case, outcome)
+    journal.print_resume_summary(sum(len(cases) for cases in pending.values()))
+    
+    completed = {model_id: len(test_cases) - len(pending[model_id]) for model_id in available}
+    finished_at = {}
+    start_time = time.time()
+    
+    async def evaluate(model_id, _, pending_case):
+        return await test_model(model_id, pending_case[1], limiter, client, cache, timeouts, retries)
+    
+    def on_result(model_id, _, pending_case, outcome):
+        journal.record(f"{model_id}:{pending_case[0]}", outcome)
+        tally(model_id, pending_case[0], outcome)
+        record_in_warehouse(model_id, pending_case[1], outcome)
+        completed[model_id] += 1
         
-        # Test in smaller batches for o3 due to rate limits
-        batch_size = 5 if model_id == "o3" else 10
+        if completed[model_id] == len(test_cases):
+            finished_at[model_id] = time.time() - start_time
         
-        for i in range(0, len(test_cases), batch_size):
-            batch = test_cases[i:i+batch_size]
-            
-            # Test batch sequentially for o3
-            if model_id == "o3":
-                for j, case in enumerate(batch):
-                    passed, details = test_model(model_id, case)
-                    
-                    if "error" in details:
-                        results[model_id]["errors"] += 1
-                    elif passed:
-                        results[model_id]["passed"] += 1
-                    else:
-                        results[model_id]["failed"] += 1
-                        test_type = details.get("test_type", "unknown")
-                        results[model_id]["failures_by_type"][test_type] = \
-                            results[model_id]["failures_by_type"].get(test_type, 0) + 1
-                    
-                    # Rate limit for o3
-                    if j < len(batch) - 1:
-                        time.sleep(2)
-            else:
-                # Test batch concurrently for other models
-                with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-                    futures = {
-                        executor.submit(test_model, model_id, case): case 
-                        for case in batch
-                    }
-                    
-                    for future in concurrent.futures.as_completed(futures):
-                        test_case = futures[future]
-                        passed, details = future.result()
-                        
-                        if "error" in details:
-                            results[model_id]["errors"] += 1
-                        elif passed:
-                            results[model_id]["passed"] += 1
-                        else:
-                            results[model_id]["failed"] += 1
-                            test_type = details.get("test_type", "unknown")
-                            results[model_id]["failures_by_type"][test_type] = \
-                                results[model_id]["failures_by_type"].get(test_type, 0) + 1
-            
-            # Show progress
-            completed = min(i + batch_size, len(test_cases))
-            print(f"  Progress: {completed}/{len(test_cases)} tests completed", end="\r")
-            
-            # Rate limit handling
-            time.sleep(1)
-        
-        print()  # New line after progress
+        # Show progress
+        progress = " | ".join(f"{m} {n}/{len(test_cases)}" for m, n in completed.items())
+        print(f"  Progress: {progress}", end="\r")
+    
+    try:
+        run_case_groups(pending, evaluate, concurrency=budgets, on_result=on_result,
+                        on_finish=client.aclose)
+    finally:
+        journal.close()
+        warehouse.flush()
+    journal.compact(f"{model_id}:{key}" for model_id in MODELS for key in case_keys)
+    
+    print()  # New line after progress
+    wall_time = time.time() - start_time
+    if finished_at:
+        print(f"\nWall time: {wall_time:.1f}s (slowest model {max(finished_at.values()):.1f}s, "
+              f"sum of per-model times {sum(finished_at.values()):.1f}s)")
+        for model_id, seconds in finished_at.items():
+            print(f"  {model_id}: finished after {seconds:.1f}s")
     
     # Display results
     print("\n\n" + "=" * 80)
@@ -339,37 +376,51 @@ def run_model_comparison():
     print("=" * 80)
     
     # Create comparison table
-    print("\n%-20s | %-10s | %-10s | %-10s | %-15s" % 
-          ("Model", "Passed", "Failed", "Errors", "Pass Rate"))
-    print("-" * 75)
+    print("\n%-20s | %-10s | %-10s | %-10s | %-10s | %-10s | %-15s" % 
+          ("Model", "Passed", "Failed", "Errors", "Timeouts", "Pass Rate", "95% CI"))
+    print("-" * 102)
     
     model_performance = []
+    intervals = {}
     for model_id in MODELS:
         if model_id in results and results[model_id]["passed"] + results[model_id]["failed"] > 0:
             total = results[model_id]["passed"] + results[model_id]["failed"]
             pass_rate = (results[model_id]["passed"] / total * 100) if total > 0 else 0
             
             model_performance.append((model_id, pass_rate, results[model_id]))
+            intervals[model_id] = pass_rate_interval(case_passed[model_id].values())
             
-            print("%-20s | %-10d | %-10d | %-10d | %-14.1f%%" % 
+            print("%-20s | %-10d | %-10d | %-10d | %-10d | %-10s | %-15s" % 
                   (model_id, results[model_id]["passed"], results[model_id]["failed"], 
-                   results[model_id]["errors"], pass_rate))
+                   results[model_id]["errors"], results[model_id]["timeouts"], f"{pass_rate:.1f}%",
+                   format_interval(intervals[model_id])))
     
     # Sort by performance
     model_performance.sort(key=lambda x: x[1], reverse=True)
     
     # Show improvement over baseline
+    comparisons = {}
     if len(model_performance) > 0:
         print("\n\nPERFORMANCE COMPARISON")
         print("-" * 40)
         
-        baseline_rate = next((perf[1] for perf in model_performance if perf[0] == "gpt-4o-mini"), 0)
+        baseline_rate = next((perf[1] for perf in model_performance if perf[0] == BASELINE_MODEL), 0)
         
         for model_id, pass_rate, _ in model_performance:
-            if model_id != "gpt-4o-mini" and baseline_rate > 0:
+            if model_id != BASELINE_MODEL and baseline_rate > 0:
                 improvement = ((pass_rate - baseline_rate) / baseline_rate) * 100
                 sign = "+" if improvement > 0 else ""
-                print(f"{model_id}: {pass_rate:.1f}% ({sign}{improvement:.1f}% vs baseline)")
+                comparison = compare_paired(case_passed[BASELINE_MODEL], case_passed[model_id])
+                comparisons[model_id] = comparison
+                interval = format_interval(comparison["relative"], signed=True)
+                print(f"{model_id}: {pass_rate:.1f}% ({sign}{improvement:.1f}% vs baseline"
+                      f"{', 95% CI ' + interval if interval else ''})")
+                if comparison["cases"]:
+                    print(f"  Paired over {comparison['cases']} cases: "
+                          f"{comparison['difference']['estimate']:+.1f} pts "
+                          f"{format_interval(comparison['difference'], ' pts', signed=True)} "
+                          f"({comparison['fixed']} fixed, {comparison['broken']} broken, "
+                          f"McNemar p={comparison['mcnemar_p']:.3f})")
     
     # Show failure analysis for each model
     print("\n\nFAILURE ANALYSIS BY MODEL")
@@ -392,15 +443,57 @@ def run_model_comparison():
                     "pass_rate": pass_rate,
                     "passed": model_results["passed"],
                     "failed": model_results["failed"],
-                    "errors": model_results["errors"]
+                    "errors": model_results["errors"],
+                    "timeouts": model_results["timeouts"]
                 }
                 for model_id, pass_rate, model_results in model_performance
             },
             "detailed_results": results,
-            "test_count": len(test_cases)
+            "pass_rate_intervals": intervals,
+            "vs_baseline": {"baseline": BASELINE_MODEL, **comparisons},
+            "test_count": len(test_cases),
+            "wall_time_seconds": round(wall_time, 2),
+            "model_wall_time_seconds": {m: round(t, 2) for m, t in finished_at.items()},
+            "timeout_policy": timeouts.summary(),
+            "retries": retries.summary(),
+            "incremental": reuse.summary() if reuse else None
         }, f, indent=2)
     
     print(f"\n\nDetailed results saved to: {output_file}")
+    
+    sync_client.close()
+    
+    limiter.print_summary()
+    client.stats.print_summary()
+    timeouts.print_summary()
+    timeouts.save()
+    retries.print_summary()
+    cache.print_summary()
+    cache.close()
+    if reuse:
+        reuse.print_summary()
+    for model_id, run_id in run_ids.items():
+        warehouse.finish_run(run_id, results[model_id])
+    warehouse.print_summary()
+    warehouse.close()
+    limiter.export(rate_limit_log or output_file.with_name("model_comparison_ratelimit.json"))
 
 if __name__ == "__main__":
-    run_model_comparison()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Compare OpenAI models on the eval dataset")
+    add_concurrency_argument(parser)
+    add_rate_limit_arguments(parser)
+    add_model_budget_arguments(parser)
+    add_cache_arguments(parser)
+    add_checkpoint_arguments(parser)
+    add_timeout_arguments(parser)
+    add_retry_arguments(parser)
+    add_warehouse_arguments(parser)
+    add_incremental_arguments(parser)
+    args = parser.parse_args()
+    
+    run_model_comparison(args.concurrency, args.rate_limit_log, ResponseCache.from_args(args),
+                         model_concurrency=parse_model_values(args.model_concurrency),
+                         model_rpm=parse_model_values(args.model_rpm, float),
+                         resume=args.resume, journal_path=args.journal,
+                         timeouts=TimeoutPolicy.from_args(args), retries=RetryPolicy.from_args(args),
+                         warehouse=ResultsWarehouse.from_args(args), incremental=args.incremental)
\ No newline at end of file
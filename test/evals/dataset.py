@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Indexed, memory-mapped access to eval_dataset.jsonl
+
+The scripts used to json.loads every line of the dataset and keep every
+case in a list, even when a run only needs a few test types. This module
+keeps a binary index next to the response cache (.cache/<dataset>.idx),
+with one fixed-size record per case:
+- its byte offset and length in the JSONL
+- its stable ID: the content hash of the item, the same key the checkpoint
+  journals use
+- a hash of the raw line
+- the ids of its test_type, first expected category and first is_task
+
+After the records come sorted posting lists per test_type, category and
+is_task value. Both files are memory-mapped. A filtered subset is the
+intersection of a few posting lists. Only the lines in that subset are
+parsed, so loading one test type from 100k cases takes milliseconds.
+
+The index records the JSONL's size and mtime and is rebuilt whenever they
+change. The rebuild is incremental: lines whose raw-line hash matches a
+record in the old index reuse that record's metadata, so only new or edited
+lines are parsed. The new index is written to a temporary file and renamed
+into place.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from checkpoint import case_hash, content_hash
+
+DATASET_PATH = Path(__file__).parent / "eval_dataset.jsonl"
+INDEX_DIR = Path(__file__).parent / ".cache"
+
+MAGIC = b"EVALIDX1"
+# magic, case count, JSONL size, JSONL mtime_ns, directory offset, directory length, postings offset
+HEADER = struct.Struct("<8sIQQQQQ")
+# offset, length, case id, line hash, test_type id, category id, is_task (0/1, 2 = missing), entries
+RECORD = struct.Struct("<QI8s8sIIBB")
+FIELDS = ("test_type", "category", "is_task")
+IS_TASK_VALUES = ("false", "true", "unknown")
+
+
+def _line_hash(line: bytes) -> bytes:
+    return hashlib.blake2b(line, digest_size=8).digest()
+
+
+def _describe(item: Dict) -> Tuple[str, str, str, int]:
+    """(test_type, first expected category, first is_task, entry count) of one dataset item"""
+    expected = item.get("expected_entries") or [{}]
+    is_task = expected[0].get("is_task")
+    return (item.get("test_type", "unknown"), expected[0].get("category", "unknown"),
+            "unknown" if is_task is None else str(bool(is_task)).lower(), len(item.get("expected_entries") or []))
+
+
+def _iter_lines(data: bytes) -> Iterator[Tuple[int, bytes]]:
+    """(offset, line) for each non-blank line, without the newline"""
+    start = 0
+    size = len(data)
+    while start < size:
+        end = data.find(b"\n", start)
+        if end == -1:
+            end = size
+        line = data[start:end]
+        if line.strip():
+            yield start, line.rstrip(b"\r")
+        start = end + 1
+
+
+class EvalDataset:
+    """The eval dataset behind a memory-mapped index; cases are parsed only when loaded"""
+
+    def __init__(self, path: Path = DATASET_PATH, index_path: Optional[Path] = None):
+        self.path = Path(path)
+        self.index_path = Path(index_path) if index_path else INDEX_DIR / f"{self.path.stem}.idx"
+        self.reused = 0
+        self.parsed = 0
+        self.rebuilt = False
+        self._data: Optional[mmap.mmap] = None
+        self._index: Optional[mmap.mmap] = None
+        self._open()
+
+    # Opening and (re)building
+
+    def _open(self) -> None:
+        stat = self.path.stat()
+        if not self._index_is_current(stat):
+            self._rebuild(stat)
+        with open(self.index_path, "rb") as f:
+            self._index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (_, self.count, _, _, directory_offset, directory_length,
+         self._postings_offset) = HEADER.unpack_from(self._index, 0)
+        directory = json.loads(self._index[directory_offset:directory_offset + directory_length])
+        self._values: Dict[str, List[str]] = directory["values"]
+        self._postings: Dict[str, Dict[str, Tuple[int, int]]] = directory["postings"]
+        if stat.st_size:
+            with open(self.path, "rb") as f:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _index_is_current(self, stat: os.stat_result) -> bool:
+        try:
+            with open(self.index_path, "rb") as f:
+                header = f.read(HEADER.size)
+        except OSError:
+            return False
+        if len(header) != HEADER.size:
+            return False
+        magic, _, size, mtime_ns, *_ = HEADER.unpack(header)
+        return magic == MAGIC and size == stat.st_size and mtime_ns == stat.st_mtime_ns
+
+    def _previous_records(self) -> Dict[bytes, Tuple[bytes, str, str, str, int]]:
+        """Line hash -> (case id, test_type, category, is_task, entries) from the old index, if any"""
+        try:
+            with open(self.index_path, "rb") as f:
+                index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return {}
+        try:
+            magic, count, _, _, directory_offset, directory_length, _ = HEADER.unpack_from(index, 0)
+            if magic != MAGIC:
+                return {}
+            values = json.loads(index[directory_offset:directory_offset + directory_length])["values"]
+            previous = {}
+            for position in range(count):
+                _, _, case_id, line_hash, test_type, category, is_task, entries = RECORD.unpack_from(
+                    index, HEADER.size + position * RECORD.size)
+                previous[line_hash] = (case_id, values["test_type"][test_type], values["category"][category],
+                                       IS_TASK_VALUES[is_task], entries)
+            return previous
+        except (struct.error, ValueError, KeyError, IndexError):
+            return {}
+        finally:
+            index.close()
+
+    def _rebuild(self, stat: os.stat_result) -> None:
+        previous = self._previous_records()
+        self.rebuilt = True
+        values: Dict[str, Dict[str, int]] = {"test_type": {}, "category": {}, "is_task": {v: i for i, v in
+                                                                                        enumerate(IS_TASK_VALUES)}}
+        postings: Dict[str, Dict[str, List[int]]] = {field: {} for field in FIELDS}
+        records = bytearray()
+        with open(self.path, "rb") as f:
+            # Mapped rather than read, so a rebuild doesn't hold the whole JSONL in memory
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b""
+        for line_number, (offset, line) in enumerate(_iter_lines(data), 1):
+            line_hash = _line_hash(line)
+            known = previous.get(line_hash)
+            if known:
+                case_id, test_type, category, is_task, entries = known
+                self.reused += 1
+            else:
+                try:
+                    case = json.loads(line)
+                except ValueError as e:
+                    raise ValueError(f"{self.path}: case {line_number} is not valid JSON: {e}") from e
+                case_id = bytes.fromhex(case_hash(case))
+                test_type, category, is_task, entries = _describe(case.get("item", case))
+                self.parsed += 1
+            position = len(records) // RECORD.size
+            ids = []
+            for field, value in zip(FIELDS, (test_type, category, is_task)):
+                ids.append(values[field].setdefault(value, len(values[field])))
+                postings[field].setdefault(value, []).append(position)
+            records += RECORD.pack(offset, len(line), case_id, line_hash, ids[0], ids[1], ids[2],
+                                   min(entries, 255))
+        if isinstance(data, mmap.mmap):
+            data.close()
+
+        # Posting lists are stored as uint32 arrays after the records
+        posting_bytes = bytearray()
+        directory_postings: Dict[str, Dict[str, Tuple[int, int]]] = {}
+        for field in FIELDS:
+            directory_postings[field] = {}
+            for value, positions in postings[field].items():
+                directory_postings[field][value] = (len(posting_bytes) // 4, len(positions))
+                posting_bytes += array("I", positions).tobytes()
+        directory = json.dumps({
+            "values": {field: sorted(ids, key=ids.get) for field, ids in values.items()},
+            "postings": directory_postings,
+        }).encode("utf-8")
+        directory_offset = HEADER.size + len(records)
+        postings_offset = directory_offset + len(directory)
+        header = HEADER.pack(MAGIC, len(records) // RECORD.size, stat.st_size, stat.st_mtime_ns,
+                             directory_offset, len(directory), postings_offset)
+
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            f.write(records)
+            f.write(directory)
+            f.write(posting_bytes)
+        os.replace(tmp_path, self.index_path)
+
+    # Lookups
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _record(self, position: int) -> Tuple:
+        return RECORD.unpack_from(self._index, HEADER.size + position * RECORD.size)
+
+    def case_id(self, position: int) -> str:
+        """Stable ID of the case at `position`; equals checkpoint.case_hash of the case"""
+        return self._record(position)[2].hex()
+
+    def ids(self) -> List[str]:
+        return [self.case_id(position) for position in range(self.count)]
+
+    def span(self, position: int) -> Tuple[int, int]:
+        """(byte offset, length) of the line at `position`, without its newline"""
+        offset, length = self._record(position)[:2]
+        return offset, length
+
+    def find(self, case_ids: Iterable[str]) -> Dict[str, List[int]]:
+        """Positions of each case ID, or ID prefix, in one pass over the index records"""
+        wanted: Dict[int, Dict[str, List[int]]] = {}  # Prefix length -> prefix -> positions
+        for case_id in case_ids:
+            wanted.setdefault(len(case_id), {})[case_id.lower()] = []
+        records = memoryview(self._index)[HEADER.size:HEADER.size + self.count * RECORD.size]
+        for position, record in enumerate(RECORD.iter_unpack(records)):
+            hex_id = record[2].hex()
+            for length, prefixes in wanted.items():
+                matches = prefixes.get(hex_id[:length])
+                if matches is not None:
+                    matches.append(position)
+        records.release()
+        return {prefix: positions for prefixes in wanted.values() for prefix, positions in prefixes.items()}
+
+    def values(self, field: str) -> Dict[str, int]:
+        """Each indexed value of `field` with the number of cases that have it"""
+        return {value: length for value, (_, length) in self._postings[field].items()}
+
+    def positions(self, field: str, value: str) -> array:
+        """Sorted positions of the cases whose `field` equals `value`"""
+        start, length = self._postings[field].get(value, (0, 0))
+        positions = array("I")
+        if length:
+            begin = self._postings_offset + start * 4
+            positions.frombytes(self._index[begin:begin + length * 4])
+        return positions
+
+    def select(self, test_type: Optional[Iterable[str]] = None, category: Optional[Iterable[str]] = None,
+               is_task: Optional[bool] = None) -> List[int]:
+        """Positions of the cases matching every given filter (any of the values within one filter)"""
+        selected: Optional[set] = None
+        wanted = {"test_type": test_type, "category": category,
+                  "is_task": None if is_task is None else [str(is_task).lower()]}
+        for field, field_values in wanted.items():
+            if field_values is None:
+                continue
+            if isinstance(field_values, str):
+                field_values = [field_values]
+            matching = set()
+            for value in field_values:
+                matching.update(self.positions(field, value))
+            selected = matching if selected is None else selected & matching
+        return sorted(selected) if selected is not None else list(range(self.count))
+
+    def case(self, position: int) -> Dict:
+        """The JSONL object at `position` (the {"item": ...} wrapper included)"""
+        offset, length = self._record(position)[:2]
+        return json.loads(self._data[offset:offset + length])
+
+    def load(self, positions: Optional[Sequence[int]] = None, **filters) -> List[Dict]:
+        """Cases at `positions` (default: those matching `filters`, see select), in dataset order"""
+        if positions is None:
+            positions = self.select(**filters)
+        return [self.case(position) for position in positions]
+
+    def print_summary(self) -> None:
+        if self.rebuilt:
+            print(f"Dataset index rebuilt for {self.path.name}: {self.count} cases "
+                  f"({self.reused} unchanged, {self.parsed} parsed)")
+
+    def close(self) -> None:
+        for mapped in (self._data, self._index):
+            if mapped is not None:
+                mapped.close()
+        self._data = self._index = None
+
+    def __enter__(self) -> "EvalDataset":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def load_cases(path: Path = DATASET_PATH, test_type: Optional[Iterable[str]] = None,
+               category: Optional[Iterable[str]] = None, is_task: Optional[bool] = None) -> List[Dict]:
+    """Dataset cases ({"item": ...} objects) matching the filters, in dataset order"""
+    with EvalDataset(path) as dataset:
+        dataset.print_summary()
+        return dataset.load(test_type=test_type, category=category, is_task=is_task)
+
+
+def dataset_version(cases: Iterable[Dict]) -> str:
+    """Hash of a set of cases, labels included; any edit, addition or removal changes it"""
+    return content_hash(sorted(case_hash(case) for case in cases))
+
+
+def dataset_filters(args) -> Dict:
+    """Keyword filters for load_cases from the --test-type/--category/--is-task options"""
+    is_task = {"true": True, "false": False}.get(args.is_task) if args.is_task else None
+    return {"test_type": args.test_type, "category": args.category, "is_task": is_task}
+
+
+def dataset_path(args) -> Path:
+    """The --dataset file, or eval_dataset.jsonl"""
+    return args.dataset or DATASET_PATH
+
+
+def selection_name(name: str, args) -> str:
+    """`name` with the --dataset/--test-type/--category/--is-task selection worked in before its suffix
+
+    Runs of a subset or of another dataset get their own results and journal
+    files rather than overwriting the full run's, e.g.
+    gpt5_mini_results.json -> gpt5_mini_results.test_type-single_word.json
+    """
+    parts = []
+    if dataset_path(args) != DATASET_PATH:
+        parts.append(f"dataset-{dataset_path(args).stem}")
+    for field, value in dataset_filters(args).items():
+        if value is not None:
+            values = value if isinstance(value, list) else [str(value).lower()]
+            parts.append(f"{field}-{'+'.join(values)}")
+    if not parts:
+        return name
+    path = Path(name)
+    tag = re.sub(r"[^\w+.-]", "_", ".".join(parts))
+    return str(path.with_name(f"{path.stem}.{tag}{path.suffix}"))
+
+
+def add_dataset_arguments(parser) -> None:
+    """Add the shared dataset options to an argparse parser"""
+    parser.add_argument("--dataset", type=Path, default=None, metavar="PATH",
+                        help="run another JSONL dataset, e.g. one from generate_dataset.py "
+                             "(default: eval_dataset.jsonl)")
+    parser.add_argument("--test-type", nargs="+", default=None, metavar="TYPE",
+                        help="only run cases of these test types")
+    parser.add_argument("--category", nargs="+", default=None, metavar="CATEGORY",
+                        help="only run cases whose (first) expected category is one of these")
+    parser.add_argument("--is-task", choices=["true", "false"], default=None,
+                        help="only run cases whose (first) expected entry is / isn't a task")
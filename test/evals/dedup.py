@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate detection for eval datasets (MinHash + LSH)
+
+The dataset is assembled from hand-written cases, converted Dart tests
+(convert_tests_to_eval_format.dart) and older datasets. Inputs that differ
+only in case, punctuation or a word or two are paid for twice and count
+twice in the pass rate. When they are labelled differently, at least one of
+the labels is wrong.
+
+Each input_text is normalised (lowercase, punctuation and runs of
+whitespace folded to one space) and cut into character 5-grams. A MinHash
+signature of NUM_PERM values estimates the Jaccard similarity of two
+inputs' 5-gram sets. Locality-sensitive hashing splits the signature into
+BANDS bands. Two inputs become candidates if any band matches exactly.
+Candidates whose estimated similarity reaches the threshold are linked, and
+the connected groups are the clusters. Shingling, signatures, banding and
+verification are all NumPy array operations over batches of cases, so
+millions of cases take seconds to minutes rather than the hours that
+comparing every pair would take.
+
+The report lists clusters whose members disagree on the expected labels
+first. With --output, a deduplicated dataset is written: each cluster is
+reduced to its first member, except clusters with conflicting labels, which
+are kept whole until someone resolves them. Lines are copied verbatim, so
+case IDs don't change. Provenance goes to <output>.provenance.jsonl: for
+every kept case, its source file and line and the duplicates folded into it.
+
+    python dedup.py                                    # report on eval_dataset.jsonl
+    python dedup.py eval_dataset.jsonl old_dataset.jsonl --threshold 0.7
+    python dedup.py --output eval_dataset.dedup.jsonl
+"""
+
+import argparse
+import json
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from checkpoint import case_hash
+from dataset import DATASET_PATH
+
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+BANDS = 16  # 16 bands of 8 rows: pairs at 0.8 similarity become candidates 95% of the time
+DEFAULT_THRESHOLD = 0.8
+CHUNK_CASES = 20_000  # Cases shingled and hashed per batch
+PERM_BLOCK = 32  # MinHash permutations evaluated at once, to bound the batch's memory
+
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def normalize(text: str) -> str:
+    """Lowercase, with punctuation and whitespace runs folded to single spaces"""
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+@dataclass
+class Cases:
+    """What dedup needs of every case, in input order"""
+    texts: List[str]
+    labels: List[str]  # Canonical JSON of [(category, is_task), ...]
+    sources: List[Tuple[int, int]]  # (input file index, line number)
+    ids: List[str]
+    paths: List[Path]
+
+
+def read_cases(paths: Sequence[Path]) -> Cases:
+    """Stream the JSONL files, keeping the input text, labels and origin of each case"""
+    cases = Cases([], [], [], [], list(paths))
+    interned: Dict[str, str] = {}
+    for file_index, path in enumerate(paths):
+        with open(path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                case = json.loads(line)
+                item = case.get("item", case)
+                labels = json.dumps([[entry.get("category"), entry.get("is_task")]
+                                     for entry in item.get("expected_entries") or []])
+                cases.texts.append(item.get("input_text", ""))
+                cases.labels.append(interned.setdefault(labels, labels))
+                cases.sources.append((file_index, line_number))
+                cases.ids.append(case_hash(case))
+    return cases
+
+
+def _shingle_hashes(texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """32-bit hashes of every 5-gram of every normalised text, and where each text's run of them starts"""
+    normalized = [normalize(text).ljust(SHINGLE_SIZE) for text in texts]
+    lengths = np.fromiter((len(text) for text in normalized), dtype=np.int64, count=len(normalized))
+    # One uint32 per code point, so a window is five characters whatever the script
+    data = np.frombuffer("".join(normalized).encode("utf-32-le"), dtype="<u4")
+    # Polynomial hash of each window, wrapping mod 2^64
+    weights = np.uint64(1099511628211) ** np.arange(SHINGLE_SIZE - 1, -1, -1, dtype=np.uint64)
+    windows = np.lib.stride_tricks.sliding_window_view(data, SHINGLE_SIZE).astype(np.uint64)
+    hashes = (windows * weights).sum(axis=1, dtype=np.uint64)
+    # Keep the windows that lie inside one text
+    text = np.repeat(np.arange(len(normalized)), lengths)[:len(hashes)]
+    text_starts = np.cumsum(lengths) - lengths
+    keep = np.arange(len(hashes)) - text_starts[text] <= lengths[text] - SHINGLE_SIZE
+    counts = lengths - SHINGLE_SIZE + 1
+    return (hashes[keep] * _GOLDEN) >> np.uint64(32), np.cumsum(counts) - counts
+
+
+def signatures(texts: Sequence[str], num_perm: int = NUM_PERM, seed: int = 1) -> np.ndarray:
+    """MinHash signatures, one row of num_perm uint32 values per text"""
+    rng = np.random.default_rng(seed)
+    # Multiply-shift hashing: ((a * x + b) mod 2^64) >> 32, with a odd
+    a = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+    result = np.empty((len(texts), num_perm), dtype=np.uint32)
+    for chunk in range(0, len(texts), CHUNK_CASES):
+        shingles, starts = _shingle_hashes(texts[chunk:chunk + CHUNK_CASES])
+        # One row per permutation, so each text's shingles are contiguous for reduceat
+        permuted = np.empty((PERM_BLOCK, len(shingles)), dtype=np.uint64)
+        for block in range(0, num_perm, PERM_BLOCK):
+            rows = slice(block, block + PERM_BLOCK)
+            width = len(a[rows])
+            np.multiply(a[rows, None], shingles[None, :], out=permuted[:width])
+            permuted[:width] += b[rows, None]
+            permuted[:width] >>= np.uint64(32)
+            result[chunk:chunk + len(starts), rows] = np.minimum.reduceat(permuted[:width], starts, axis=1).T
+    return result
+
+
+def candidate_pairs(signature: np.ndarray, bands: int = BANDS) -> np.ndarray:
+    """(i, j) pairs, i < j, that share at least one whole band"""
+    count, num_perm = signature.shape
+    rows = num_perm // bands
+    weights = np.random.default_rng(2).integers(1, 2 ** 63, size=rows, dtype=np.uint64) | np.uint64(1)
+    pairs = []
+    for band in range(bands):
+        keys = (signature[:, band * rows:(band + 1) * rows].astype(np.uint64) * weights).sum(axis=1, dtype=np.uint64)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        run_start = np.ones(count, dtype=bool)
+        run_start[1:] = sorted_keys[1:] != sorted_keys[:-1]
+        # Link each member of a bucket to the bucket's first case, not to every other member
+        first = order[np.maximum.accumulate(np.where(run_start, np.arange(count), 0))]
+        members = ~run_start
+        pairs.append(np.stack([first[members], order[members]], axis=1))
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64)
+    pairs = np.concatenate(pairs)
+    pairs.sort(axis=1)
+    return np.unique(pairs, axis=0)
+
+
+def similarity(signature: np.ndarray, pairs: np.ndarray, chunk: int = 1 << 16) -> np.ndarray:
+    """Estimated Jaccard similarity of each pair: the share of equal MinHash values"""
+    result = np.empty(len(pairs), dtype=np.float32)
+    for start in range(0, len(pairs), chunk):
+        block = pairs[start:start + chunk]
+        result[start:start + chunk] = (signature[block[:, 0]] == signature[block[:, 1]]).mean(axis=1)
+    return result
+
+
+def components(count: int, edges: np.ndarray) -> np.ndarray:
+    """Connected-component label (the smallest member index) of each node"""
+    labels = np.arange(count)
+    if not len(edges):
+        return labels
+    while True:
+        smallest = np.minimum(labels[edges[:, 0]], labels[edges[:, 1]])
+        updated = labels.copy()
+        np.minimum.at(updated, edges[:, 0], smallest)
+        np.minimum.at(updated, edges[:, 1], smallest)
+        updated = updated[updated]  # Pointer jumping
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+@dataclass
+class Cluster:
+    members: List[int]  # Case indexes, in input order
+    similarity: Dict[int, float]  # Member -> estimated similarity to the first member
+    conflicting: bool
+
+
+def find_clusters(cases: Cases, threshold: float = DEFAULT_THRESHOLD, num_perm: int = NUM_PERM,
+                  bands: int = BANDS) -> List[Cluster]:
+    """Clusters of two or more near-duplicate inputs, conflicting ones first"""
+    if not cases.texts:
+        return []
+    signature = signatures(cases.texts, num_perm)
+    pairs = candidate_pairs(signature, bands)
+    scores = similarity(signature, pairs)
+    edges = pairs[scores >= threshold]
+    labels = components(len(cases.texts), edges)
+
+    order = np.argsort(labels, kind="stable")
+    boundaries = np.flatnonzero(np.diff(labels[order])) + 1
+    clusters = []
+    for group in np.split(order, boundaries):
+        if len(group) < 2:
+            continue
+        members = sorted(int(member) for member in group)
+        first = members[0]
+        shared = (signature[members] == signature[first]).mean(axis=1)
+        clusters.append(Cluster(members, {member: float(score) for member, score in zip(members, shared)},
+                                len({cases.labels[member] for member in members}) > 1))
+    clusters.sort(key=lambda cluster: (not cluster.conflicting, -len(cluster.members), cluster.members[0]))
+    return clusters
+
+
+def source_name(cases: Cases, index: int) -> str:
+    file_index, line_number = cases.sources[index]
+    return f"{cases.paths[file_index]}:{line_number}"
+
+
+def print_report(cases: Cases, clusters: List[Cluster], show: int = 10) -> None:
+    duplicates = sum(len(cluster.members) - 1 for cluster in clusters)
+    conflicting = [cluster for cluster in clusters if cluster.conflicting]
+    print(f"\n{len(cases.texts)} cases: {len(clusters)} near-duplicate clusters, "
+          f"{duplicates} cases removable, {len(conflicting)} clusters with conflicting labels")
+    for cluster in clusters[:show]:
+        kind = "CONFLICTING LABELS" if cluster.conflicting else "same labels"
+        print(f"\n  {len(cluster.members)} cases, {kind}:")
+        for member in cluster.members:
+            labels = ", ".join(f"{category}/{is_task}" for category, is_task in json.loads(cases.labels[member]))
+            print(f"    {source_name(cases, member):28} {cases.ids[member]}  "
+                  f"sim {cluster.similarity[member]:.2f}  [{labels}]  {cases.texts[member][:60]!r}")
+    if len(clusters) > show:
+        print(f"\n  ... and {len(clusters) - show} more clusters (--show N)")
+
+
+def write_deduplicated(cases: Cases, clusters: List[Cluster], output: Path) -> Tuple[int, int]:
+    """Write the kept cases verbatim, plus their provenance; returns (kept, dropped)"""
+    folded: Dict[int, List[int]] = {}  # Kept case -> duplicates dropped in its favour
+    dropped = np.zeros(len(cases.texts), dtype=bool)
+    for cluster in clusters:
+        if cluster.conflicting:
+            continue  # Left for a person to resolve
+        first, *rest = cluster.members
+        folded[first] = rest
+        dropped[rest] = True
+
+    provenance_path = output.with_name(output.stem + ".provenance.jsonl")
+    tmp_output = output.with_name(output.name + ".tmp")
+    tmp_provenance = provenance_path.with_name(provenance_path.name + ".tmp")
+    index = 0
+    with open(tmp_output, "w", encoding="utf-8") as out, open(tmp_provenance, "w", encoding="utf-8") as prov:
+        for path in cases.paths:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    if not dropped[index]:
+                        out.write(line if line.endswith("\n") else line + "\n")
+                        prov.write(json.dumps({
+                            "id": cases.ids[index],
+                            "source": source_name(cases, index),
+                            "duplicates": [{"id": cases.ids[member], "source": source_name(cases, member)}
+                                           for member in folded.get(index, [])],
+                        }, ensure_ascii=False) + "\n")
+                    index += 1
+    os.replace(tmp_output, output)
+    os.replace(tmp_provenance, provenance_path)
+    return int((~dropped).sum()), int(dropped.sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find near-duplicate inputs in eval datasets")
+    parser.add_argument("datasets", nargs="*", type=Path, default=[DATASET_PATH], metavar="JSONL")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"estimated Jaccard similarity of 5-grams to count as duplicates "
+                             f"(default: {DEFAULT_THRESHOLD:g})")
+    parser.add_argument("--show", type=int, default=10, metavar="N", help="clusters to print (default: 10)")
+    parser.add_argument("--output", type=Path, default=None, metavar="JSONL",
+                        help="write a deduplicated dataset here, with provenance next to it")
+    parser.add_argument("--report", type=Path, default=None, metavar="JSON", help="save the clusters as JSON")
+    args = parser.parse_args()
+
+    cases = read_cases(args.datasets)
+    clusters = find_clusters(cases, args.threshold)
+    print_report(cases, clusters, args.show)
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump([{"conflicting": cluster.conflicting,
+                        "cases": [{"id": cases.ids[member], "source": source_name(cases, member),
+                                   "similarity": round(cluster.similarity[member], 3),
+                                   "labels": json.loads(cases.labels[member]), "input_text": cases.texts[member]}
+                                  for member in cluster.members]}
+                       for cluster in clusters], f, indent=2, ensure_ascii=False)
+        print(f"\nClusters saved to {args.report}")
+    if args.output:
+        kept, dropped = write_deduplicated(cases, clusters, args.output)
+        print(f"\nWrote {kept} cases to {args.output} ({dropped} duplicates dropped; "
+              f"conflicting clusters kept whole)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
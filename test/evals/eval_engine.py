@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Asyncio engine for running eval cases concurrently
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Union
+
+DEFAULT_CONCURRENCY = 8
+
+# evaluate(index, case) -> outcome
+CaseEvaluator = Callable[[int, Any], Awaitable[Any]]
+# on_result(index, case, outcome), called on the event loop as each case finishes
+ResultCallback = Callable[[int, Any, Any], None]
+# should_stop() -> True once no further cases should be started
+StopCondition = Callable[[], bool]
+# evaluate(group, index, case) -> outcome and on_result(group, index, case, outcome)
+GroupEvaluator = Callable[[str, int, Any], Awaitable[Any]]
+GroupResultCallback = Callable[[str, int, Any, Any], None]
+
+
+async def run_cases_async(cases: Sequence[Any], evaluate: CaseEvaluator,
+                          concurrency: int = DEFAULT_CONCURRENCY,
+                          on_result: Optional[ResultCallback] = None,
+                          should_stop: Optional[StopCondition] = None) -> List[Any]:
+    """Run evaluate(index, case) for every case with at most `concurrency` in flight.
+
+    Outcomes are returned in case order, whatever order the cases finish in.
+    Once should_stop() returns True no new cases start; cases already in
+    flight finish, and the ones never started have a None outcome.
+    """
+    outcomes: List[Any] = [None] * len(cases)
+    pending: Iterable = iter(enumerate(cases))
+
+    async def worker():
+        # Workers pull from a shared iterator so memory stays flat for large datasets
+        for index, case in pending:
+            if should_stop and should_stop():
+                return
+            outcome = await evaluate(index, case)
+            outcomes[index] = outcome
+            if on_result:
+                on_result(index, case, outcome)
+
+    workers = max(1, min(concurrency, len(cases)))
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    return outcomes
+
+
+async def run_case_groups_async(groups: Mapping[str, Sequence[Any]], evaluate: GroupEvaluator,
+                                concurrency: Union[int, Mapping[str, int]] = DEFAULT_CONCURRENCY,
+                                on_result: Optional[GroupResultCallback] = None) -> Dict[str, List[Any]]:
+    """Run every group's cases at once, each group with its own worker pool
+
+    `concurrency` is either one limit for every group or a per-group mapping
+    (groups missing from it get DEFAULT_CONCURRENCY). A slow group only holds
+    its own workers, so total wall time tracks the slowest group rather than
+    the sum of all of them. Outcomes are returned per group in case order.
+    """
+
+    def group_runner(group: str, cases: Sequence[Any]) -> Awaitable[List[Any]]:
+        limit = concurrency if isinstance(concurrency, int) else concurrency.get(group, DEFAULT_CONCURRENCY)
+
+        async def evaluate_in_group(index, case):
+            return await evaluate(group, index, case)
+
+        def on_group_result(index, case, outcome):
+            on_result(group, index, case, outcome)
+
+        return run_cases_async(cases, evaluate_in_group, limit, on_group_result if on_result else None)
+
+    names = list(groups)
+    outcomes = await asyncio.gather(*(group_runner(name, groups[name]) for name in names))
+    return dict(zip(names, outcomes))
+
+
+def _run(main: Callable[[], Awaitable[Any]], executor_workers: int,
+         on_finish: Optional[Callable[[], Awaitable[None]]]) -> Any:
+    async def runner():
+        # Blocking calls wrapped in asyncio.to_thread must not be capped below the worker count
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=max(1, executor_workers)))
+        try:
+            return await main()
+        finally:
+            if on_finish:
+                await on_finish()
+
+    return asyncio.run(runner())
+
+
+def run_cases(cases: Sequence[Any], evaluate: CaseEvaluator,
+              concurrency: int = DEFAULT_CONCURRENCY,
+              on_result: Optional[ResultCallback] = None,
+              on_finish: Optional[Callable[[], Awaitable[None]]] = None,
+              should_stop: Optional[StopCondition] = None) -> List[Any]:
+    """Synchronous entry point for scripts; see run_cases_async
+
+    on_finish is awaited on the same event loop once every case is done, e.g.
+    AsyncEvalHttpClient.aclose to shut the connection pool down cleanly.
+    """
+    return _run(lambda: run_cases_async(cases, evaluate, concurrency, on_result, should_stop),
+                concurrency, on_finish)
+
+
+def run_case_groups(groups: Mapping[str, Sequence[Any]], evaluate: GroupEvaluator,
+                    concurrency: Union[int, Mapping[str, int]] = DEFAULT_CONCURRENCY,
+                    on_result: Optional[GroupResultCallback] = None,
+                    on_finish: Optional[Callable[[], Awaitable[None]]] = None) -> Dict[str, List[Any]]:
+    """Synchronous entry point for scripts; see run_case_groups_async"""
+    workers = (concurrency * len(groups) if isinstance(concurrency, int)
+               else sum(concurrency.get(group, DEFAULT_CONCURRENCY) for group in groups))
+    return _run(lambda: run_case_groups_async(groups, evaluate, concurrency, on_result), workers, on_finish)
+
+
+def add_concurrency_argument(parser) -> None:
+    """Add the shared --concurrency option to an argparse parser"""
+    parser.add_argument(
+        "--concurrency", type=int, default=DEFAULT_CONCURRENCY, metavar="N",
+        help=f"maximum number of cases in flight at once (default: {DEFAULT_CONCURRENCY})"
+    )
@@ -0,0 +1,685 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI endpoints used by the eval scripts
+
+Answers /responses and /chat/completions with deterministic rule-based
+entries, streams /responses as Server-Sent Events when the request sets
+"stream": true, and implements /files and /batches well enough to exercise
+the --stream and --batch modes end to end without network access or spend.
+/evals, /evals/{id}/runs and their /output_items cover the hosted Evals
+scripts (run_eval_best_practices.py, fetch_eval_results.py): a run answers
+each item like /chat/completions and grades it against the item's expected
+category and is_task.
+
+To measure concurrency and retry behavior, the model endpoints can also:
+- wait before answering, with latency drawn from a distribution (--latency)
+- fail a fraction of requests with 429 or 5xx statuses (--error-rate)
+- enforce per-model requests and tokens per minute (--rpm, --tpm), sending
+  the x-ratelimit-* headers that rate_limiter.py reads and answering 429
+  with retry-after once a window is used up
+- answer from canned outputs instead of the rules (--canned; a dataset
+  file gives its expected entries, i.e. a model that is always right)
+Latency and injected errors are drawn from a generator seeded by --seed,
+the request body, and how many times that body has been seen. So the nth
+copy of a request gets the same delay and fate each time the server is
+started with the same options, however the requests interleave.
+
+Usage:
+    python fake_openai_server.py --port 8765
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=test \\
+        python minimal_prompt/run_gpt5_mini_eval.py --batch --batch-poll-interval 1
+    python fake_openai_server.py --latency lognormal:0.8,0.5 gpt-5=lognormal:3,0.6 \\
+        --error-rate 0.05 --rpm 500 --tpm 200000 --seed 1
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+CATEGORY_KEYWORDS = [
+    ("Health", ["dentist", "doctor", "gym", "workout", "run ", "medication", "therapy", "sleep", "yoga"]),
+    ("Finance", ["pay", "bill", "bank", "budget", "invest", "rent", "tax", "bought", "$"]),
+    ("Work", ["meeting", "project", "client", "deadline", "report", "boss", "presentation", "email"]),
+    ("Personal", ["groceries", "mom", "dad", "friend", "birthday", "dinner", "family", "pick up"]),
+]
+TASK_PATTERNS = re.compile(
+    r"\b(make this a (to-?do|task)|remind me|need to|have to|must|don't forget|todo|to-do)\b", re.I)
+OVERRIDE_PATTERN = re.compile(r"\b(?:file|categorize|put) this (?:under|as|in) (\w+)", re.I)
+ITEM_FIELD = re.compile(r"\{\{\s*item\.(\w+)\s*\}\}")
+ERRORS = {
+    429: ("rate_limit_exceeded", "Rate limit reached"),
+    500: ("server_error", "The server had an error while processing your request"),
+    502: ("server_error", "Bad gateway"),
+    503: ("server_error", "The engine is currently overloaded, please try again later"),
+    504: ("server_error", "Gateway timeout"),
+}
+
+
+def classify_text(text: str) -> Tuple[str, bool]:
+    """Rule-based (category, is_task) for one input"""
+    override = OVERRIDE_PATTERN.search(text)
+    if override:
+        category = override.group(1).capitalize()
+    else:
+        lowered = text.lower()
+        category = next((name for name, words in CATEGORY_KEYWORDS
+                         if any(word in lowered for word in words)), "Misc")
+    return category, bool(TASK_PATTERNS.search(text))
+
+
+def build_entries(text: str, canned: Optional[Dict[str, Dict]] = None) -> Dict:
+    if canned and text in canned:
+        return canned[text]
+    category, is_task = classify_text(text)
+    segment = re.sub(r"^[^:]{0,40}:\s*", "", text).strip() or text
+    return {"entries": [{"text_segment": segment[:1].upper() + segment[1:],
+                         "category": category, "is_task": is_task}]}
+
+
+def _last_user_text(messages: List[Dict]) -> str:
+    for message in reversed(messages or []):
+        if message.get("role") == "user":
+            content = message.get("content")
+            if isinstance(content, list):
+                return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+            return str(content or "")
+    return ""
+
+
+def _usage(text: str, output: str) -> Tuple[int, int]:
+    return max(1, len(text) // 4), max(1, len(output) // 4)
+
+
+def responses_body(request: Dict, canned: Optional[Dict[str, Dict]] = None) -> Dict:
+    """Responses API result for a request body"""
+    text = _last_user_text(request.get("input") if isinstance(request.get("input"), list)
+                           else [{"role": "user", "content": request.get("input", "")}])
+    output = json.dumps(build_entries(text, canned))
+    input_tokens, output_tokens = _usage(text, output)
+    return {
+        "id": f"resp_{uuid.uuid4().hex[:24]}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "status": "completed",
+        "model": request.get("model"),
+        "output": [{
+            "type": "message",
+            "id": f"msg_{uuid.uuid4().hex[:24]}",
+            "status": "completed",
+            "role": "assistant",
+            "content": [{"type": "output_text", "text": output, "annotations": []}],
+        }],
+        "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                  "total_tokens": input_tokens + output_tokens},
+    }
+
+
+def chat_completions_body(request: Dict, canned: Optional[Dict[str, Dict]] = None) -> Dict:
+    """Chat Completions result for a request body"""
+    text = _last_user_text(request.get("messages"))
+    output = json.dumps(build_entries(text, canned))
+    prompt_tokens, completion_tokens = _usage(text, output)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model"),
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": output}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+ENDPOINTS = {
+    "/responses": responses_body,
+    "/chat/completions": chat_completions_body,
+}
+
+
+def error_body(status: int, message: Optional[str] = None) -> Dict:
+    error_type, default_message = ERRORS.get(status, ("server_error", "Injected error"))
+    return {"error": {"message": message or default_message, "type": error_type, "code": error_type, "param": None}}
+
+
+class LatencyModel:
+    """Response latency in seconds, drawn from a distribution named by a spec string
+
+    fixed:SECONDS, uniform:LOW,HIGH, normal:MEAN,SD, lognormal:MEDIAN,SIGMA or
+    exponential:MEAN. Negative draws are clipped to 0.
+    """
+
+    SHAPES = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exponential": 1}
+
+    def __init__(self, shape: str, params: Sequence[float]):
+        self.shape = shape
+        self.params = list(params)
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        shape, _, values = spec.partition(":")
+        try:
+            params = [float(value) for value in values.split(",")] if values else []
+        except ValueError:
+            params = []
+        if cls.SHAPES.get(shape) != len(params):
+            raise ValueError(f"Bad latency {spec!r}; expected fixed:S, uniform:LOW,HIGH, normal:MEAN,SD, "
+                             f"lognormal:MEDIAN,SIGMA or exponential:MEAN")
+        return cls(shape, params)
+
+    def sample(self, rng: random.Random) -> float:
+        first, second = (self.params + [0.0])[:2]
+        if self.shape == "uniform":
+            value = rng.uniform(first, second)
+        elif self.shape == "normal":
+            value = rng.gauss(first, second)
+        elif self.shape == "lognormal":
+            value = first * math.exp(rng.gauss(0.0, second))
+        elif self.shape == "exponential":
+            value = rng.expovariate(1 / first) if first > 0 else 0.0
+        else:
+            value = first
+        return max(0.0, value)
+
+
+def parse_latencies(specs: Optional[Sequence[str]]) -> Dict[Optional[str], LatencyModel]:
+    """{model or None: LatencyModel} from "SPEC" (every model) and "MODEL=SPEC" values"""
+    latencies: Dict[Optional[str], LatencyModel] = {}
+    for spec in specs or []:
+        model, sep, rest = spec.partition("=")
+        latencies[model if sep else None] = LatencyModel.parse(rest if sep else spec)
+    return latencies
+
+
+def load_canned(path: Path) -> Dict[str, Dict]:
+    """input_text -> {"entries": [...]} from {"input_text", "entries"} lines or eval dataset cases"""
+    canned = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            item = record.get("item", record)
+            canned[item["input_text"]] = {"entries": item.get("entries", item.get("expected_entries")) or []}
+    return canned
+
+
+def render_template(content, item: Dict):
+    """A message's content with {{ item.field }} filled in"""
+    if not isinstance(content, str):
+        return content
+    return ITEM_FIELD.sub(lambda match: str(item.get(match.group(1), "")), content)
+
+
+def grade_item(item: Dict, entry: Dict) -> bool:
+    """Whether an answer matches the item's expected category and is_task (where it has them)"""
+    first = (item.get("expected_entries") or [{}])[0]
+    category = item.get("expected_category", first.get("category"))
+    is_task = item.get("expected_is_task", first.get("is_task"))
+    return (category is None or entry.get("category") == category) and \
+        (is_task is None or entry.get("is_task") == is_task)
+
+
+class FakeOpenAIState:
+    """Uploaded files, batch jobs, evals and quota windows, shared by all request threads"""
+
+    def __init__(self, batch_delay: float = 1.0, delta_delay: float = 0.01, delta_chars: int = 8,
+                 latency: Optional[Dict[Optional[str], LatencyModel]] = None, error_rate: float = 0.0,
+                 error_statuses: Sequence[int] = (429, 500, 503), retry_after: float = 1.0,
+                 rpm: Optional[int] = None, tpm: Optional[int] = None,
+                 canned: Optional[Dict[str, Dict]] = None, seed: int = 0):
+        self.batch_delay = batch_delay
+        self.delta_delay = delta_delay
+        self.delta_chars = delta_chars
+        self.latency = latency or {}
+        self.error_rate = error_rate
+        self.error_statuses = list(error_statuses)
+        self.retry_after = retry_after
+        self.rpm = rpm
+        self.tpm = tpm
+        self.canned = canned
+        self.seed = seed
+        self.files: Dict[str, Dict] = {}
+        self.batches: Dict[str, Dict] = {}
+        self.evals: Dict[str, Dict] = {}
+        self.eval_runs: Dict[str, Dict[str, Dict]] = {}  # eval id -> run id -> run
+        self.output_items: Dict[str, List[Dict]] = {}  # run id -> items
+        self._item_positions: Dict[str, int] = {}  # output item id -> position in its run
+        self._seen: Dict[str, int] = {}  # request body hash -> copies seen
+        self._windows: Dict[str, Dict] = {}  # model -> current one-minute quota window
+        self.lock = threading.RLock()
+
+    def _rng(self, request: Dict) -> random.Random:
+        """Randomness for one request: the same for the nth copy of a body in every run"""
+        key = hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        with self.lock:
+            occurrence = self._seen[key] = self._seen.get(key, -1) + 1
+        return random.Random(f"{self.seed}:{key}:{occurrence}")
+
+    def _take_quota(self, model: str, tokens: int) -> Tuple[Dict[str, str], Optional[float]]:
+        """x-ratelimit-* headers for a request, and the seconds until reset if it is over quota"""
+        if not self.rpm and not self.tpm:
+            return {}, None
+        now = time.monotonic()
+        with self.lock:
+            window = self._windows.get(model)
+            if window is None or now - window["start"] >= 60:
+                window = self._windows[model] = {"start": now, "requests": 0, "tokens": 0}
+            reset = window["start"] + 60 - now
+            over = bool((self.rpm and window["requests"] >= self.rpm) or
+                        (self.tpm and window["tokens"] + tokens > self.tpm))
+            if not over:
+                window["requests"] += 1
+                window["tokens"] += tokens
+            headers = {}
+            if self.rpm:
+                headers.update({"x-ratelimit-limit-requests": str(self.rpm),
+                                "x-ratelimit-remaining-requests": str(max(0, self.rpm - window["requests"])),
+                                "x-ratelimit-reset-requests": f"{reset:.3f}s"})
+            if self.tpm:
+                headers.update({"x-ratelimit-limit-tokens": str(self.tpm),
+                                "x-ratelimit-remaining-tokens": str(max(0, self.tpm - window["tokens"])),
+                                "x-ratelimit-reset-tokens": f"{reset:.3f}s"})
+        return headers, (reset if over else None)
+
+    def admit(self, request: Dict) -> Tuple[Optional[int], Dict[str, str], float]:
+        """(error status or None, extra headers, seconds to wait first) for a model request"""
+        rng = self._rng(request)
+        model = request.get("model") or ""
+        latency = self.latency.get(model) or self.latency.get(None)
+        delay = latency.sample(rng) if latency else 0.0
+        headers, reset = self._take_quota(model, max(1, len(json.dumps(request)) // 4))
+        if reset is not None:
+            return 429, {**headers, "retry-after": f"{math.ceil(reset)}"}, 0.0
+        if self.error_rate and self.error_statuses and rng.random() < self.error_rate:
+            status = rng.choice(self.error_statuses)
+            if status in (429, 503):
+                headers["retry-after"] = f"{self.retry_after:g}"
+            # Throttling is immediate; a server error can take as long as an answer
+            return status, headers, 0.0 if status == 429 else delay
+        return None, headers, delay
+
+    def add_file(self, filename: str, purpose: str, content: bytes) -> Dict:
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        record = {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                  "filename": filename, "purpose": purpose, "status": "processed"}
+        with self.lock:
+            self.files[file_id] = {"meta": record, "content": content}
+        return record
+
+    def create_batch(self, request: Dict) -> Tuple[int, Dict]:
+        with self.lock:
+            input_file = self.files.get(request.get("input_file_id"))
+        if input_file is None:
+            return 400, {"error": {"message": "input_file_id not found", "type": "invalid_request_error"}}
+        lines = [line for line in input_file["content"].decode("utf-8").splitlines() if line.strip()]
+        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+        batch = {
+            "id": batch_id, "object": "batch", "endpoint": request.get("endpoint"),
+            "input_file_id": request["input_file_id"], "completion_window": request.get("completion_window"),
+            "status": "validating", "output_file_id": None, "error_file_id": None, "errors": None,
+            "created_at": int(time.time()), "completed_at": None, "metadata": request.get("metadata") or {},
+            "request_counts": {"total": len(lines), "completed": 0, "failed": 0},
+        }
+        with self.lock:
+            self.batches[batch_id] = batch
+        threading.Thread(target=self._process_batch, args=(batch_id, lines), daemon=True).start()
+        return 200, dict(batch)
+
+    def _process_batch(self, batch_id: str, lines: List[str]) -> None:
+        with self.lock:
+            self.batches[batch_id]["status"] = "in_progress"
+        time.sleep(self.batch_delay)
+        outputs, errors = [], []
+        for line in lines:
+            record = json.loads(line)
+            handler = ENDPOINTS.get(record.get("url", "").replace("/v1", "", 1))
+            entry = {"id": f"batch_req_{uuid.uuid4().hex[:24]}", "custom_id": record.get("custom_id")}
+            if handler is None:
+                entry.update(response=None, error={"code": "invalid_url", "message": f"Unsupported url {record.get('url')}"})
+                errors.append(entry)
+            else:
+                entry.update(response={"status_code": 200, "request_id": uuid.uuid4().hex,
+                                       "body": handler(record.get("body") or {}, self.canned)}, error=None)
+                outputs.append(entry)
+        with self.lock:
+            batch = self.batches[batch_id]
+            if batch["status"] == "cancelling":
+                batch["status"] = "cancelled"
+                return
+            if outputs:
+                batch["output_file_id"] = self.add_file(
+                    f"{batch_id}_output.jsonl", "batch_output",
+                    "".join(json.dumps(o) + "\n" for o in outputs).encode("utf-8"))["id"]
+            if errors:
+                batch["error_file_id"] = self.add_file(
+                    f"{batch_id}_error.jsonl", "batch_output",
+                    "".join(json.dumps(e) + "\n" for e in errors).encode("utf-8"))["id"]
+            batch["request_counts"].update(completed=len(outputs), failed=len(errors))
+            batch["status"] = "completed"
+            batch["completed_at"] = int(time.time())
+
+    def create_eval(self, request: Dict) -> Tuple[int, Dict]:
+        if not request.get("data_source_config") or not request.get("testing_criteria"):
+            return 400, {"error": {"message": "data_source_config and testing_criteria are required",
+                                   "type": "invalid_request_error"}}
+        eval_id = f"eval_{uuid.uuid4().hex[:24]}"
+        record = {"id": eval_id, "object": "eval", "name": request.get("name"),
+                  "data_source_config": request["data_source_config"],
+                  "testing_criteria": request["testing_criteria"],
+                  "metadata": request.get("metadata") or {}, "created_at": int(time.time())}
+        with self.lock:
+            self.evals[eval_id] = record
+            self.eval_runs[eval_id] = {}
+        return 200, dict(record)
+
+    def _eval_items(self, source: Dict) -> Optional[List[Dict]]:
+        """The items of a run's data source: an uploaded JSONL file or inline content"""
+        if source.get("type") == "file_content":
+            return [row.get("item", row) for row in source.get("content") or []]
+        with self.lock:
+            uploaded = self.files.get(source.get("id"))
+        if uploaded is None:
+            return None
+        rows = [json.loads(line) for line in uploaded["content"].decode("utf-8").splitlines() if line.strip()]
+        return [row.get("item", row) for row in rows]
+
+    def create_eval_run(self, eval_id: str, request: Dict) -> Tuple[int, Dict]:
+        with self.lock:
+            known = eval_id in self.evals
+        if not known:
+            return 404, {"error": {"message": f"No eval {eval_id}", "type": "invalid_request_error"}}
+        data_source = request.get("data_source") or {}
+        items = self._eval_items(data_source.get("source") or {})
+        if items is None:
+            return 400, {"error": {"message": "data_source.source file not found", "type": "invalid_request_error"}}
+        run_id = f"evalrun_{uuid.uuid4().hex[:24]}"
+        run = {"id": run_id, "object": "eval.run", "eval_id": eval_id, "name": request.get("name"),
+               "status": "queued", "model": data_source.get("model"), "data_source": data_source,
+               "metadata": request.get("metadata") or {}, "created_at": int(time.time()),
+               "report_url": f"fake://evals/{eval_id}/runs/{run_id}", "error": None,
+               "result_counts": {"total": len(items), "passed": 0, "failed": 0, "errored": 0},
+               "per_testing_criteria_results": []}
+        with self.lock:
+            self.eval_runs[eval_id][run_id] = run
+            self.output_items[run_id] = []
+        threading.Thread(target=self._process_eval_run, args=(eval_id, run_id, items), daemon=True).start()
+        return 200, json.loads(json.dumps(run))
+
+    def _process_eval_run(self, eval_id: str, run_id: str, items: List[Dict]) -> None:
+        """Answer every item like /chat/completions and grade it by its expected labels"""
+        with self.lock:
+            run = self.eval_runs[eval_id][run_id]
+            run["status"] = "in_progress"
+            criteria = self.evals[eval_id]["testing_criteria"]
+        time.sleep(self.batch_delay)
+        template = (run["data_source"].get("input_messages") or {}).get("template") or \
+            [{"role": "user", "content": "{{ item.input_text }}"}]
+        outputs = []
+        for index, item in enumerate(items):
+            messages = [{"role": message.get("role"), "content": render_template(message.get("content"), item)}
+                        for message in template]
+            text = _last_user_text(messages)
+            entry = (build_entries(text, self.canned)["entries"] or [{}])[0]
+            output = json.dumps({"text": entry.get("text_segment"), "category": entry.get("category"),
+                                 "is_task": entry.get("is_task")})
+            passed = grade_item(item, entry)
+            input_tokens, output_tokens = _usage(text, output)
+            outputs.append({
+                "object": "eval.run.output_item", "id": f"outputitem_{uuid.uuid4().hex[:24]}",
+                "run_id": run_id, "eval_id": eval_id, "created_at": int(time.time()),
+                "status": "pass" if passed else "fail", "datasource_item_id": index, "datasource_item": item,
+                "results": [{"name": criterion.get("name"), "type": criterion.get("type"),
+                             "score": 1.0 if passed else 0.0, "passed": passed} for criterion in criteria],
+                "sample": {"input": messages, "output": [{"role": "assistant", "content": output}],
+                           "model": run["model"], "finish_reason": "stop", "error": None,
+                           "usage": {"prompt_tokens": input_tokens, "completion_tokens": output_tokens,
+                                     "total_tokens": input_tokens + output_tokens}},
+            })
+        passed = sum(output["status"] == "pass" for output in outputs)
+        with self.lock:
+            self.output_items[run_id] = outputs
+            self._item_positions.update((output["id"], position) for position, output in enumerate(outputs))
+            run["result_counts"].update(passed=passed, failed=len(outputs) - passed)
+            run["per_testing_criteria_results"] = [
+                {"testing_criteria": criterion.get("name"), "passed": passed, "failed": len(outputs) - passed}
+                for criterion in criteria]
+            run["status"] = "completed"
+
+    def list_output_items(self, run_id: str, query: Dict[str, str]) -> Dict:
+        """One page of a run's output items (limit, after and status, as the API takes them)"""
+        items = self.output_items[run_id]
+        if query.get("status"):
+            items = [item for item in items if item["status"] == query["status"]]
+            start = next((position + 1 for position, item in enumerate(items) if item["id"] == query.get("after")), 0)
+        else:
+            start = self._item_positions.get(query.get("after"), -1) + 1
+        try:
+            limit = min(100, max(1, int(query.get("limit", 20))))
+        except ValueError:
+            limit = 20
+        page = items[start:start + limit]
+        return {"object": "list", "data": page, "first_id": page[0]["id"] if page else None,
+                "last_id": page[-1]["id"] if page else None, "has_more": start + limit < len(items)}
+
+    def get(self, parts: List[str], query: Dict[str, str]):
+        """The resource at a GET path (split on "/"), a JSON-ready copy or file bytes; None if unknown"""
+        with self.lock:
+            if len(parts) == 2 and parts[0] == "batches" and parts[1] in self.batches:
+                return json.loads(json.dumps(self.batches[parts[1]]))
+            if len(parts) == 2 and parts[0] == "files" and parts[1] in self.files:
+                return self.files[parts[1]]["meta"]
+            if len(parts) == 3 and parts[0] == "files" and parts[2] == "content" and parts[1] in self.files:
+                return self.files[parts[1]]["content"]
+            if len(parts) < 2 or parts[0] != "evals" or parts[1] not in self.evals:
+                return None
+            runs = self.eval_runs[parts[1]]
+            if len(parts) == 2:
+                return self.evals[parts[1]]
+            if len(parts) == 3 and parts[2] == "runs":
+                data = [json.loads(json.dumps(run)) for run in reversed(list(runs.values()))]
+                return {"object": "list", "data": data, "first_id": data[0]["id"] if data else None,
+                        "last_id": data[-1]["id"] if data else None, "has_more": False}
+            if len(parts) < 4 or parts[2] != "runs" or parts[3] not in runs:
+                return None
+            if len(parts) == 4:
+                return json.loads(json.dumps(runs[parts[3]]))
+            if len(parts) == 5 and parts[4] == "output_items":
+                return self.list_output_items(parts[3], query)
+            if len(parts) == 6 and parts[4] == "output_items":
+                position = self._item_positions.get(parts[5])
+                items = self.output_items[parts[3]]
+                if position is not None and position < len(items) and items[position]["id"] == parts[5]:
+                    return items[position]
+            return None
+
+
+def _parse_multipart(content_type: str, body: bytes) -> Dict[str, Tuple[Optional[str], bytes]]:
+    """Form fields as name -> (filename, data)"""
+    message = BytesParser(policy=default_policy).parsebytes(
+        b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body)
+    fields = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        fields[name] = (part.get_filename(), part.get_payload(decode=True) or b"")
+    return fields
+
+
+def make_handler(state: FakeOpenAIState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _path(self) -> str:
+            path = self.path.split("?", 1)[0].rstrip("/")
+            return path[len("/v1"):] if path.startswith("/v1") else path
+
+        def _send_json(self, status: int, payload: Dict, headers: Optional[Dict[str, str]] = None) -> None:
+            self._send_bytes(status, json.dumps(payload).encode("utf-8"), "application/json", headers)
+
+        def _send_bytes(self, status: int, data: bytes, content_type: str,
+                        headers: Optional[Dict[str, str]] = None) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_event(self, payload: Dict) -> None:
+            data = f"event: {payload['type']}\ndata: {json.dumps(payload)}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def _stream_response(self, request: Dict, headers: Dict[str, str]) -> None:
+            """Responses API SSE: created, output_text deltas, done, completed"""
+            response = responses_body(request, state.canned)
+            text = response["output"][0]["content"][0]["text"]
+            item_id = response["output"][0]["id"]
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self._send_event({"type": "response.created",
+                              "response": {**response, "status": "in_progress", "output": []}})
+            for start in range(0, len(text), state.delta_chars):
+                time.sleep(state.delta_delay)
+                self._send_event({"type": "response.output_text.delta", "item_id": item_id,
+                                  "output_index": 0, "content_index": 0,
+                                  "delta": text[start:start + state.delta_chars]})
+            self._send_event({"type": "response.output_text.done", "item_id": item_id,
+                              "output_index": 0, "content_index": 0, "text": text})
+            self._send_event({"type": "response.completed", "response": response})
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _not_found(self) -> None:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+
+        def _body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        def do_POST(self):
+            path = self._path()
+            body = self._body()
+            request = json.loads(body or b"{}") if path in ENDPOINTS else None
+            if path in ENDPOINTS:
+                status, headers, delay = state.admit(request)
+                if delay:
+                    time.sleep(delay)  # For a stream, the time to the first event
+                if status is not None:
+                    self._send_json(status, error_body(status), headers)
+                elif path == "/responses" and request.get("stream"):
+                    self._stream_response(request, headers)
+                else:
+                    self._send_json(200, ENDPOINTS[path](request, state.canned), headers)
+            elif path == "/files":
+                fields = _parse_multipart(self.headers.get("Content-Type", ""), body)
+                filename, content = fields.get("file", (None, b""))
+                purpose = fields.get("purpose", (None, b""))[1].decode("utf-8")
+                self._send_json(200, state.add_file(filename or "upload.jsonl", purpose, content))
+            elif path == "/batches":
+                self._send_json(*state.create_batch(json.loads(body or b"{}")))
+            elif path == "/evals":
+                self._send_json(*state.create_eval(json.loads(body or b"{}")))
+            elif re.fullmatch(r"/evals/[^/]+/runs", path):
+                self._send_json(*state.create_eval_run(path.split("/")[2], json.loads(body or b"{}")))
+            elif re.fullmatch(r"/batches/[^/]+/cancel", path):
+                with state.lock:
+                    batch = state.batches.get(path.split("/")[2])
+                    if batch and batch["status"] in ("validating", "in_progress"):
+                        batch["status"] = "cancelling"
+                    snapshot = dict(batch) if batch else None
+                if snapshot:
+                    self._send_json(200, snapshot)
+                else:
+                    self._not_found()
+            else:
+                self._not_found()
+
+        def do_GET(self):
+            parts = self._path().strip("/").split("/")
+            query = {name: values[-1] for name, values in parse_qs(urlsplit(self.path).query).items()}
+            payload = state.get(parts, query)
+            if payload is None:
+                self._not_found()
+            elif isinstance(payload, bytes):
+                self._send_bytes(200, payload, "application/octet-stream")
+            else:
+                self._send_json(200, payload)
+
+    return Handler
+
+
+def start_server(host: str = "127.0.0.1", port: int = 0, batch_delay: float = 1.0,
+                 delta_delay: float = 0.01, **options) -> Tuple[ThreadingHTTPServer, threading.Thread]:
+    """Serve in a background thread; port 0 picks a free port (server.server_address)
+
+    `options` are the other FakeOpenAIState settings (latency, error_rate, rpm, ...).
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(FakeOpenAIState(batch_delay, delta_delay, **options)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI API used by the evals")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--batch-delay", type=float, default=1.0, metavar="SECONDS",
+                        help="how long a batch or eval run stays in_progress before completing (default: 1)")
+    parser.add_argument("--delta-delay", type=float, default=0.01, metavar="SECONDS",
+                        help="pause before each streamed output_text delta (default: 0.01)")
+    parser.add_argument("--latency", nargs="+", default=None, metavar="[MODEL=]SPEC",
+                        help="response latency, e.g. lognormal:0.8,0.5 for every model and "
+                             "gpt-5=lognormal:3,0.6 for one (fixed, uniform, normal, lognormal, exponential)")
+    parser.add_argument("--error-rate", type=float, default=0.0, metavar="FRACTION",
+                        help="fraction of model requests answered with an injected error (default: 0)")
+    parser.add_argument("--error-status", nargs="+", type=int, default=[429, 500, 503], metavar="STATUS",
+                        help="statuses to inject, picked at random (default: 429 500 503)")
+    parser.add_argument("--retry-after", type=float, default=1.0, metavar="SECONDS",
+                        help="retry-after sent with injected 429 and 503 responses (default: 1)")
+    parser.add_argument("--rpm", type=int, default=None, help="requests per minute per model; enables x-ratelimit-* headers")
+    parser.add_argument("--tpm", type=int, default=None, help="tokens per minute per model (request size / 4)")
+    parser.add_argument("--canned", type=Path, default=None, metavar="JSONL",
+                        help="answers by input text: {\"input_text\", \"entries\"} lines, or a dataset "
+                             "(answers with its expected entries)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for latency and injected errors (default: 0)")
+    args = parser.parse_args()
+
+    try:
+        latency = parse_latencies(args.latency)
+    except ValueError as e:
+        parser.error(str(e))
+    state = FakeOpenAIState(args.batch_delay, args.delta_delay, latency=latency, error_rate=args.error_rate,
+                            error_statuses=args.error_status, retry_after=args.retry_after, rpm=args.rpm,
+                            tpm=args.tpm, canned=load_canned(args.canned) if args.canned else None, seed=args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    print(f"Serving fake OpenAI API on http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
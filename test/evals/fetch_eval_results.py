@@ -4,30 +4,12 @@ Fetch detailed results from an evaluation run
 """
 
 import json
-import requests
-from pathlib import Path
 from typing import Dict, Any
 
-# Load API key from .env file
-def load_api_key():
-    env_path = Path(__file__).parent.parent.parent / '.env'
-    if env_path.exists():
-        with open(env_path, 'r') as f:
-            for line in f:
-                if line.startswith('OPENAI_API_KEY='):
-                    return line.strip().split('=')[1]
-    return None
+from http_client import EvalHttpClient, require_api_key
 
-API_KEY = load_api_key()
-if not API_KEY:
-    print("Error: OPENAI_API_KEY not found in .env file")
-    exit(1)
-
-BASE_URL = "https://api.openai.com/v1"
-HEADERS = {
-    "Authorization": f"Bearer {API_KEY}",
-    "Content-Type": "application/json"
-}
+API_KEY = require_api_key()
+CLIENT = EvalHttpClient(API_KEY)
 
 def fetch_output_items(eval_id: str, run_id: str):
     """Fetch all output items from an eval run"""
@@ -35,9 +17,8 @@ def fetch_output_items(eval_id: str, run_id: str):
     print(f"Fetching results for eval run: {run_id}\n")
     
     # Get output items
-    response = requests.get(
-        f"{BASE_URL}/evals/{eval_id}/runs/{run_id}/output_items",
-        headers=HEADERS,
+    response = CLIENT.get(
+        f"/evals/{eval_id}/runs/{run_id}/output_items",
         params={"limit": 50}  # Get all items
     )
     
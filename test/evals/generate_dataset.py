@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""
+Synthetic eval dataset for load testing the harness
+
+eval_dataset.jsonl has 61 cases, which is too few to show whether the
+runners, scoring, the warehouse and the dataset tools hold up at production
+volumes. This script writes 10k to 1M or more labeled cases in the same
+format, covering the same test_type families. The same --seed always gives
+the same file.
+
+There are two ways a family is expanded:
+- A family with a clear labeling rule (instruction_detection,
+  temporal_deadline, shorthand_schedule, ...) has a template. Its slots are
+  filled from small vocabularies of actions, observations, names, times and
+  days, and the labels follow the same rule as the hand-written cases.
+- Every other family is expanded from its hand-written cases, with their
+  labels kept as they are. Days, times, names and shopping items in a case
+  are swapped for others from the vocabularies, in the input and in its
+  entries' text segments alike.
+Either way, the input text is then perturbed in ways that shouldn't change
+its labels: lowercase, a typo, a filler word, different end punctuation.
+
+Every input is unique, compared the way dedup.py compares them (lowercase,
+punctuation folded). A Bloom filter of the inputs written so far rejects
+repeats, and the case is drawn again. Families without templates, and
+templates with few slots, run out of new inputs at large sizes. After a
+few rejected draws, such a case gets a reference number taken from its
+index, e.g. "Groceries (#48213)". A family that keeps needing numbers gets
+one draw per case until a draw turns up a new input.
+
+The labels are good enough for exercising the harness, not for measuring
+model quality. Cases are written one at a time, and the filter takes 2
+bytes per case.
+
+    python generate_dataset.py --cases 100000 --output synthetic_100k.jsonl
+    python generate_dataset.py --cases 1000000 --seed 7 --test-type typos_informal shorthand_schedule -o -
+    python minimal_prompt/run_gpt5_full_complete.py --dataset synthetic_100k.jsonl
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from dataset import DATASET_PATH
+
+NAMES = ["mom", "dad", "Sarah", "Jen", "Mike", "Priya", "Carlos", "Aisha", "Tom", "grandma", "the landlord", "Dr. Patel"]
+PROJECTS = ["Atlas", "onboarding", "Q3 budget", "website redesign", "mobile app", "vendor review", "hiring plan"]
+ITEMS = ["coffee", "milk", "printer ink", "dog food", "toilet paper", "olive oil", "batteries", "shampoo"]
+TIMES = ["7am", "8:30am", "9am", "10am", "10:30am", "11:15am", "noon", "12:30pm", "1pm", "2pm", "3pm",
+         "3:45pm", "4pm", "5pm", "6:30pm", "8pm"]
+DAYS = ["today", "tonight", "tomorrow", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday",
+        "this weekend", "next week", "end of the month"]
+SEASONS = ["spring", "summer", "fall", "winter", "year"]
+
+# (category, phrase) pairs; phrases continue "I need to ..."
+ACTIONS = [
+    ("Health", "call the dentist about my appointment"), ("Health", "refill my prescription"),
+    ("Health", "book a physio appointment"), ("Health", "schedule a flu shot"),
+    ("Health", "pick up vitamins from the pharmacy"), ("Health", "cancel the doctor appointment"),
+    ("Health", "send my blood test results to Dr. Patel"),
+    ("Work", "send the slides to {name}"), ("Work", "review the {project} proposal"),
+    ("Work", "email the client about the invoice"), ("Work", "finish the quarterly report"),
+    ("Work", "prep for the {project} meeting"), ("Work", "update the {project} roadmap"),
+    ("Work", "book a room for the team retro"), ("Work", "submit my expense report"),
+    ("Finance", "pay the electricity bill"), ("Finance", "transfer rent to the landlord"),
+    ("Finance", "file the tax return"), ("Finance", "check the credit card statement"),
+    ("Finance", "renew the car insurance"), ("Finance", "set up the savings transfer"),
+    ("Finance", "call the bank about the card fee"),
+    ("Personal", "pick up groceries"), ("Personal", "call {name}"), ("Personal", "buy a birthday gift for {name}"),
+    ("Personal", "book the vet for the dog"), ("Personal", "return the library books"),
+    ("Personal", "fix the kitchen sink"), ("Personal", "buy {item}"), ("Personal", "water the plants"),
+]
+# Statements that aren't tasks
+OBSERVATIONS = [
+    ("Health", "slept badly again last night"), ("Health", "had a great run this morning"),
+    ("Health", "my back has been sore all week"), ("Health", "finally drank enough water today"),
+    ("Work", "the standup ran long again"), ("Work", "{name} presented the {project} demo"),
+    ("Work", "the {project} launch went smoothly"), ("Work", "got great feedback on my report"),
+    ("Finance", "the electricity bill went up again"), ("Finance", "got my tax refund"),
+    ("Finance", "spent way too much on takeout this month"),
+    ("Personal", "had dinner with {name}"), ("Personal", "the dog learned a new trick"),
+    ("Personal", "{name} called about the holidays"), ("Personal", "the new cafe downtown was great"),
+]
+# Goals too vague to be tasks; phrases continue "I want to ..."
+ASPIRATIONS = [
+    ("Health", "get in better shape"), ("Health", "run a half marathon"), ("Health", "cook healthier meals"),
+    ("Work", "learn more about machine learning"), ("Work", "get better at public speaking"),
+    ("Finance", "save more money"), ("Finance", "start investing"), ("Finance", "pay off the student loan"),
+    ("Personal", "learn Spanish"), ("Personal", "read more books"), ("Personal", "reorganize my closet"),
+    ("Personal", "play more volleyball"), ("Personal", "take a photography class"),
+]
+CATEGORIES = ["Health", "Work", "Finance", "Personal"]
+SINGLE_WORDS = [("Groceries", "Personal"), ("Laundry", "Personal"), ("Taxes", "Finance"), ("Rent", "Finance"),
+                ("Invoices", "Work"), ("Timesheet", "Work"), ("Dentist", "Health"), ("Prescription", "Health")]
+CONDITIONS = ["it rains tomorrow", "the meeting gets cancelled", "{name} calls back", "it's sunny this weekend",
+              "the package doesn't arrive", "I finish early"]
+COMPLAINTS = [("Work", "work late again tonight"), ("Work", "sit through another all-hands"),
+              ("Personal", "clean the whole house again"), ("Finance", "do the taxes again this year")]
+FILLERS = ["ok so ", "um ", "hey ", "so yeah ", "quick one: ", "oh and "]
+ENDINGS = ["", ".", "!", "...", " !!", " lol"]
+# Words swapped in hand-written cases: each list's words are interchangeable
+SWAPS = [["today", "tonight", "tomorrow", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "this weekend"],
+         TIMES, [name for name in NAMES if " " not in name], ITEMS]
+_SWAP_GROUPS = {word.lower(): words for words in SWAPS for word in words}
+_SWAP_PATTERN = re.compile(r"\b(" + "|".join(map(re.escape, sorted(_SWAP_GROUPS, key=len, reverse=True))) + r")\b",
+                           re.IGNORECASE)
+# Draws of a family before a repeated input gets a reference number instead;
+# a family whose last DRY_AFTER cases all needed one gets a single draw
+MAX_DRAWS = 8
+DRY_AFTER = 2
+
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def _fill(rng: random.Random, phrase: str) -> str:
+    return phrase.format(name=rng.choice(NAMES), project=rng.choice(PROJECTS), item=rng.choice(ITEMS))
+
+
+def _capitalize(text: str) -> str:
+    return text[:1].upper() + text[1:]
+
+
+def _entry(text: str, category: str, is_task: bool) -> Dict:
+    return {"text_segment": _capitalize(text), "category": category, "is_task": is_task}
+
+
+def _pick(rng: random.Random, pairs: Sequence[Tuple[str, str]]) -> Tuple[str, str]:
+    category, phrase = rng.choice(pairs)
+    return category, _fill(rng, phrase)
+
+
+def _when(rng: random.Random) -> str:
+    return rng.choice([f"at {rng.choice(TIMES)} {rng.choice(DAYS)}", f"by {rng.choice(DAYS)}", rng.choice(DAYS), ""])
+
+
+# Each template returns (input_text, expected_entries, instruction)
+Template = Callable[[random.Random], Tuple[str, List[Dict], str]]
+
+
+def _instruction_detection(rng):
+    category, action = _pick(rng, ACTIONS)
+    action = f"{action} {_when(rng)}".strip()
+    instruction = rng.choice(["make this a to-do", "remind me to", "add a task", "todo"])
+    text = f"Remind me to {action}" if instruction == "remind me to" else f"{_capitalize(instruction)}: {action}"
+    return text, [_entry(action, category, True)], instruction
+
+
+def _category_override(rng):
+    category = rng.choice(CATEGORIES)
+    _, observation = _pick(rng, OBSERVATIONS)
+    instruction = f"file this under {category.lower()}"
+    return f"{_capitalize(instruction)}: {observation}", [_entry(observation, category, False)], instruction
+
+
+def _multiple_entries(rng):
+    category, observation = _pick(rng, OBSERVATIONS)
+    task_category, action = _pick(rng, ACTIONS)
+    return (f"{_capitalize(observation)} need to {action} too",
+            [_entry(observation, category, False), _entry(f"need to {action} too", task_category, True)], "")
+
+
+def _mixed_instructions(rng):
+    category, observation = _pick(rng, OBSERVATIONS)
+    task_category, action = _pick(rng, ACTIONS)
+    return (f"Note that {observation} but make this a to-do: {action}",
+            [_entry(observation, category, False), _entry(action, task_category, True)],
+            "note that, make this a to-do")
+
+
+def _single_word_task(rng):
+    word, category = rng.choice(SINGLE_WORDS)
+    return word, [_entry(word, category, True)], ""
+
+
+def _modal(verb: str, is_task: bool) -> Template:
+    def template(rng):
+        category, phrase = _pick(rng, ACTIONS if is_task else ASPIRATIONS)
+        text = f"I {verb} {phrase} {rng.choice(DAYS) if rng.random() < 0.5 else ''}".strip()
+        return text, [_entry(text, category, is_task)], ""
+    return template
+
+
+def _future_aspiration(rng):
+    category, aspiration = _pick(rng, ASPIRATIONS)
+    text = f"Next {rng.choice(SEASONS)} I would like to {aspiration}"
+    return text, [_entry(text, category, False)], ""
+
+
+def _want_vague(rng):
+    category, aspiration = _pick(rng, ASPIRATIONS)
+    text = f"I want to {aspiration} {rng.choice(['someday', 'eventually', 'at some point'])}"
+    return text, [_entry(text, category, False)], ""
+
+
+def _temporal_specific_time(rng):
+    category, action = _pick(rng, ACTIONS)
+    text = f"{_capitalize(action)} at {rng.choice(TIMES)} {rng.choice(DAYS)}"
+    return text, [_entry(text, category, True)], ""
+
+
+def _temporal_deadline(rng):
+    category, action = _pick(rng, ACTIONS)
+    text = f"{_capitalize(action)} by {rng.choice(DAYS)}"
+    return text, [_entry(text, category, True)], ""
+
+
+def _temporal_vague_goal(rng):
+    category, aspiration = _pick(rng, ASPIRATIONS)
+    text = f"{_capitalize(aspiration)} this {rng.choice(SEASONS)}"
+    return text, [_entry(text, category, False)], ""
+
+
+def _temporal_conditional(rng):
+    category, action = _pick(rng, ACTIONS)
+    text = f"If {_fill(rng, rng.choice(CONDITIONS))}, {action}"
+    return text, [_entry(text, category, False)], ""
+
+
+def _obligation_complaint(rng):
+    category, complaint = rng.choice(COMPLAINTS)
+    text = f"Ugh I have to {complaint} {rng.choice(['😫', '🙄', 'again', ''])}".strip()
+    return text, [_entry(text[4:], category, False)], ""
+
+
+def _obligation_deadline(rng):
+    category, action = _pick(rng, ACTIONS)
+    text = f"Have to {action} by {rng.choice(TIMES)}"
+    return text, [_entry(text, category, True)], ""
+
+
+def _obligation_concrete_action(rng):
+    category, action = _pick(rng, ACTIONS)
+    text = f"Need to {action} before {rng.choice(['it closes', 'the weekend', 'I leave', rng.choice(TIMES)])}"
+    return text, [_entry(text, category, True)], ""
+
+
+def _embedded_task_supplies(rng):
+    text = f"Running low on {rng.choice(ITEMS)}"
+    return text, [_entry(text, "Personal", False)], ""
+
+
+def _question_pondering(rng):
+    category, action = _pick(rng, ACTIONS)
+    text = f"Should I {action} {rng.choice(DAYS)}?"
+    return text, [_entry(text, category, False)], ""
+
+
+def _question_self_reminder(rng):
+    category, action = _pick(rng, ACTIONS)
+    text = f"Don't forget to {action}"
+    return text, [_entry(text, category, True)], ""
+
+
+def _question_imperative(rng):
+    category, action = _pick(rng, ACTIONS)
+    text = f"Remember to {action} {_when(rng)}".strip()
+    return text, [_entry(text, category, True)], ""
+
+
+def _voice_transcription_filler(rng):
+    category, action = _pick(rng, ACTIONS)
+    text = f"so um yeah i was thinking like i really need to you know {action.lower()} and stuff"
+    return text, [_entry(f"I need to {action}", category, True)], ""
+
+
+def _typos_informal(rng):
+    category, action = _pick(rng, ACTIONS)
+    day = rng.choice(DAYS)
+    text = f"gotta {_typo(rng, action, force=True)} {_typo(rng, day)}"
+    return text, [_entry(f"{action} {day}", category, True)], ""
+
+
+def _shorthand_schedule(rng):
+    project, name = rng.choice(PROJECTS), rng.choice(NAMES)
+    first, second = rng.sample(TIMES, 2)
+    return (f"{project} meeting @ {first}, lunch w/ {name.lower()} {second}, gym after work if time",
+            [_entry(f"{project} meeting at {first}", "Work", False),
+             _entry(f"Lunch with {name} at {second}", "Personal", False),
+             _entry("Gym after work if time", "Health", False)], "")
+
+
+def _urgency_markers(rng):
+    category, action = _pick(rng, ACTIONS)
+    return (f"!!!URGENT!!! {_capitalize(action)} ASAP!!!", [_entry(f"{action} ASAP", category, True)], "")
+
+
+TEMPLATES: Dict[str, Template] = {
+    "instruction_detection": _instruction_detection,
+    "category_override": _category_override,
+    "multiple_entries": _multiple_entries,
+    "mixed_instructions": _mixed_instructions,
+    "single_word_task": _single_word_task,
+    "future_aspiration": _future_aspiration,
+    "modal_verb_must": _modal("must", True),
+    "modal_verb_should": _modal("should probably", False),
+    "modal_verb_could": _modal("could", False),
+    "modal_verb_might": _modal("might", False),
+    "modal_verb_want_vague": _want_vague,
+    "temporal_specific_time": _temporal_specific_time,
+    "temporal_deadline": _temporal_deadline,
+    "temporal_vague_goal": _temporal_vague_goal,
+    "temporal_conditional": _temporal_conditional,
+    "obligation_complaint": _obligation_complaint,
+    "obligation_deadline": _obligation_deadline,
+    "obligation_concrete_action": _obligation_concrete_action,
+    "embedded_task_supplies": _embedded_task_supplies,
+    "question_pondering": _question_pondering,
+    "question_self_reminder": _question_self_reminder,
+    "question_imperative": _question_imperative,
+    "voice_transcription_filler": _voice_transcription_filler,
+    "typos_informal": _typos_informal,
+    "shorthand_schedule": _shorthand_schedule,
+    "urgency_markers": _urgency_markers,
+}
+
+
+def _typo(rng: random.Random, text: str, force: bool = False) -> str:
+    """Swap, drop or double a letter in one longer word"""
+    words = text.split(" ")
+    candidates = [index for index, word in enumerate(words) if len(word) >= 5 and word.isalpha()]
+    if not candidates or not (force or rng.random() < 0.5):
+        return text
+    index = rng.choice(candidates)
+    word, position = words[index], rng.randrange(1, len(words[index]) - 2)
+    kind = rng.randrange(3)
+    if kind == 0:
+        word = word[:position] + word[position + 1] + word[position] + word[position + 2:]
+    elif kind == 1:
+        word = word[:position] + word[position + 1:]
+    else:
+        word = word[:position] + word[position] + word[position:]
+    words[index] = word
+    return " ".join(words)
+
+
+@lru_cache(maxsize=None)
+def _swappable(text: str) -> Tuple[str, ...]:
+    """The SWAPS words in a hand-written input, lowercased, in order of first appearance"""
+    return tuple(dict.fromkeys(word.lower() for word in _SWAP_PATTERN.findall(text)))
+
+
+def swap_entities(rng: random.Random, text: str, entries: List[Dict]) -> Tuple[str, List[Dict]]:
+    """A hand-written case with its days, times, names and items replaced, the same way in every entry"""
+    words = _swappable(text)
+    if not words:
+        return text, entries
+    replacements = {word: rng.choice(_SWAP_GROUPS[word]) for word in words}
+
+    def replace(match: "re.Match") -> str:
+        replacement = replacements.get(match.group(0).lower(), match.group(0))
+        return _capitalize(replacement) if match.group(0)[:1].isupper() else replacement
+
+    return (_SWAP_PATTERN.sub(replace, text),
+            [dict(entry, text_segment=_SWAP_PATTERN.sub(replace, entry["text_segment"])) for entry in entries])
+
+
+def perturb(rng: random.Random, text: str) -> str:
+    """A variant of an input that should keep its labels"""
+    if rng.random() < 0.25:
+        text = text.lower()
+    if rng.random() < 0.2:
+        text = _typo(rng, text, force=True)
+    if rng.random() < 0.15:
+        text = rng.choice(FILLERS) + text[:1].lower() + text[1:]
+    if rng.random() < 0.3 and not text.endswith("?"):
+        text = text.rstrip(".!") + rng.choice(ENDINGS)
+    return text
+
+
+class SeenInputs:
+    """Bloom filter of normalized input texts (as dedup.normalize); false positives only cost a redraw"""
+
+    def __init__(self, capacity: int, bits_per_input: int = 16, hashes: int = 8):
+        self.size = max(capacity, 1) * bits_per_input
+        self.bits = bytearray((self.size + 7) // 8)
+        self.hashes = hashes
+
+    def add(self, text: str) -> bool:
+        """Record `text`; False if it (probably) was already there"""
+        key = _NON_WORD.sub(" ", text.lower()).strip()
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first, step = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        new = False
+        for i in range(self.hashes):
+            bit = (first + i * step) % self.size
+            if not self.bits[bit >> 3] & (1 << (bit & 7)):
+                self.bits[bit >> 3] |= 1 << (bit & 7)
+                new = True
+        return new
+
+
+def generate(count: int, seed: int = 0, families: Optional[Sequence[str]] = None,
+             seed_cases: Optional[Sequence[Dict]] = None) -> Iterator[Dict]:
+    """`count` synthetic {"item": ...} cases with unique inputs, the same ones for the same arguments"""
+    by_family: Dict[str, List[Dict]] = {}
+    for case in seed_cases or []:
+        item = case.get("item", case)
+        by_family.setdefault(item.get("test_type", ""), []).append(item)
+    names = sorted(set(by_family) | set(TEMPLATES)) if families is None else list(families)
+    unknown = [name for name in names if name not in by_family and name not in TEMPLATES]
+    if unknown:
+        raise ValueError(f"No template or seed cases for test type(s): {', '.join(unknown)}")
+
+    rng = random.Random(seed)
+    seen = SeenInputs(count)
+    numbered: Counter = Counter()  # consecutive cases per family that needed a reference number
+    for index in range(count):
+        family = rng.choice(names)
+        for _ in range(1 if numbered[family] >= DRY_AFTER else MAX_DRAWS):
+            if family in TEMPLATES:
+                text, entries, instruction = TEMPLATES[family](rng)
+            else:
+                seed_item = rng.choice(by_family[family])
+                text, instruction = seed_item["input_text"], seed_item.get("instruction", "")
+                text, entries = swap_entities(rng, text, [dict(entry) for entry in seed_item["expected_entries"]])
+            text = perturb(rng, text)
+            if seen.add(text):
+                numbered[family] = 0
+                break
+        else:
+            # No reference number appears twice, so this input is new
+            text = f"{text} (#{index + 1})"
+            seen.add(text)
+            numbered[family] += 1
+        yield {"item": {"input_text": text, "expected_entries": entries,
+                        "test_type": family, "instruction": instruction}}
+
+
+def read_seed_cases(path: Path) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_cases(cases: Iterator[Dict], output: str) -> Counter:
+    """Stream cases to a JSONL file (renamed into place when complete) or stdout ("-")"""
+    families: Counter = Counter()
+    if output == "-":
+        for case in cases:
+            sys.stdout.write(json.dumps(case) + "\n")
+            families[case["item"]["test_type"]] += 1
+        return families
+    path = Path(output)
+    tmp_path = path.with_name(path.name + ".tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for case in cases:
+                f.write(json.dumps(case) + "\n")
+                families[case["item"]["test_type"]] += 1
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return families
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic eval dataset for load testing")
+    parser.add_argument("--cases", type=int, default=10_000, help="number of cases (default: 10000)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed; the same seed gives the same file")
+    parser.add_argument("-o", "--output", default="synthetic_dataset.jsonl", metavar="PATH",
+                        help="output JSONL, or - for stdout (default: synthetic_dataset.jsonl)")
+    parser.add_argument("--test-type", nargs="+", default=None, metavar="TYPE",
+                        help="only these families (default: every family in the seed dataset or with a template)")
+    parser.add_argument("--seed-dataset", type=Path, default=DATASET_PATH, metavar="PATH",
+                        help="hand-written cases for the families without a template")
+    args = parser.parse_args()
+
+    try:
+        cases = generate(args.cases, args.seed, args.test_type, read_seed_cases(args.seed_dataset))
+        families = write_cases(cases, args.output)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    # Keep stdout clean when it carries the dataset
+    log = sys.stderr if args.output == "-" else sys.stdout
+    templated = sum(count for family, count in families.items() if family in TEMPLATES)
+    print(f"Wrote {sum(families.values())} cases in {len(families)} families to "
+          f"{'stdout' if args.output == '-' else args.output} "
+          f"(seed {args.seed}; {templated} from templates, the rest perturbed hand-written cases)", file=log)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
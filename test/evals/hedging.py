@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Hedged requests for tail latency
+
+If a request hasn't finished by the model's running p90 latency, a duplicate
+is sent and whichever answers first (successfully) wins; the other is
+cancelled. Duplicates are capped at a fraction of all requests so hedging
+can't more than marginally raise spend. Latency saved by a winning hedge is
+estimated from the latency history: the expected remaining time of a
+request that has already run as long as the primary had.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from streaming import percentile
+
+DEFAULT_QUANTILE = 90.0
+DEFAULT_MAX_FRACTION = 0.1
+DEFAULT_MIN_SAMPLES = 20
+DEFAULT_WINDOW = 500
+
+
+def _is_success(result: Any) -> bool:
+    """httpx responses count only when they aren't errors"""
+    status_code = getattr(result, "status_code", None)
+    return status_code is None or status_code < 400
+
+
+class HedgingPolicy:
+    """Per-model hedging at a running latency quantile with a duplicate-request budget"""
+
+    def __init__(self, quantile: float = DEFAULT_QUANTILE, max_fraction: float = DEFAULT_MAX_FRACTION,
+                 min_samples: int = DEFAULT_MIN_SAMPLES, window: int = DEFAULT_WINDOW,
+                 accept: Callable[[Any], bool] = _is_success):
+        self.quantile = quantile
+        self.max_fraction = max_fraction
+        self.min_samples = min_samples
+        self.accept = accept
+        self._window = window
+        self._latencies: Dict[str, Deque[float]] = {}
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.suppressed = 0
+        self.saved_seconds = 0.0
+
+    @classmethod
+    def from_args(cls, args) -> Optional["HedgingPolicy"]:
+        """The policy for --hedge, or None when hedging is off"""
+        if not args.hedge:
+            return None
+        return cls(quantile=args.hedge_quantile, max_fraction=args.hedge_budget)
+
+    def _history(self, model: str) -> Deque[float]:
+        if model not in self._latencies:
+            self._latencies[model] = deque(maxlen=self._window)
+        return self._latencies[model]
+
+    def threshold(self, model: str) -> Optional[float]:
+        """Seconds after which a request to `model` is hedged, once enough latencies are known"""
+        history = self._history(model)
+        if len(history) < self.min_samples:
+            return None
+        return percentile(list(history), self.quantile)
+
+    def _expected_remaining(self, model: str, elapsed: float) -> float:
+        longer = [latency for latency in self._history(model) if latency > elapsed]
+        return sum(longer) / len(longer) - elapsed if longer else 0.0
+
+    async def _first_accepted(self, *tasks: asyncio.Task) -> asyncio.Task:
+        pending = set(tasks)
+        last = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                last = task
+                if task.exception() is None and self.accept(task.result()):
+                    return task
+        # Neither was usable; hand back the last one so its error surfaces
+        return last
+
+    async def run(self, model: str, send: Callable[[], Awaitable[Any]]) -> Any:
+        """Call send(), hedging with a second send() if it is slower than the threshold"""
+        self.requests += 1
+        start = time.perf_counter()
+        primary = asyncio.ensure_future(send())
+        delay = self.threshold(model)
+
+        if delay is not None:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if not done:
+                if self.hedges + 1 > self.max_fraction * self.requests:
+                    self.suppressed += 1
+                else:
+                    return await self._hedge(model, primary, send, start)
+
+        try:
+            result = await primary
+        finally:
+            if not primary.done():
+                primary.cancel()
+        self._history(model).append(time.perf_counter() - start)
+        return result
+
+    async def _hedge(self, model: str, primary: asyncio.Task, send: Callable[[], Awaitable[Any]],
+                     start: float) -> Any:
+        self.hedges += 1
+        hedge_start = time.perf_counter()
+        hedge = asyncio.ensure_future(send())
+        try:
+            winner = await self._first_accepted(primary, hedge)
+        finally:
+            for task in (primary, hedge):
+                if not task.done():
+                    task.cancel()
+        now = time.perf_counter()
+        if winner is hedge:
+            self.hedge_wins += 1
+            self.saved_seconds += self._expected_remaining(model, now - start)
+            # The primary's real latency is unknown; the hedge's own is a genuine sample
+            self._history(model).append(now - hedge_start)
+        else:
+            self._history(model).append(now - start)
+        return winner.result()
+
+    def summary(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_rate": round(self.hedges / self.requests * 100, 1) if self.requests else None,
+            "hedge_wins": self.hedge_wins,
+            "suppressed_by_budget": self.suppressed,
+            "estimated_latency_saved_seconds": round(self.saved_seconds, 2),
+            "thresholds": {model: round(self.threshold(model), 3)
+                           for model in self._latencies if self.threshold(model) is not None},
+        }
+
+    def print_summary(self) -> None:
+        """Print hedges fired and the latency they saved"""
+        stats = self.summary()
+        rate = f"{stats['hedge_rate']:.1f}%" if stats["hedge_rate"] is not None else "n/a"
+        print(f"\nHedging (p{self.quantile:g}, budget {self.max_fraction:.0%}): "
+              f"{self.hedges} of {self.requests} requests hedged ({rate}), "
+              f"{self.hedge_wins} won by the hedge, {self.suppressed} skipped by budget, "
+              f"~{self.saved_seconds:.1f}s latency saved")
+        for model, threshold in stats["thresholds"].items():
+            print(f"  {model}: hedge after {threshold:.2f}s")
+
+
+def add_hedging_arguments(parser) -> None:
+    """Add the shared --hedge options to an argparse parser"""
+    parser.add_argument("--hedge", action="store_true",
+                        help="send a duplicate request when one runs past the model's running latency quantile")
+    parser.add_argument("--hedge-quantile", type=float, default=DEFAULT_QUANTILE, metavar="Q",
+                        help=f"latency percentile that triggers a hedge (default: {DEFAULT_QUANTILE:g})")
+    parser.add_argument("--hedge-budget", type=float, default=DEFAULT_MAX_FRACTION, metavar="FRACTION",
+                        help=f"maximum duplicate requests as a fraction of all requests "
+                             f"(default: {DEFAULT_MAX_FRACTION:g})")
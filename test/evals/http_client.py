@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Pooled keep-alive HTTP clients shared by the eval scripts
+
+One httpx connection pool per run instead of a fresh TLS connection per
+request. HTTP/2 is used when the `h2` package is installed
+(pip install "httpx[http2]"). Both clients count how many requests reused a
+pooled connection and how long was spent in TCP connect and TLS handshakes.
+"""
+
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional
+
+import httpx
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+BASE_URL = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_MAX_CONNECTIONS = 64
+
+# Re-exported so runners can catch timeouts without importing httpx themselves
+TimeoutException = httpx.TimeoutException
+
+
+def load_api_key() -> Optional[str]:
+    """OPENAI_API_KEY from the environment, falling back to the repo root .env"""
+    if os.environ.get("OPENAI_API_KEY"):
+        return os.environ["OPENAI_API_KEY"]
+    env_path = Path(__file__).parent.parent.parent / '.env'
+    if env_path.exists():
+        with open(env_path, 'r') as f:
+            for line in f:
+                if line.startswith('OPENAI_API_KEY='):
+                    return line.strip().split('=', 1)[1]
+    return None
+
+
+def require_api_key() -> str:
+    """load_api_key, exiting with the usual message when no key is configured"""
+    api_key = load_api_key()
+    if not api_key:
+        print("Error: OPENAI_API_KEY not found in environment or .env file")
+        exit(1)
+    return api_key
+
+
+class ConnectionStats:
+    """Connection reuse counters fed by httpcore trace events"""
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+        self.connect_seconds = 0.0
+        self.tls_seconds = 0.0
+        self.http_versions: Dict[str, int] = {}
+
+    @property
+    def reused(self) -> int:
+        return max(0, self.requests - self.connections_opened)
+
+    def observe(self, event_name: str, started: Dict[str, float]) -> None:
+        """Record one trace event; `started` holds per-request start timestamps"""
+        now = time.perf_counter()
+        if event_name.endswith(".started"):
+            started[event_name[:-len(".started")]] = now
+            return
+        if not event_name.endswith(".complete"):
+            return
+        step = event_name[:-len(".complete")]
+        elapsed = now - started.pop(step, now)
+        if step == "connection.connect_tcp":
+            self.connections_opened += 1
+            self.connect_seconds += elapsed
+        elif step == "connection.start_tls":
+            self.tls_handshakes += 1
+            self.tls_seconds += elapsed
+
+    def record_response(self, response: httpx.Response) -> None:
+        self.requests += 1
+        version = response.http_version
+        self.http_versions[version] = self.http_versions.get(version, 0) + 1
+
+    def as_dict(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "reused": self.reused,
+            "tls_handshakes": self.tls_handshakes,
+            "connect_seconds": round(self.connect_seconds, 3),
+            "tls_seconds": round(self.tls_seconds, 3),
+            "http_versions": self.http_versions,
+        }
+
+    def print_summary(self) -> None:
+        """Print connection reuse and per-request connect/TLS overhead"""
+        if not self.requests:
+            return
+        overhead = (self.connect_seconds + self.tls_seconds) / self.requests
+        versions = ", ".join(f"{v} x{n}" for v, n in sorted(self.http_versions.items()))
+        print(f"\nHTTP connections: {self.requests} requests over {self.connections_opened} connections "
+              f"({self.reused / self.requests * 100:.1f}% reused, {versions})")
+        print(f"  TCP connect {self.connect_seconds:.2f}s, TLS {self.tls_seconds:.2f}s "
+              f"({self.tls_handshakes} handshakes), {overhead * 1000:.1f} ms per request")
+
+
+def _client_options(api_key: Optional[str], timeout: float, max_connections: int) -> Dict:
+    headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+    return {
+        "base_url": BASE_URL,
+        "headers": headers,
+        "timeout": timeout,
+        "http2": HTTP2_AVAILABLE,
+        "limits": httpx.Limits(max_connections=max_connections,
+                               max_keepalive_connections=max_connections),
+    }
+
+
+class EvalHttpClient:
+    """Synchronous pooled client for scripts that don't use the async engine"""
+
+    def __init__(self, api_key: Optional[str] = None, timeout: float = DEFAULT_TIMEOUT,
+                 max_connections: int = DEFAULT_MAX_CONNECTIONS):
+        self.stats = ConnectionStats()
+        self._client = httpx.Client(**_client_options(api_key or load_api_key(), timeout, max_connections))
+
+    def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        started: Dict[str, float] = {}
+
+        def trace(event_name, info):
+            self.stats.observe(event_name, started)
+
+        response = self._client.request(method, path, extensions={"trace": trace}, **kwargs)
+        self.stats.record_response(response)
+        return response
+
+    def post(self, path: str, **kwargs) -> httpx.Response:
+        return self.request("POST", path, **kwargs)
+
+    def get(self, path: str, **kwargs) -> httpx.Response:
+        return self.request("GET", path, **kwargs)
+
+    def close(self) -> None:
+        self._client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AsyncEvalHttpClient:
+    """Asynchronous pooled client used by eval_engine runners
+
+    The underlying httpx pool belongs to an event loop, so a new pool is opened
+    the first time the client is used on a loop. Stats span all loops.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, timeout: float = DEFAULT_TIMEOUT,
+                 max_connections: int = DEFAULT_MAX_CONNECTIONS):
+        self.stats = ConnectionStats()
+        self._options = _client_options(api_key or load_api_key(), timeout, max_connections)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _pool(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(**self._options)
+            self._loop = loop
+        return self._client
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        started: Dict[str, float] = {}
+
+        async def trace(event_name, info):
+            self.stats.observe(event_name, started)
+
+        response = await self._pool().request(method, path, extensions={"trace": trace}, **kwargs)
+        self.stats.record_response(response)
+        return response
+
+    async def post(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, path: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """Streaming request; the body is read inside the block (e.g. aiter_text())"""
+        started: Dict[str, float] = {}
+
+        async def trace(event_name, info):
+            self.stats.observe(event_name, started)
+
+        async with self._pool().stream(method, path, extensions={"trace": trace}, **kwargs) as response:
+            self.stats.record_response(response)
+            yield response
+
+    async def get(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def aclose(self) -> None:
+        """Close the pool for the current loop; pass as run_cases(on_finish=...)"""
+        if self._client is not None and self._loop is asyncio.get_running_loop():
+            await self._client.aclose()
+            self._client = None
+            self._loop = None
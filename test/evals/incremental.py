@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Incremental re-evaluation from the results warehouse
+
+Each warehouse row records what produced it:
+- the case, keyed by its content hash, so the labels are part of the key
+- the model and the prompt hash
+- the run, with its runner script and the dataset version
+
+A model's output depends on the runner, the model, the prompt and the
+input text, but not on the expected labels. After patch_dataset.py flips
+some labels, the stored outputs are still valid and only need re-grading.
+After a prompt edit, only the model/prompt pairs whose prompt hash changed
+have nothing stored.
+
+With --incremental, compare_models and run_minimal_eval check here before
+sending a case. If there is a graded output for the same script, model,
+prompt hash and input text, they re-grade it against the current labels
+instead of calling the API. Only the other cases are sent. The summary
+gives the calls, dollars and model time skipped, and how many reused cases
+changed grade because their labels changed.
+
+    python incremental.py                           # coverage of the current dataset
+    python incremental.py --script compare_models.py --model gpt-4.1
+"""
+
+import argparse
+import json
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from checkpoint import case_hash
+from dataset import DATASET_PATH, dataset_version, load_cases
+from warehouse import DEFAULT_WAREHOUSE_PATH, ResultsWarehouse
+
+
+@dataclass
+class StoredOutput:
+    """The latest graded output of one input for a script, model and prompt"""
+    run_id: int
+    case_id: str  # The case as it was graded, labels included
+    entries: Optional[List[Dict]]
+    passed: bool
+    seconds: Optional[float]
+    cost_usd: Optional[float]
+
+
+class StoredOutputs:
+    """Stored outputs of one runner script and prompt, looked up per model and input text"""
+
+    def __init__(self, warehouse: ResultsWarehouse, script: str, prompt_hash: str):
+        self.warehouse = warehouse
+        self.script = script
+        self.prompt_hash = prompt_hash
+        self._outputs: Dict[str, Dict[str, StoredOutput]] = {}  # model -> input text -> output
+        self.reused = 0
+        self.relabelled = 0
+        self.grade_changed = 0
+        self.queried = 0
+        self.seconds_saved = 0.0
+        self.usd_saved = 0.0
+
+    def _load(self, model: str) -> Dict[str, StoredOutput]:
+        outputs: Dict[str, StoredOutput] = {}
+        for run_id, input_text, case_id, output, passed, seconds, cost, cached in \
+                self.warehouse.graded_outputs(model, self.prompt_hash, self.script):
+            # Later runs win. A reused or cached row cost nothing itself, so it keeps what the
+            # original answer cost.
+            previous = outputs.get(input_text)
+            if cached and previous:
+                seconds, cost = previous.seconds, previous.cost_usd
+            outputs[input_text] = StoredOutput(run_id, case_id, json.loads(output) if output else None,
+                                               bool(passed), seconds, cost)
+        return outputs
+
+    def lookup(self, model: str, test_case: Dict) -> Optional[StoredOutput]:
+        """The stored output for this case's input, or None if it has to be sent"""
+        if model not in self._outputs:
+            self._outputs[model] = self._load(model)
+        stored = self._outputs[model].get(test_case["input_text"])
+        if stored is None:
+            self.queried += 1
+            return None
+        self.reused += 1
+        self.relabelled += stored.case_id != case_hash(test_case)
+        self.seconds_saved += stored.seconds or 0.0
+        self.usd_saved += stored.cost_usd or 0.0
+        return stored
+
+    def regraded(self, stored: StoredOutput, passed: bool) -> None:
+        """Note the new grade of a reused output"""
+        self.grade_changed += stored.passed != passed
+
+    def summary(self) -> Dict:
+        return {
+            "reused": self.reused,
+            "relabelled": self.relabelled,
+            "grade_changed": self.grade_changed,
+            "queried": self.queried,
+            "seconds_saved": round(self.seconds_saved, 1),
+            "usd_saved": round(self.usd_saved, 4),
+        }
+
+    def print_summary(self) -> None:
+        total = self.reused + self.queried
+        if not total:
+            return
+        print(f"\nIncremental: reused {self.reused}/{total} stored outputs, sent {self.queried} "
+              f"(skipped ~${self.usd_saved:.4f} and ~{self.seconds_saved:.0f}s of model time)")
+        if self.relabelled:
+            print(f"  {self.relabelled} reused cases have new labels since they were graded; "
+                  f"{self.grade_changed} changed grade")
+
+
+def stored_outputs(incremental: bool, warehouse: ResultsWarehouse, script: str,
+                   prompt_hash: str) -> Optional[StoredOutputs]:
+    """StoredOutputs if incremental (--incremental) and the warehouse is on, else None"""
+    if not incremental:
+        return None
+    if not warehouse.enabled:
+        print("⚠️  --incremental needs the results warehouse; every case will be sent")
+        return None
+    return StoredOutputs(warehouse, script, prompt_hash)
+
+
+def add_incremental_arguments(parser) -> None:
+    """Add the shared --incremental option to an argparse parser"""
+    parser.add_argument("--incremental", action="store_true",
+                        help="re-grade outputs stored in the warehouse for the same model, prompt and input "
+                             "instead of sending them again")
+
+
+def coverage(warehouse: ResultsWarehouse, test_cases: List[Dict], script: Optional[str] = None,
+             model: Optional[str] = None) -> List[Dict]:
+    """For each stored script/model/prompt: how many current cases it covers, as is or relabelled"""
+    current = {case["input_text"]: case_hash(case) for case in test_cases}
+    rows = warehouse.graded_inputs(script, model)
+    pairs: Dict[Tuple, Dict] = defaultdict(lambda: {"same": set(), "relabelled": set(), "last_run": ""})
+    for row_script, row_model, prompt_hash, input_text, case_id, started_at in rows:
+        if input_text not in current:
+            continue
+        pair = pairs[(row_script, row_model, prompt_hash)]
+        (pair["same"] if current[input_text] == case_id else pair["relabelled"]).add(input_text)
+        pair["last_run"] = max(pair["last_run"], started_at)
+    report = []
+    for (row_script, row_model, prompt_hash), pair in pairs.items():
+        relabelled = pair["relabelled"] - pair["same"]
+        covered = len(pair["same"]) + len(relabelled)
+        report.append({"script": row_script, "model": row_model, "prompt_hash": prompt_hash,
+                       "last_run": pair["last_run"], "cases": len(current), "unchanged": len(pair["same"]),
+                       "relabelled": len(relabelled), "to_send": len(current) - covered})
+    return sorted(report, key=lambda entry: (entry["script"] or "", entry["model"], entry["last_run"]), reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show which stored results the current dataset can reuse")
+    parser.add_argument("--warehouse", type=Path, default=DEFAULT_WAREHOUSE_PATH, metavar="PATH")
+    parser.add_argument("--dataset", type=Path, default=DATASET_PATH, metavar="PATH")
+    parser.add_argument("--script", default=None, help="only this runner, e.g. compare_models.py")
+    parser.add_argument("--model", default=None)
+    args = parser.parse_args()
+
+    if not args.warehouse.exists():
+        print(f"No results warehouse at {args.warehouse}")
+        return 1
+    test_cases = [case["item"] for case in load_cases(args.dataset)]
+    warehouse = ResultsWarehouse(args.warehouse)
+    try:
+        report = coverage(warehouse, test_cases, args.script, args.model)
+    finally:
+        warehouse.close()
+
+    print(f"\nDataset version {dataset_version(test_cases)}: {len(test_cases)} cases")
+    print("%-28s | %-14s | %-16s | %-19s | %-9s | %-10s | %-7s" %
+          ("Script", "Model", "Prompt", "Last run", "Unchanged", "Relabelled", "To send"))
+    print("-" * 122)
+    for entry in report:
+        print("%-28s | %-14s | %-16s | %-19s | %-9d | %-10d | %-7d" % (
+            (entry["script"] or "-")[:28], entry["model"][:14], entry["prompt_hash"] or "-",
+            entry["last_run"][:19], entry["unchanged"], entry["relabelled"], entry["to_send"]))
+    print("\nRelabelled cases are re-graded without API calls. A prompt hash that isn't listed has "
+          "nothing stored, so every case is sent.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
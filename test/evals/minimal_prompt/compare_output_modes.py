@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Measure what the strict json_schema output costs against json_object
+
+Every case is sent twice with the same model and prompt: once to the
+Responses API with the strict schema OpenAiService.extractEntries uses, and
+once to Chat Completions with json_object. The prompt is the production one
+from ai_service.dart, unless --iteration picks a prompt file. Both go
+through the provider layer, so they share the cache, limiter, retries and
+timeouts, and both are scored the same way. The report covers pass rate,
+output that failed to parse, latency of uncached requests, tokens and cost
+for each mode, plus the cases only one mode got right.
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Dict, List
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from run_minimal_eval import API_KEY, load_prompt
+from responses_eval import entries_match, load_system_prompt, load_test_cases
+from prompt_loader import add_prompt_arguments
+from eval_engine import add_concurrency_argument, run_cases
+from rate_limiter import AdaptiveRateLimiter, add_rate_limit_arguments
+from http_client import AsyncEvalHttpClient, TimeoutException
+from response_cache import ResponseCache, add_cache_arguments
+from timeout_policy import TimeoutPolicy, add_timeout_arguments
+from retry import RetryPolicy, add_retry_arguments, attempts_of
+from checkpoint import content_hash
+from dataset import dataset_version
+from providers import PROVIDERS, Completion
+from streaming import percentile
+from warehouse import ResultsWarehouse, add_warehouse_arguments
+
+DEFAULT_MODEL = "gpt-4.1"
+RESULTS_FILE = Path(__file__).parent / "output_mode_comparison.json"
+
+
+def score(test: Dict, completion: Completion) -> Dict:
+    """Outcome of one case in one mode: passed, failed or error, with its timing"""
+    outcome = {"timing": completion.timing()}
+    if not completion.ok:
+        outcome["status"] = "error"
+        outcome["error"] = completion.error
+        outcome["parse_error"] = completion.status_code == 200
+        return outcome
+    expected = test["item"]["expected_entries"]
+    first = completion.entries[0] if completion.entries else {}
+    outcome["entries"] = completion.entries
+    outcome["status"] = "passed" if entries_match(completion.entries, expected) else "failed"
+    # The chat runners only ever checked the first entry
+    outcome["first_entry_passed"] = (first.get("category") == expected[0]["category"] and
+                                     first.get("is_task") == expected[0]["is_task"])
+    return outcome
+
+
+def summarize_mode(outcomes: List[Dict]) -> Dict:
+    """Pass rates, latency percentiles of uncached requests, tokens and cost for one mode"""
+    finished = [outcome for outcome in outcomes if outcome is not None]
+    scored = [outcome for outcome in finished if outcome["status"] in ("passed", "failed")]
+    timings = [outcome["timing"] for outcome in finished if "timing" in outcome]
+    latencies = [timing["seconds"] for timing in timings if not timing["cached"]]
+    costs = [timing["cost_usd"] for timing in timings if timing["cost_usd"] is not None]
+    return {
+        "cases": len(finished),
+        "passed": sum(outcome["status"] == "passed" for outcome in finished),
+        "pass_rate": round(sum(outcome["status"] == "passed" for outcome in finished) / len(finished) * 100, 1)
+        if finished else None,
+        "first_entry_pass_rate": round(sum(outcome["first_entry_passed"] for outcome in scored) / len(finished) * 100, 1)
+        if finished else None,
+        "parse_errors": sum(outcome.get("parse_error", False) for outcome in finished),
+        "errors": sum(outcome["status"] == "error" for outcome in finished),
+        "timeouts": sum(outcome["status"] == "timeout" for outcome in finished),
+        "uncached_requests": len(latencies),
+        "latency_p50": percentile(latencies, 50),
+        "latency_p90": percentile(latencies, 90),
+        "latency_mean": round(sum(latencies) / len(latencies), 4) if latencies else None,
+        "input_tokens": sum(timing["input_tokens"] for timing in timings),
+        "output_tokens": sum(timing["output_tokens"] for timing in timings),
+        "cost_usd": round(sum(costs), 6) if costs else None,
+    }
+
+
+def print_comparison(model: str, summaries: Dict[str, Dict], only_passed: Dict[str, List[str]]) -> None:
+    print("\n" + "=" * 70)
+    print(f"OUTPUT MODE COMPARISON - {model}")
+    print("=" * 70)
+    print("%-14s | %-8s | %-10s | %-6s | %-8s | %-8s | %-10s" %
+          ("Mode", "Pass", "1st entry", "Parse", "p50 (s)", "p90 (s)", "Cost ($)"))
+    print("-" * 80)
+    for mode, summary in summaries.items():
+        print("%-14s | %-8s | %-10s | %-6d | %-8s | %-8s | %-10s" % (
+            mode, f"{summary['pass_rate'] or 0:.1f}%", f"{summary['first_entry_pass_rate'] or 0:.1f}%",
+            summary["parse_errors"],
+            f"{summary['latency_p50']:.2f}" if summary["latency_p50"] is not None else "-",
+            f"{summary['latency_p90']:.2f}" if summary["latency_p90"] is not None else "-",
+            f"{summary['cost_usd']:.4f}" if summary["cost_usd"] is not None else "-"))
+    strict, loose = summaries["json_schema"], summaries["json_object"]
+    if strict["pass_rate"] is not None and loose["pass_rate"] is not None:
+        print(f"\nStrict schema vs json_object: {strict['pass_rate'] - loose['pass_rate']:+.1f} points pass rate", end="")
+        if strict["latency_p50"] is not None and loose["latency_p50"] is not None:
+            print(f", {strict['latency_p50'] - loose['latency_p50']:+.2f}s p50 latency", end="")
+        print()
+    for mode, inputs in only_passed.items():
+        if inputs:
+            print(f"  Only {mode} passed ({len(inputs)}): " + "; ".join(text[:40] for text in inputs[:5]))
+    if not summaries["json_schema"]["uncached_requests"] or not summaries["json_object"]["uncached_requests"]:
+        print("  (Latency covers uncached requests only; use --refresh to time every case)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare strict json_schema output against json_object")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help=f"model to test (default: {DEFAULT_MODEL})")
+    parser.add_argument("--iteration", type=int, default=None,
+                        help="use iteration_N_prompt.txt instead of the ai_service.dart prompt")
+    add_prompt_arguments(parser)
+    add_concurrency_argument(parser)
+    add_rate_limit_arguments(parser)
+    add_cache_arguments(parser)
+    add_timeout_arguments(parser)
+    add_retry_arguments(parser)
+    add_warehouse_arguments(parser)
+    args = parser.parse_args()
+
+    if args.iteration is not None:
+        prompt, prompt_name = load_prompt(args.iteration), f"iteration {args.iteration}"
+    else:
+        production_prompt = load_system_prompt(args.prompt_variant)
+        prompt, prompt_name = production_prompt.text, f"{args.prompt_variant} ({production_prompt.fingerprint})"
+    test_cases = load_test_cases()
+    limiter = AdaptiveRateLimiter(max_concurrency=args.concurrency)
+    client = AsyncEvalHttpClient(API_KEY)
+    cache = ResponseCache.from_args(args)
+    timeouts = TimeoutPolicy.from_args(args)
+    retries = RetryPolicy.from_args(args)
+    providers = {mode: provider_class(args.model, prompt, client, limiter, cache,
+                                      timeouts=timeouts, retries=retries)
+                 for mode, provider_class in PROVIDERS.items()}
+
+    warehouse = ResultsWarehouse.from_args(args)
+    run_ids = {mode: warehouse.start_run(f"output_mode_{mode}", args.model, content_hash(prompt),
+                                         script=Path(__file__).name, config={"output_mode": mode},
+                                         dataset_version=dataset_version(test_cases))
+               for mode in providers}
+
+    print(f"Comparing {', '.join(providers)} on {args.model} with the {prompt_name} prompt over {len(test_cases)} cases "
+          f"({args.concurrency} in flight)")
+
+    # The modes alternate case by case, so both see the same load and rate limit state
+    requests = [(mode, index, test) for index, test in enumerate(test_cases) for mode in providers]
+    outcomes: Dict[str, List[Dict]] = {mode: [None] * len(test_cases) for mode in providers}
+
+    async def evaluate(_, request) -> Dict:
+        mode, _, test = request
+        provider = providers[mode]
+        timeout = provider.timeout(test["item"]["input_text"])
+        try:
+            return score(test, await provider.complete(test["item"]["input_text"], timeout))
+        except TimeoutException as e:
+            return {"status": "timeout", "attempts": attempts_of(e)}
+        except Exception as e:
+            return {"status": "error", "error": str(e), "attempts": attempts_of(e)}
+
+    completed = 0
+
+    def on_result(_, request, outcome: Dict) -> None:
+        nonlocal completed
+        mode, index, _ = request
+        outcomes[mode][index] = outcome
+        warehouse.record(run_ids[mode], test_cases[index]["item"], outcome["status"], output=outcome.get("entries"),
+                         error=outcome.get("error"), timing=outcome.get("timing"), attempts=outcome.get("attempts"))
+        completed += 1
+        if completed % 20 == 0 or completed == len(requests):
+            print(f"  Progress: {completed}/{len(requests)} requests")
+
+    start_time = time.time()
+    run_cases(requests, evaluate, concurrency=args.concurrency, on_result=on_result, on_finish=client.aclose)
+
+    summaries = {mode: summarize_mode(mode_outcomes) for mode, mode_outcomes in outcomes.items()}
+    only_passed = {
+        mode: [test["item"]["input_text"] for index, test in enumerate(test_cases)
+               if outcomes[mode][index]["status"] == "passed" and
+               all(outcomes[other][index]["status"] != "passed" for other in outcomes if other != mode)]
+        for mode in outcomes
+    }
+    print_comparison(args.model, summaries, only_passed)
+
+    limiter.print_summary()
+    client.stats.print_summary()
+    timeouts.print_summary()
+    timeouts.save()
+    retries.print_summary()
+    cache.print_summary()
+    cache.close()
+    for mode, run_id in run_ids.items():
+        warehouse.finish_run(run_id, summaries[mode])
+    warehouse.print_summary()
+    warehouse.close()
+
+    with open(RESULTS_FILE, "w") as f:
+        json.dump({
+            "model": args.model,
+            "prompt": prompt_name,
+            "total": len(test_cases),
+            "wall_time_seconds": round(time.time() - start_time, 2),
+            "modes": summaries,
+            "only_passed": only_passed,
+            "outcomes": outcomes,
+        }, f, indent=2)
+    limiter.export(args.rate_limit_log or RESULTS_FILE.with_name("output_mode_comparison_ratelimit.json"))
+    print(f"\nResults saved to {RESULTS_FILE.name}")
+
+
+if __name__ == "__main__":
+    main()
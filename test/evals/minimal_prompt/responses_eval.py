@@ -0,0 +1,565 @@
+#!/usr/bin/env python3
+"""
+Shared Responses API evaluation used by the run_gpt5_*, run_gpt41_mini and
+run_4o_mini_updated runners (iteration 7 prompt, strict json_schema output)
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+sys.path.append(str(Path(__file__).parent.parent))
+from eval_engine import add_concurrency_argument, run_cases
+from rate_limiter import AdaptiveRateLimiter, add_rate_limit_arguments
+from http_client import AsyncEvalHttpClient, EvalHttpClient, TimeoutException, require_api_key
+from response_cache import ResponseCache, add_cache_arguments
+from batch_api import add_batch_arguments, run_batch
+from checkpoint import CheckpointJournal, add_checkpoint_arguments, case_hash, content_hash
+from hedging import HedgingPolicy, add_hedging_arguments
+from timeout_policy import TimeoutPolicy, add_timeout_arguments
+from retry import RetryPolicy, add_retry_arguments, attempts_of
+from scheduling import FailureHistory, PartialPassRate, add_scheduling_arguments
+from budget import RunBudget, add_budget_arguments
+from dataset import (add_dataset_arguments, dataset_filters, dataset_path, dataset_version, load_cases,
+                     selection_name)
+from warehouse import ResultsWarehouse, add_warehouse_arguments
+from prompt_loader import (DEFAULT_VARIANT, Prompt, PromptExtractionError, add_prompt_arguments,
+                           load_production_prompt)
+from providers import ENTRY_SCHEMA, ResponsesProvider, build_request_body, extract_entries
+from streaming import (StreamResult, StreamingSchemaValidator, add_streaming_arguments, print_timing_summary,
+                       stream_response, summarize_timings)
+
+DATASET_PATH = Path(__file__).parent.parent / "eval_dataset.jsonl"
+
+
+def load_system_prompt(variant: str = DEFAULT_VARIANT) -> Prompt:
+    """The production extraction prompt from this repo's ai_service.dart (see prompt_loader.py)"""
+    try:
+        return load_production_prompt(variant)
+    except PromptExtractionError as e:
+        print(f"Could not load the {variant} prompt from ai_service.dart: {e}")
+        exit(1)
+
+
+def load_test_cases(filters: Optional[Dict] = None, path: Path = DATASET_PATH) -> List[Dict]:
+    """Read the eval dataset, or the cases matching `filters` (see dataset.load_cases)"""
+    return load_cases(path, **(filters or {}))
+
+
+def entries_match(entries: List[Dict], expected: List[Dict]) -> bool:
+    """Check if response matches expected"""
+    if len(entries) != len(expected):
+        return False
+    for actual, exp in zip(entries, expected):
+        if (actual.get("text_segment", "").strip() == "" or
+            actual.get("category") != exp["category"] or
+            actual.get("is_task") != exp["is_task"]):
+            return False
+    return True
+
+
+async def send_request(model: str, system_prompt: str, client: AsyncEvalHttpClient, input_text: str,
+                       limiter: AdaptiveRateLimiter, cache: ResponseCache,
+                       temperature: Optional[float] = None,
+                       timeout: Optional[float] = None,
+                       hedger: Optional[HedgingPolicy] = None,
+                       timeouts: Optional[TimeoutPolicy] = None,
+                       retries: Optional[RetryPolicy] = None) -> httpx.Response:
+    """POST one case to the Responses API through ResponsesProvider (cache, hedging, retries, limiter)"""
+    provider = ResponsesProvider(model, system_prompt, client, limiter, cache, temperature,
+                                 timeouts=timeouts, retries=retries, hedger=hedger)
+    return await provider.send(input_text, timeout)
+
+
+async def stream_request(model: str, system_prompt: str, client: AsyncEvalHttpClient, input_text: str,
+                         limiter: AdaptiveRateLimiter, cache: ResponseCache,
+                         temperature: Optional[float] = None,
+                         timeout: Optional[float] = None,
+                         retries: Optional[RetryPolicy] = None) -> StreamResult:
+    """Stream one case from the Responses API, aborting once the output breaks ENTRY_SCHEMA
+
+    Cached responses are not read (they have no latency to measure), but
+    completed responses are still stored. With a retry policy, 429/5xx
+    responses and connections that fail before the first event are retried
+    after a backoff (outside the limiter slot); a stream that breaks midway
+    is not.
+    """
+    body = build_request_body(model, system_prompt, input_text, temperature)
+
+    async def attempt() -> StreamResult:
+        async with limiter.slot(model):
+            result = await stream_response(client, body, StreamingSchemaValidator(ENTRY_SCHEMA),
+                                           timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT)
+            limiter.record(model, result.status_code, result.headers)
+        return result
+
+    result = await (retries.run(attempt) if retries else attempt())
+    if result.response is not None and result.response.get('status') == 'completed':
+        cache.store('/responses', body, result.response)
+    return result
+
+
+def score_response(index: int, total: int, test: Dict, response_json: Dict,
+                   request_time: Optional[float] = None) -> Dict:
+    """Classify one Responses API result as passed, failed or error"""
+    item = test["item"]
+    input_text = item["input_text"]
+    expected = item["expected_entries"]
+    test_type = item.get("test_type", "unknown")
+    took = f" (took {request_time:.1f}s)" if request_time is not None else ""
+
+    try:
+        if response_json.get('status') != 'completed':
+            raise Exception(f"API request failed: {response_json}")
+
+        entries = extract_entries(response_json)
+    except Exception as e:
+        return error_outcome(index, total, test, e, request_time)
+
+    usage = response_json.get("usage")
+    if entries_match(entries, expected):
+        print(f"[{index+1}/{total}] ✅ Passed{took}: {input_text[:60]}")
+        return {"status": "passed", "request_time": request_time, "entries": entries, "usage": usage}
+
+    actual_cat = entries[0]['category'] if entries else 'None'
+    actual_task = entries[0]['is_task'] if entries else 'None'
+    print(f"[{index+1}/{total}] ❌ Failed - Expected: {expected[0]['category']}/{expected[0]['is_task']}, " +
+          f"Got: {actual_cat}/{actual_task} (entries: {len(entries)}): {input_text[:60]}")
+    return {
+        "status": "failed",
+        "request_time": request_time,
+        "entries": entries,
+        "usage": usage,
+        "failure": {
+            "input": input_text,
+            "expected_category": expected[0]["category"],
+            "expected_is_task": expected[0]["is_task"],
+            "actual_category": entries[0]["category"] if entries else None,
+            "actual_is_task": entries[0]["is_task"] if entries else None,
+            "test_type": test_type
+        }
+    }
+
+
+def error_outcome(index: int, total: int, test: Dict, error: Exception,
+                  request_time: Optional[float] = None) -> Dict:
+    """Outcome for a case whose request failed outright"""
+    item = test["item"]
+    print(f"[{index+1}/{total}] ❌ Error: {str(error)}")
+    return {
+        "status": "error",
+        "request_time": request_time,
+        "failure": {
+            "input": item["input_text"],
+            "error": str(error),
+            "test_type": item.get("test_type", "unknown")
+        }
+    }
+
+
+def timeout_outcome(index: int, total: int, test: Dict, timeout: Optional[float],
+                    request_time: Optional[float] = None) -> Dict:
+    """Outcome for a case whose request ran past its timeout; kept apart from errors"""
+    item = test["item"]
+    limit = f"{timeout:.1f}s" if timeout is not None else "client default"
+    print(f"[{index+1}/{total}] ⏱️  Timeout ({limit}): {item['input_text'][:60]}")
+    return {
+        "status": "timeout",
+        "request_time": request_time,
+        "failure": {
+            "input": item["input_text"],
+            "error": f"Request timeout ({limit})",
+            "timeout": timeout,
+            "test_type": item.get("test_type", "unknown")
+        }
+    }
+
+
+def aborted_outcome(index: int, total: int, test: Dict, reason: str,
+                    request_time: Optional[float] = None) -> Dict:
+    """Outcome for a streamed case abandoned because its output broke the schema"""
+    item = test["item"]
+    expected = item["expected_entries"]
+    print(f"[{index+1}/{total}] ❌ Aborted - schema violation ({reason}): {item['input_text'][:60]}")
+    return {
+        "status": "failed",
+        "request_time": request_time,
+        "failure": {
+            "input": item["input_text"],
+            "expected_category": expected[0]["category"],
+            "expected_is_task": expected[0]["is_task"],
+            "actual_category": None,
+            "actual_is_task": None,
+            "aborted": reason,
+            "test_type": item.get("test_type", "unknown")
+        }
+    }
+
+
+def record_outcome(warehouse: ResultsWarehouse, run_id: Optional[int], test: Dict, outcome: Dict) -> None:
+    """Write one Responses API outcome to the results warehouse"""
+    failure = outcome.get("failure") or {}
+    warehouse.record(run_id, test["item"], outcome["status"], output=outcome.get("entries"),
+                     error=failure.get("error") or failure.get("aborted"),
+                     timing={"seconds": outcome.get("request_time"), **(outcome.get("timing") or {})},
+                     usage=outcome.get("usage"), attempts=outcome.get("attempts"), detail=failure or None)
+
+
+async def evaluate_streamed_case(model: str, system_prompt: str, client: AsyncEvalHttpClient, index: int,
+                                 total: int, test: Dict, limiter: AdaptiveRateLimiter, cache: ResponseCache,
+                                 temperature: Optional[float] = None, timeout: Optional[float] = None,
+                                 timeouts: Optional[TimeoutPolicy] = None,
+                                 retries: Optional[RetryPolicy] = None) -> Dict:
+    """Stream one case and classify the outcome, keeping its TTFT, inter-token timing and attempts"""
+    input_text = test["item"]["input_text"]
+    if timeout is None and timeouts:
+        timeout = timeouts.timeout(model, input_text)
+    request_start = time.time()
+    try:
+        result = await stream_request(model, system_prompt, client, input_text,
+                                      limiter, cache, temperature, timeout, retries)
+    except TimeoutException as e:
+        if timeouts:
+            timeouts.record_timeout(model)
+        outcome = timeout_outcome(index, total, test, timeout, time.time() - request_start)
+        outcome["attempts"] = attempts_of(e)
+        return outcome
+    except Exception as e:
+        outcome = error_outcome(index, total, test, e, time.time() - request_start)
+        outcome["attempts"] = attempts_of(e)
+        return outcome
+    if result.aborted:
+        outcome = aborted_outcome(index, total, test, result.aborted, result.total)
+    elif result.error:
+        outcome = error_outcome(index, total, test, Exception(result.error), result.total)
+    else:
+        if timeouts:
+            timeouts.record(model, input_text, result.total, result.response.get("usage"))
+        outcome = score_response(index, total, test, result.response, result.total)
+    outcome["attempts"] = attempts_of(result)
+    outcome["timing"] = result.timing()
+    return outcome
+
+
+async def evaluate_case(model: str, system_prompt: str, client: AsyncEvalHttpClient, index: int, total: int,
+                        test: Dict, limiter: AdaptiveRateLimiter, cache: ResponseCache,
+                        temperature: Optional[float] = None, timeout: Optional[float] = None,
+                        hedger: Optional[HedgingPolicy] = None,
+                        timeouts: Optional[TimeoutPolicy] = None,
+                        retries: Optional[RetryPolicy] = None) -> Dict:
+    """Call the Responses API for one case and classify the outcome
+
+    Without an explicit timeout, the timeout policy (if any) picks one. The
+    outcome records how many attempts the request took.
+    """
+    input_text = test["item"]["input_text"]
+    if timeout is None and timeouts:
+        timeout = timeouts.timeout(model, input_text)
+    request_start = time.time()
+    try:
+        response = await send_request(model, system_prompt, client, input_text,
+                                      limiter, cache, temperature, timeout, hedger, timeouts, retries)
+        response_json = response.json()
+    except TimeoutException as e:
+        outcome = timeout_outcome(index, total, test, timeout, time.time() - request_start)
+        outcome["attempts"] = attempts_of(e)
+        return outcome
+    except Exception as e:
+        outcome = error_outcome(index, total, test, e, time.time() - request_start)
+        outcome["attempts"] = attempts_of(e)
+        return outcome
+    outcome = score_response(index, total, test, response_json, time.time() - request_start)
+    outcome["attempts"] = attempts_of(response)
+    return outcome
+
+
+def fetch_batch_responses(model: str, system_prompt: str, test_cases: List[Dict], cache: ResponseCache,
+                          options: argparse.Namespace,
+                          temperature: Optional[float] = None) -> List[Dict]:
+    """Responses for every case from one Batch API job
+
+    Returns {"response": json} or {"error": message} per case, in dataset
+    order. Cached cases are answered locally and left out of the batch, and
+    successful batch results are stored in the cache.
+    """
+    bodies = [build_request_body(model, system_prompt, test["item"]["input_text"], temperature)
+              for test in test_cases]
+    results: List[Optional[Dict]] = [None] * len(test_cases)
+    pending = []
+    for index, body in enumerate(bodies):
+        cached = cache.lookup('/responses', body)
+        if cached is not None:
+            results[index] = {"response": cached}
+        else:
+            pending.append(index)
+
+    print(f"Batch mode: {len(pending)} requests to submit, {len(test_cases) - len(pending)} answered from cache")
+    if pending or options.batch_id:
+        with EvalHttpClient(require_api_key()) as client:
+            batch_results = run_batch(
+                client,
+                [(f"case-{index}", bodies[index]) for index in pending],
+                endpoint="/v1/responses",
+                poll_interval=options.batch_poll_interval,
+                metadata={"model": model, "cases": str(len(pending))},
+                batch_id=options.batch_id
+            )
+            client.stats.print_summary()
+        for index in pending:
+            result = batch_results.get(f"case-{index}")
+            if result is None:
+                results[index] = {"error": "No result in batch output"}
+            elif result["status_code"] != 200:
+                results[index] = {"error": f"Batch request failed ({result['status_code']}): "
+                                           f"{result['error'] or result['body']}"}
+            else:
+                cache.store('/responses', bodies[index], result["body"])
+                results[index] = {"response": result["body"]}
+    return results
+
+
+def parse_args(description: str, argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Command line options shared by the Responses API runners"""
+    parser = argparse.ArgumentParser(description=description)
+    add_concurrency_argument(parser)
+    add_rate_limit_arguments(parser)
+    add_cache_arguments(parser)
+    add_batch_arguments(parser)
+    add_checkpoint_arguments(parser)
+    add_streaming_arguments(parser)
+    add_hedging_arguments(parser)
+    add_timeout_arguments(parser)
+    add_retry_arguments(parser)
+    add_scheduling_arguments(parser)
+    add_budget_arguments(parser)
+    add_prompt_arguments(parser)
+    add_dataset_arguments(parser)
+    add_warehouse_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.batch and args.stream:
+        parser.error("--stream and --batch can't be combined")
+    if args.hedge and (args.batch or args.stream):
+        parser.error("--hedge only applies to live, non-streamed requests")
+    if args.budget_seconds is not None and args.batch:
+        parser.error("--budget-seconds doesn't apply to --batch jobs; use --budget-usd")
+    if args.budget_seconds is not None and args.fail_first:
+        parser.error("--budget-seconds runs cases round-robin across families, so it can't be combined "
+                     "with --fail-first")
+    return args
+
+
+def run_responses_eval(model: str, title: str, results_file: str,
+                       temperature: Optional[float] = None,
+                       options: Optional[argparse.Namespace] = None) -> Dict:
+    """Evaluate one model on the whole dataset and save the results
+
+    `options` is the namespace from parse_args(); None uses the defaults.
+    """
+    options = options or parse_args(title, [])
+    concurrency = options.concurrency
+    client = AsyncEvalHttpClient(require_api_key())
+
+    prompt = load_system_prompt(options.prompt_variant)
+    system_prompt = prompt.text
+
+    print(f"=== {title} ===")
+    print(f"System prompt: {prompt.variant} ({len(system_prompt)} chars, fingerprint {prompt.fingerprint})")
+    print()
+
+    filters = dataset_filters(options)
+    test_cases = load_test_cases(filters, dataset_path(options))
+    filtered = any(value is not None for value in filters.values())
+    if not test_cases:
+        raise ValueError(f"No cases in {dataset_path(options)} match the dataset filter {filters}")
+    if filtered:
+        print(f"Dataset filter {filters}: {len(test_cases)} cases")
+
+    # Track results
+    results = {
+        "total": len(test_cases),
+        "passed": 0,
+        "failed": 0,
+        "timeouts": 0,
+        "failures": [],
+        "prompt": prompt.summary(),
+        "start_time": datetime.now().isoformat()
+    }
+
+    # Subsets and other datasets get their own results, journal and warehouse label
+    results_path = Path(__file__).parent / selection_name(results_file, options)
+    journal = CheckpointJournal.from_args(
+        options, results_path.with_name(results_path.stem + "_journal.jsonl"),
+        fingerprint=content_hash(build_request_body(model, system_prompt, "", temperature))
+    )
+    keys = [case_hash(test) for test in test_cases]
+    outcomes = [journal.get(key) for key in keys]
+    pending = [(index, test) for index, test in enumerate(test_cases) if outcomes[index] is None]
+    journal.print_resume_summary(len(pending))
+    timeouts = TimeoutPolicy.from_args(options)
+
+    warehouse = ResultsWarehouse.from_args(options)
+    history = (FailureHistory.from_args(options, warehouse, model, Path(sys.argv[0]).name)
+               if options.fail_first else None)
+    # Resumed cases go into the warehouse run too, so it covers the whole run
+    run_id = warehouse.start_run(results_path.stem.replace("_results", ""), model, prompt.fingerprint,
+                                 script=Path(sys.argv[0]).name,
+                                 config={"temperature": temperature, "stream": options.stream,
+                                         "batch": options.batch, "prompt_variant": prompt.variant,
+                                         "dataset_filter": filters},
+                                 dataset_version=dataset_version(test_cases))
+    for test, outcome in zip(test_cases, outcomes):
+        if outcome is not None:
+            record_outcome(warehouse, run_id, test, outcome)
+
+    budget = RunBudget.from_args(options)
+    if budget:
+        selected = budget.plan(model, test_cases, [index for index, _ in pending], system_prompt,
+                               timeouts, concurrency)
+        pending = [(index, test_cases[index]) for index in selected]
+        budget.print_plan(len(test_cases), concurrency)
+
+    partial = None
+    if history:
+        pending = history.order(pending, lambda pending_case: pending_case[1]["item"]["input_text"])
+        history.print_summary(pending, lambda pending_case: pending_case[1]["item"]["input_text"])
+        partial = PartialPassRate(history, len(pending))
+
+    start_time = time.time()
+    completed = sum(outcome is not None for outcome in outcomes)
+    planned = completed + len(pending)
+    passed_so_far = sum(outcome is not None and outcome["status"] == "passed" for outcome in outcomes)
+    limiter = AdaptiveRateLimiter(max_concurrency=concurrency)
+    cache = ResponseCache.from_args(options)
+    hedger = HedgingPolicy.from_args(options)
+    retries = RetryPolicy.from_args(options)
+
+    async def evaluate(_, pending_case) -> Dict:
+        index, test = pending_case
+        if options.stream:
+            return await evaluate_streamed_case(model, system_prompt, client, index, len(test_cases),
+                                                test, limiter, cache, temperature, timeouts=timeouts,
+                                                retries=retries)
+        return await evaluate_case(model, system_prompt, client, index, len(test_cases),
+                                   test, limiter, cache, temperature, hedger=hedger, timeouts=timeouts,
+                                   retries=retries)
+
+    def on_result(_, pending_case, outcome: Dict) -> None:
+        nonlocal completed, passed_so_far
+        index, test = pending_case
+        outcomes[index] = outcome
+        journal.record(keys[index], outcome)
+        record_outcome(warehouse, run_id, test, outcome)
+        completed += 1
+        passed_so_far += outcome["status"] == "passed"
+        if partial:
+            partial.record(test["item"]["input_text"], outcome["status"] == "passed")
+        # Show progress every 10 tests
+        if completed % 10 == 0:
+            print(f"\nProgress: {completed}/{planned} ({passed_so_far/completed*100:.1f}% pass rate so far)")
+            print(f"Elapsed time: {(time.time() - start_time)/60:.1f} minutes\n")
+
+    try:
+        if options.batch:
+            batch_results = fetch_batch_responses(model, system_prompt, [test for _, test in pending],
+                                                  cache, options, temperature)
+            for (index, test), result in zip(pending, batch_results):
+                if "error" in result:
+                    outcome = error_outcome(index, len(test_cases), test, Exception(result["error"]))
+                else:
+                    outcome = score_response(index, len(test_cases), test, result["response"])
+                on_result(None, (index, test), outcome)
+        else:
+            if budget:
+                budget.start()
+            run_cases(pending, evaluate, concurrency=concurrency, on_result=on_result,
+                      on_finish=client.aclose, should_stop=budget.expired if budget else None)
+    finally:
+        journal.close()
+        warehouse.flush()
+    # A shared --journal keeps the cases outside this filter
+    journal.compact(None if filtered else keys)
+
+    # Errors count as failures, in dataset order; timeouts are counted on their own.
+    # Cases left out by --budget-* have no outcome.
+    for outcome in outcomes:
+        if outcome is None:
+            continue
+        if outcome["status"] == "passed":
+            results["passed"] += 1
+        elif outcome["status"] == "timeout":
+            results["timeouts"] += 1
+        else:
+            results["failed"] += 1
+            results["failures"].append(outcome["failure"])
+
+    # Final results
+    results["end_time"] = datetime.now().isoformat()
+    results["evaluated"] = sum(outcome is not None for outcome in outcomes)
+    results["pass_rate"] = (results["passed"] / results["evaluated"]) * 100 if results["evaluated"] else 0.0
+
+    print("\n" + "="*60)
+    print("FINAL RESULTS")
+    print("="*60)
+    print(f"Total: {results['total']} tests")
+    if results["evaluated"] < results["total"]:
+        print(f"Evaluated: {results['evaluated']}")
+    print(f"Passed: {results['passed']}")
+    print(f"Failed: {results['failed']}")
+    print(f"Timeouts: {results['timeouts']}")
+    print(f"Pass Rate: {results['pass_rate']:.1f}%")
+    print(f"\nTotal time: {(time.time() - start_time)/60:.1f} minutes")
+    if options.stream:
+        finished = [outcome for outcome in outcomes if outcome is not None]
+        results["streaming"] = summarize_timings([outcome["timing"] for outcome in finished
+                                                  if outcome.get("timing")])
+        results["streaming"]["aborted"] = sum(1 for outcome in finished
+                                              if outcome.get("failure", {}).get("aborted"))
+        print_timing_summary(results["streaming"])
+        print(f"  Aborted on schema violation: {results['streaming']['aborted']}")
+    if not options.batch:
+        limiter.print_summary()
+        client.stats.print_summary()
+        timeouts.print_summary()
+        results["timeout_policy"] = timeouts.summary()
+        timeouts.save()
+        retries.print_summary()
+        results["retries"] = retries.summary()
+    if hedger:
+        hedger.print_summary()
+        results["hedging"] = hedger.summary()
+    if partial:
+        results["partial_pass_rates"] = partial.timeline
+    if budget:
+        passed = [outcome["status"] == "passed" if outcome else None for outcome in outcomes]
+        budget.print_estimate(passed)
+        results["budget"] = budget.summary(passed)
+    cache.print_summary()
+    cache.close()
+    # Filtered and budget-limited runs don't count towards the --fail-first history
+    warehouse.finish_run(run_id, results, partial=filtered or results["evaluated"] < results["total"])
+    warehouse.print_summary()
+    warehouse.close()
+
+    # Save results
+    with open(results_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    if not options.batch:
+        limiter.export(options.rate_limit_log or results_path.with_name(results_path.stem + "_ratelimit.json"))
+
+    print(f"\nResults saved to {results_path.name}")
+
+    # Show failures
+    if results["failures"]:
+        print("\nFailures:")
+        for f in results["failures"][:10]:  # Show first 10
+            print(f"- {f['input'][:50]}... (expected {f.get('expected_category')}/{f.get('expected_is_task')})")
+        if len(results["failures"]) > 10:
+            print(f"... and {len(results['failures']) - 10} more")
+
+    return results
@@ -3,79 +3,134 @@
 Run full evaluation with GPT-4.1 - handles timeouts and saves progress
 """
 
+import argparse
 import json
 import time
-import requests
 from pathlib import Path
 import sys
 from datetime import datetime
 
 sys.path.append(str(Path(__file__).parent))
-from run_minimal_eval import load_api_key, load_prompt
+from run_minimal_eval import API_KEY, load_prompt
+from eval_engine import add_concurrency_argument, run_cases
+from rate_limiter import AdaptiveRateLimiter, add_rate_limit_arguments
+from http_client import AsyncEvalHttpClient, TimeoutException
+from response_cache import ResponseCache, add_cache_arguments
+from checkpoint import CheckpointJournal, add_checkpoint_arguments, case_hash, content_hash
+from timeout_policy import TimeoutPolicy, add_timeout_arguments
+from retry import RetryPolicy, add_retry_arguments, attempts_of
+from providers import ChatCompletionsProvider
+from dataset import dataset_version, load_cases
+from warehouse import ResultsWarehouse, add_warehouse_arguments
 
-API_KEY = load_api_key()
-BASE_URL = "https://api.openai.com/v1"
-HEADERS = {"Authorization": f"Bearer {API_KEY}", "Content-Type": "application/json"}
+MODEL = "gpt-4.1"
 
-def test_single_case(prompt, test_case, timeout=30):
-    """Test a single case with timeout handling"""
+async def test_single_case(prompt, test_case, limiter, client, cache, timeouts, retries):
+    """Test a single case with timeout handling; returns (entries, output, error, attempts, timing)"""
+    provider = ChatCompletionsProvider(MODEL, prompt, client, limiter, cache, temperature=0,
+                                       timeouts=timeouts, retries=retries)
+    timeout = provider.timeout(test_case["input_text"])
+    
     try:
-        response = requests.post(
-            f"{BASE_URL}/chat/completions",
-            headers=HEADERS,
-            json={
-                "model": "gpt-4.1",
-                "messages": [
-                    {"role": "system", "content": prompt},
-                    {"role": "user", "content": test_case["input_text"]}
-                ],
-                "temperature": 0,
-                "response_format": {"type": "json_object"}
-            },
-            timeout=timeout
-        )
-        
-        if response.status_code == 200:
-            content = response.json()['choices'][0]['message']['content']
-            return json.loads(content), None
-        else:
-            return None, f"API Error {response.status_code}: {response.text[:100]}"
-    except requests.Timeout:
-        return None, "Timeout"
+        completion = await provider.complete(test_case["input_text"], timeout)
+        if not completion.ok:
+            return None, None, completion.error, completion.attempts, completion.timing()
+        return completion.entries, completion.output, None, completion.attempts, completion.timing()
+    except TimeoutException as e:
+        return None, None, f"Timeout after {timeout:.1f}s", attempts_of(e), None
     except Exception as e:
-        return None, str(e)
+        return None, None, str(e), attempts_of(e), None
 
-def save_progress(results, filename="gpt41_progress.json"):
-    """Save progress to file"""
-    with open(filename, "w") as f:
-        json.dump(results, f, indent=2)
+async def evaluate_case(prompt, i, test_case, limiter, client, cache, timeouts, retries):
+    """Run one case and return its progress record"""
+    print(f"\nTesting case {i+1}: {test_case['input_text'][:50]}...")
+    start_time = time.time()
+    
+    actual_entries, output, error, attempts, timing = await test_single_case(prompt, test_case, limiter, client,
+                                                                             cache, timeouts, retries)
+    
+    if error:
+        print(f"  [{i+1}] Error: {error}")
+        return {"passed": False, "error": error, "timeout": error.startswith("Timeout"), "attempts": attempts,
+                "timing": timing}
+    
+    # Check against expected values
+    expected_entry = test_case["expected_entries"][0]
+    
+    # For now, check the first entry
+    actual_entry = actual_entries[0] if actual_entries else {}
+    
+    category_match = actual_entry.get("category") == expected_entry["category"]
+    task_match = actual_entry.get("is_task") == expected_entry["is_task"]
+    
+    passed = category_match and task_match
+    failure = None
+    
+    if passed:
+        print(f"  [{i+1}] ✅ Passed (took {time.time()-start_time:.1f}s)")
+    else:
+        failure = {
+            "input": test_case["input_text"],
+            "expected_category": expected_entry["category"],
+            "expected_is_task": expected_entry["is_task"],
+            "actual_category": actual_entry.get("category"),
+            "actual_is_task": actual_entry.get("is_task"),
+            "test_type": test_case.get("test_type", "unknown")
+        }
+        print(f"  [{i+1}] ❌ Failed - Expected: {expected_entry['category']}/{expected_entry['is_task']}, Got: {actual_entry.get('category')}/{actual_entry.get('is_task')} (took {time.time()-start_time:.1f}s)")
+    
+    return {
+        "passed": passed,
+        "output": output,
+        "entries": actual_entries,
+        "failure": failure,
+        "attempts": attempts,
+        "timing": timing
+    }
 
-def load_progress(filename="gpt41_progress.json"):
-    """Load previous progress if exists"""
-    if Path(filename).exists():
-        with open(filename, "r") as f:
-            return json.load(f)
-    return {}
+def record_in_warehouse(warehouse, run_id, test_case, result_data):
+    """Write one progress record to the results warehouse"""
+    if result_data.get("timeout"):
+        status = "timeout"
+    elif result_data.get("error"):
+        status = "error"
+    else:
+        status = "passed" if result_data["passed"] else "failed"
+    warehouse.record(run_id, test_case, status, output=result_data.get("entries"), error=result_data.get("error"),
+                     timing=result_data.get("timing"), attempts=result_data.get("attempts"),
+                     detail=result_data.get("failure"))
 
 def main():
+    parser = argparse.ArgumentParser(description="Run the full GPT-4.1 evaluation (iteration 7)")
+    add_concurrency_argument(parser)
+    add_rate_limit_arguments(parser)
+    add_cache_arguments(parser)
+    add_checkpoint_arguments(parser, resume_default=True)
+    add_timeout_arguments(parser)
+    add_retry_arguments(parser)
+    add_warehouse_arguments(parser)
+    args = parser.parse_args()
+    
     print("=== GPT-4.1 Full Evaluation (Iteration 7) ===")
     print("This will take a while. Progress is saved automatically.\n")
     
     # Load prompt and test cases
     prompt = load_prompt(7)
-    dataset_path = Path(__file__).parent.parent / "eval_dataset.jsonl"
+    test_cases = [case["item"] for case in load_cases()]
     
-    test_cases = []
-    with open(dataset_path, "r") as f:
-        for line in f:
-            if line.strip():
-                data = json.loads(line)
-                test_cases.append(data["item"])
+    # Load previous progress; errors and timeouts are retried
+    journal = CheckpointJournal.from_args(args, Path("gpt41_journal.jsonl"),
+                                          fingerprint=content_hash({"model": MODEL, "prompt": prompt}))
+    keys = [case_hash(test_case) for test_case in test_cases]
+    progress = {}
+    for i, key in enumerate(keys):
+        result_data = journal.get(key)
+        if result_data is not None:
+            progress[i] = result_data
     
-    # Load previous progress
-    progress = load_progress()
-    if progress:
-        print(f"Resuming from previous run. {len(progress)} cases already completed.\n")
+    # Skip cases that are already completed
+    pending = [(i, test_case) for i, test_case in enumerate(test_cases) if i not in progress]
+    journal.print_resume_summary(len(pending))
     
     results = {
         "total": len(test_cases),
@@ -83,89 +138,66 @@ def main():
         "passed": 0,
         "failed": 0,
         "errors": 0,
+        "timeouts": 0,
         "failures": [],
-        "start_time": progress.get("start_time", datetime.now().isoformat())
+        "start_time": datetime.now().isoformat()
     }
     
-    # Test each case
-    for i, test_case in enumerate(test_cases):
-        case_id = f"case_{i}"
-        
-        # Skip if already completed
-        if case_id in progress:
-            result_data = progress[case_id]
-            if result_data["passed"]:
-                results["passed"] += 1
-            else:
-                results["failed"] += 1
-                if "failure" in result_data:
-                    results["failures"].append(result_data["failure"])
-            continue
-        
-        print(f"\nTesting case {i+1}/{len(test_cases)}: {test_case['input_text'][:50]}...")
-        start_time = time.time()
-        
-        output, error = test_single_case(prompt, test_case)
-        
-        if error:
-            print(f"  Error: {error}")
-            results["errors"] += 1
-            progress[case_id] = {"passed": False, "error": error}
-        else:
-            # Check against expected values
-            expected_entry = test_case["expected_entries"][0]
-            
-            # Handle both single entry and array formats
-            if isinstance(output, dict) and "entries" in output:
-                actual_entries = output["entries"]
-            elif isinstance(output, list):
-                actual_entries = output
-            else:
-                actual_entries = [output]
-            
-            # For now, check the first entry
-            actual_entry = actual_entries[0] if actual_entries else {}
-            
-            category_match = actual_entry.get("category") == expected_entry["category"]
-            task_match = actual_entry.get("is_task") == expected_entry["is_task"]
-            
-            passed = category_match and task_match
-            
-            if passed:
-                results["passed"] += 1
-                print(f"  ✅ Passed (took {time.time()-start_time:.1f}s)")
-            else:
-                results["failed"] += 1
-                failure = {
-                    "input": test_case["input_text"],
-                    "expected_category": expected_entry["category"],
-                    "expected_is_task": expected_entry["is_task"],
-                    "actual_category": actual_entry.get("category"),
-                    "actual_is_task": actual_entry.get("is_task"),
-                    "test_type": test_case.get("test_type", "unknown")
-                }
-                results["failures"].append(failure)
-                print(f"  ❌ Failed - Expected: {expected_entry['category']}/{expected_entry['is_task']}, Got: {actual_entry.get('category')}/{actual_entry.get('is_task')} (took {time.time()-start_time:.1f}s)")
-            
-            progress[case_id] = {
-                "passed": passed,
-                "output": output,
-                "failure": failure if not passed else None
-            }
+    limiter = AdaptiveRateLimiter(max_concurrency=args.concurrency)
+    client = AsyncEvalHttpClient(API_KEY)
+    cache = ResponseCache.from_args(args)
+    timeouts = TimeoutPolicy.from_args(args, default=30)
+    retries = RetryPolicy.from_args(args)
+    warehouse = ResultsWarehouse.from_args(args)
+    run_id = warehouse.start_run("gpt41_iteration7", MODEL, content_hash(prompt), script=Path(__file__).name,
+                                 dataset_version=dataset_version(test_cases))
+    for i, result_data in progress.items():
+        record_in_warehouse(warehouse, run_id, test_cases[i], result_data)
+    
+    async def evaluate(_, pending_case):
+        i, test_case = pending_case
+        return await evaluate_case(prompt, i, test_case, limiter, client, cache, timeouts, retries)
+    
+    def on_result(_, pending_case, result_data):
+        i, _ = pending_case
+        progress[i] = result_data
         
-        # Save progress after each case
+        # Append to the journal after each case
         results["completed"] = len(progress)
-        save_progress(progress)
+        journal.record(keys[i], result_data)
+        record_in_warehouse(warehouse, run_id, test_cases[i], result_data)
         
         # Show overall progress
-        if (i + 1) % 5 == 0:
-            pass_rate = (results["passed"] / results["completed"] * 100) if results["completed"] > 0 else 0
+        if results["completed"] % 5 == 0:
+            passed_so_far = sum(1 for data in progress.values() if data.get("passed"))
+            pass_rate = (passed_so_far / results["completed"] * 100) if results["completed"] > 0 else 0
             print(f"\nProgress: {results['completed']}/{results['total']} ({pass_rate:.1f}% pass rate so far)")
             elapsed = (datetime.now() - datetime.fromisoformat(results["start_time"])).total_seconds() / 60
             print(f"Elapsed time: {elapsed:.1f} minutes")
-        
-        # Small delay to avoid rate limits
-        time.sleep(0.5)
+    
+    try:
+        run_cases(pending, evaluate, concurrency=args.concurrency, on_result=on_result,
+                  on_finish=client.aclose)
+    finally:
+        journal.close()
+        warehouse.flush()
+    journal.compact(keys)
+    
+    # Tally every case in dataset order, resumed or fresh
+    for i in range(len(test_cases)):
+        result_data = progress.get(i)
+        if result_data is None:
+            continue
+        if result_data.get("timeout"):
+            results["timeouts"] += 1
+        elif result_data.get("error"):
+            results["errors"] += 1
+        elif result_data["passed"]:
+            results["passed"] += 1
+        else:
+            results["failed"] += 1
+            if result_data.get("failure"):
+                results["failures"].append(result_data["failure"])
     
     # Final results
     results["end_time"] = datetime.now().isoformat()
@@ -178,14 +210,27 @@ def main():
     print(f"Passed: {results['passed']}")
     print(f"Failed: {results['failed']}")
     print(f"Errors: {results['errors']}")
+    print(f"Timeouts: {results['timeouts']}")
     print(f"Pass Rate: {results['pass_rate']:.1f}%")
+    limiter.print_summary()
+    client.stats.print_summary()
+    timeouts.print_summary()
+    timeouts.save()
+    retries.print_summary()
+    results["retries"] = retries.summary()
+    cache.print_summary()
+    cache.close()
+    warehouse.finish_run(run_id, results)
+    warehouse.print_summary()
+    warehouse.close()
     
     # Save final results
     with open("gpt41_iteration7_results.json", "w") as f:
         json.dump(results, f, indent=2)
+    limiter.export(args.rate_limit_log or "gpt41_ratelimit.json")
     
     print(f"\nResults saved to gpt41_iteration7_results.json")
-    print("Progress saved to gpt41_progress.json")
+    print(f"Progress saved to {journal.path}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -6,87 +6,54 @@ With extended timeouts and better error handling
 
 import json
 import time
+from pathlib import Path
 from datetime import datetime
-from openai import OpenAI
-from dotenv import load_dotenv
-import sys
 
-# Load environment variables
-load_dotenv()
+from responses_eval import (build_request_body, entries_match, extract_entries, fetch_batch_responses,
+                            load_system_prompt, load_test_cases, parse_args, record_outcome, send_request,
+                            stream_request)
+from eval_engine import run_cases
+from rate_limiter import AdaptiveRateLimiter
+from http_client import AsyncEvalHttpClient, TimeoutException, require_api_key
+from response_cache import ResponseCache
+from checkpoint import CheckpointJournal, case_hash, content_hash
+from streaming import print_timing_summary, summarize_timings
+from hedging import HedgingPolicy
+from timeout_policy import TimeoutPolicy
+from retry import RetryPolicy, attempts_of
+from scheduling import FailureHistory, PartialPassRate
+from budget import RunBudget
+from dataset import dataset_filters, dataset_path, dataset_version, selection_name
+from warehouse import ResultsWarehouse
 
-client = OpenAI()
+args = parse_args("Run the complete gpt-5 evaluation")
 
-# Read the current iteration 7 prompt from ai_service.dart
-with open('/Users/andrew/Development/log-everything/lib/services/ai_service.dart', 'r') as f:
-    content = f.read()
-    
-# Extract the system prompt (iteration 7)
-start = content.find('// CC: MINIMAL PROMPT EXPERIMENT - Iteration 7')
-end = content.find('Respond with a JSON object containing an "entries" array.""";')
-if start == -1 or end == -1:
-    print("Could not find iteration 7 prompt in ai_service.dart")
-    exit(1)
-
-# Get the prompt content
-prompt_lines = content[start:end].split('\n')
-# Remove comment lines and reconstruct
-system_prompt_lines = []
-for line in prompt_lines[3:]:  # Skip first 3 lines (comments)
-    if 'final systemPrompt =' in line:
-        continue
-    if '"""' in line:
-        line = line.replace('"""', '').strip()
-    system_prompt_lines.append(line)
-
-# Clean up the prompt
-system_prompt = '\n'.join(system_prompt_lines).strip()
+client = AsyncEvalHttpClient(require_api_key())
 
-# Add the actual categories that would be provided in production
-categories = [
-    "- Personal: Personal life, social activities, family, hobbies, errands",
-    "- Work: Work-related activities, meetings, projects, professional tasks", 
-    "- Health: Medical appointments, exercise, wellness, mental health",
-    "- Finance: Money management, purchases, banking, investments",
-    "- Misc: Random thoughts, observations, miscellaneous items"
-]
-categories_string = "\n".join(categories)
-
-# Replace the placeholder with actual categories
-system_prompt = system_prompt.replace("$categoriesListString", categories_string)
-
-# Define the JSON schema for structured outputs
-schema = {
-    "type": "object",
-    "properties": {
-        "entries": {
-            "type": "array",
-            "items": {
-                "type": "object",
-                "properties": {
-                    "text_segment": {"type": "string"},
-                    "category": {"type": "string"},
-                    "is_task": {"type": "boolean"},
-                },
-                "required": ["text_segment", "category", "is_task"],
-                "additionalProperties": False,
-            },
-        },
-    },
-    "required": ["entries"],
-    "additionalProperties": False,
-}
+prompt = load_system_prompt(args.prompt_variant)
+system_prompt = prompt.text
 
 print("="*70)
 print("GPT-5 (FULL MODEL) COMPLETE EVALUATION")
 print("="*70)
-print(f"System prompt length: {len(system_prompt)} chars")
-print("Note: This will take a while. Each request has a 30-second timeout.")
+print(f"System prompt: {prompt.variant} ({len(system_prompt)} chars, fingerprint {prompt.fingerprint})")
+if args.batch:
+    print("Note: Submitting all cases as one Batch API job.")
+else:
+    print(f"Note: Timeouts come from gpt-5's latency history (30s until there is enough). "
+          f"Running {args.concurrency} at a time.")
 print("="*70)
 print()
 
 # Read test dataset
-with open('../eval_dataset.jsonl', 'r') as f:
-    test_cases = [json.loads(line) for line in f if line.strip()]
+filters = dataset_filters(args)
+filtered = any(value is not None for value in filters.values())
+test_cases = load_test_cases(filters, dataset_path(args))
+if not test_cases:
+    print(f"❌ No cases in {dataset_path(args)} match the dataset filter {filters}")
+    raise SystemExit(1)
+# Subsets and other datasets get their own results, journal and warehouse label
+results_file = selection_name('gpt5_full_complete_results.json', args)
 
 print(f"Loaded {len(test_cases)} test cases")
 print()
@@ -101,141 +68,247 @@ results = {
     "errors": 0,
     "failures": [],
     "response_times": [],
+    "prompt": prompt.summary(),
     "start_time": datetime.now().isoformat()
 }
 
+# Resume from the checkpoint journal with --resume
+journal = CheckpointJournal.from_args(args, selection_name('gpt5_full_complete_journal.jsonl', args),
+                                      fingerprint=content_hash(build_request_body('gpt-5', system_prompt, "")))
+keys = [case_hash(test) for test in test_cases]
+outcomes = [journal.get(key) for key in keys]
+pending = [(i, test) for i, test in enumerate(test_cases) if outcomes[i] is None]
+journal.print_resume_summary(len(pending))
+timeouts = TimeoutPolicy.from_args(args, default=30)
+
+warehouse = ResultsWarehouse.from_args(args)
+history = FailureHistory.from_args(args, warehouse, 'gpt-5', Path(__file__).name) if args.fail_first else None
+# Every case of the run goes into the results warehouse, resumed ones included
+run_id = warehouse.start_run(selection_name('gpt5_full_complete', args), 'gpt-5', prompt.fingerprint,
+                             script=Path(__file__).name,
+                             config={"stream": args.stream, "batch": args.batch, "prompt_variant": prompt.variant,
+                                     "dataset_filter": filters},
+                             dataset_version=dataset_version(test_cases))
+for test, outcome in zip(test_cases, outcomes):
+    if outcome is not None:
+        record_outcome(warehouse, run_id, test, outcome)
+
+# --budget-seconds/--budget-usd: run a stratified subset and estimate the full pass rate
+budget = RunBudget.from_args(args)
+if budget:
+    selected = budget.plan('gpt-5', test_cases, [i for i, _ in pending], system_prompt, timeouts, args.concurrency)
+    pending = [(i, test_cases[i]) for i in selected]
+    budget.print_plan(len(test_cases), args.concurrency)
+
+# --fail-first: cases that failed before go first, with partial pass rates as they finish
+partial = None
+if history:
+    pending = history.order(pending, lambda pending_case: pending_case[1]["item"]["input_text"])
+    history.print_summary(pending, lambda pending_case: pending_case[1]["item"]["input_text"])
+    partial = PartialPassRate(history, len(pending))
+
 start_time = time.time()
-test_start_time = time.time()
+completed = sum(outcome is not None for outcome in outcomes)
+planned = completed + len(pending)
+passed_so_far = sum(outcome is not None and outcome["status"] == "passed" for outcome in outcomes)
+limiter = AdaptiveRateLimiter(max_concurrency=args.concurrency)
+cache = ResponseCache.from_args(args)
+hedger = HedgingPolicy.from_args(args)
+retries = RetryPolicy.from_args(args)
 
-# Test each case
-for i, test in enumerate(test_cases):
+def classify_response(i, test, response_json, request_time=None):
+    """Classify one Responses API result as passed, failed or error"""
     item = test["item"]
     input_text = item["input_text"]
     expected = item["expected_entries"]
     test_type = item.get("test_type", "unknown")
     
     # Progress indicator
-    print(f"[{i+1:3}/{len(test_cases)}] Testing: {input_text[:50]:50}... ", end="")
-    sys.stdout.flush()
+    prefix = f"[{i+1:3}/{len(test_cases)}] {input_text[:50]:50}... "
+    took = f" ({request_time:.1f}s)" if request_time is not None else ""
     
+    if response_json.get('status') != 'completed':
+        print(f"{prefix}❌ API Error{took}")
+        return {
+            "status": "error",
+            "request_time": request_time,
+            "failure": {
+                "input": input_text,
+                "error": str(response_json.get('error', 'Unknown error')),
+                "test_type": test_type
+            }
+        }
+        
+    # Extract the JSON from the response; unparseable output is an error, not a crash
+    try:
+        entries = extract_entries(response_json)
+    except Exception as e:
+        return exception_outcome(i, test, e)
+
+    usage = response_json.get("usage")
+    if entries_match(entries, expected):
+        print(f"{prefix}✅ Pass{took}")
+        return {"status": "passed", "request_time": request_time, "entries": entries, "usage": usage}
+    
+    actual_cat = entries[0]['category'] if entries else 'None'
+    actual_task = entries[0]['is_task'] if entries else 'None'
+    print(f"{prefix}❌ Fail: {actual_cat}/{actual_task}{took}")
+    return {
+        "status": "failed",
+        "request_time": request_time,
+        "entries": entries,
+        "usage": usage,
+        "failure": {
+            "input": input_text,
+            "expected_category": expected[0]["category"],
+            "expected_is_task": expected[0]["is_task"],
+            "actual_category": entries[0]["category"] if entries else None,
+            "actual_is_task": entries[0]["is_task"] if entries else None,
+            "test_type": test_type,
+            "entries_count": len(entries),
+            "expected_count": len(expected)
+        }
+    }
+
+def exception_outcome(i, test, error):
+    item = test["item"]
+    print(f"[{i+1:3}/{len(test_cases)}] {item['input_text'][:50]:50}... ❌ Exception: {str(error)[:30]}")
+    return {
+        "status": "error",
+        "failure": {
+            "input": item["input_text"],
+            "error": str(error),
+            "test_type": item.get("test_type", "unknown")
+        }
+    }
+
+async def evaluate_case(i, test):
+    """Run one case and classify it as passed, failed, timeout or error"""
+    item = test["item"]
+    timeout = timeouts.timeout('gpt-5', item["input_text"])
     request_start = time.time()
     
     try:
-        # Call Responses API with gpt-5 with extended timeout
-        import requests
+        if args.stream:
+            # Streamed: keep time to first token and abort outputs that break the schema
+            result = await stream_request('gpt-5', system_prompt, client, item["input_text"], limiter, cache,
+                                          timeout=timeout, retries=retries)
+            if result.aborted:
+                print(f"[{i+1:3}/{len(test_cases)}] {item['input_text'][:50]:50}... ❌ Aborted: {result.aborted}")
+                outcome = {
+                    "status": "failed",
+                    "request_time": result.total,
+                    "failure": {
+                        "input": item["input_text"],
+                        "expected_category": item["expected_entries"][0]["category"],
+                        "expected_is_task": item["expected_entries"][0]["is_task"],
+                        "actual_category": None,
+                        "actual_is_task": None,
+                        "aborted": result.aborted,
+                        "test_type": item.get("test_type", "unknown")
+                    }
+                }
+            elif result.error:
+                outcome = exception_outcome(i, test, result.error)
+            else:
+                timeouts.record('gpt-5', item["input_text"], result.total, result.response.get("usage"))
+                outcome = classify_response(i, test, result.response, result.total)
+            outcome["attempts"] = attempts_of(result)
+            outcome["timing"] = result.timing()
+            return outcome
         
-        response = requests.post(
-            'https://api.openai.com/v1/responses',
-            json={
-                'model': 'gpt-5',
-                'input': [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": input_text}
-                ],
-                'text': {
-                    'format': {
-                        'type': 'json_schema',
-                        'name': 'multiple_entry_extraction',
-                        'schema': schema,
-                        'strict': True
-                    },
-                },
-            },
-            headers={
-                'Content-Type': 'application/json',
-                'Authorization': f'Bearer {client.api_key}',
-            },
-            timeout=30  # 30 second timeout per request
-        )
+        # Call Responses API with gpt-5, timing out at the model's usual worst case
+        response = await send_request('gpt-5', system_prompt, client, item["input_text"], limiter, cache,
+                                      timeout=timeout, hedger=hedger, timeouts=timeouts, retries=retries)
         
         request_time = time.time() - request_start
-        results["response_times"].append(request_time)
-        
-        # Parse Responses API response
-        response_json = response.json()
-        
-        if response_json.get('status') != 'completed':
-            print(f"❌ API Error ({request_time:.1f}s)")
-            results["errors"] += 1
-            results["failures"].append({
-                "input": input_text,
-                "error": str(response_json.get('error', 'Unknown error')),
-                "test_type": test_type
-            })
-            continue
-            
-        # Extract the JSON from the response
-        entries = []
-        if response_json.get('output'):
-            for output_item in response_json['output']:
-                if output_item['type'] == 'message' and output_item.get('content'):
-                    for content_item in output_item['content']:
-                        if content_item['type'] == 'output_text':
-                            result = json.loads(content_item['text'])
-                            entries = result.get("entries", [])
-                            break
-        
-        # Check if response matches expected
-        passed = True
-        if len(entries) != len(expected):
-            passed = False
-        else:
-            for j, (actual, exp) in enumerate(zip(entries, expected)):
-                if (actual.get("text_segment", "").strip() == "" or
-                    actual.get("category") != exp["category"] or
-                    actual.get("is_task") != exp["is_task"]):
-                    passed = False
-                    break
-        
-        if passed:
-            print(f"✅ Pass ({request_time:.1f}s)")
-            results["passed"] += 1
-        else:
-            actual_cat = entries[0]['category'] if entries else 'None'
-            actual_task = entries[0]['is_task'] if entries else 'None'
-            print(f"❌ Fail: {actual_cat}/{actual_task} ({request_time:.1f}s)")
-            results["failed"] += 1
-            results["failures"].append({
-                "input": input_text,
-                "expected_category": expected[0]["category"],
-                "expected_is_task": expected[0]["is_task"],
-                "actual_category": entries[0]["category"] if entries else None,
-                "actual_is_task": entries[0]["is_task"] if entries else None,
-                "test_type": test_type,
-                "entries_count": len(entries),
-                "expected_count": len(expected)
-            })
+        outcome = classify_response(i, test, response.json(), request_time)
+        outcome["attempts"] = attempts_of(response)
+        return outcome
     
-    except requests.Timeout:
-        print(f"⏱️ TIMEOUT (30s)")
-        results["timeouts"] += 1
-        results["failures"].append({
-            "input": input_text,
-            "error": "Request timeout (30s)",
-            "test_type": test_type
-        })
+    except TimeoutException as e:
+        if args.stream:
+            timeouts.record_timeout('gpt-5')
+        print(f"[{i+1:3}/{len(test_cases)}] {item['input_text'][:50]:50}... ⏱️ TIMEOUT ({timeout:.0f}s)")
+        return {
+            "status": "timeout",
+            "attempts": attempts_of(e),
+            "failure": {
+                "input": item["input_text"],
+                "error": f"Request timeout ({timeout:.0f}s)",
+                "timeout": timeout,
+                "test_type": item.get("test_type", "unknown")
+            }
+        }
         
     except Exception as e:
-        print(f"❌ Exception: {str(e)[:30]}")
-        results["errors"] += 1
-        results["failures"].append({
-            "input": input_text,
-            "error": str(e),
-            "test_type": test_type
-        })
+        outcome = exception_outcome(i, test, e)
+        outcome["attempts"] = attempts_of(e)
+        return outcome
+
+async def evaluate_pending(_, pending_case):
+    return await evaluate_case(*pending_case)
+
+def on_result(_, pending_case, outcome):
+    global completed, passed_so_far
+    i, test = pending_case
+    outcomes[i] = outcome
+    journal.record(keys[i], outcome)
+    record_outcome(warehouse, run_id, test, outcome)
+    completed += 1
+    passed_so_far += outcome["status"] == "passed"
+    if partial:
+        partial.record(test["item"]["input_text"], outcome["status"] == "passed")
     
     # Progress update every 5 tests
-    if (i + 1) % 5 == 0:
+    if completed % 5 == 0:
         elapsed = time.time() - start_time
-        tests_completed = i + 1
-        avg_time = elapsed / tests_completed
-        remaining = (len(test_cases) - tests_completed) * avg_time
+        avg_time = elapsed / (completed - journal.resumed)
+        remaining = (planned - completed) * avg_time
         
-        print(f"\n  Progress: {tests_completed}/{len(test_cases)} completed")
-        print(f"  Pass rate so far: {results['passed']}/{tests_completed} = {results['passed']/tests_completed*100:.1f}%")
+        print(f"\n  Progress: {completed}/{planned} completed")
+        print(f"  Pass rate so far: {passed_so_far}/{completed} = {passed_so_far/completed*100:.1f}%")
         print(f"  Elapsed: {elapsed/60:.1f} min | Est. remaining: {remaining/60:.1f} min")
         print()
 
+# Test each case
+try:
+    if args.batch:
+        batch_results = fetch_batch_responses('gpt-5', system_prompt, [test for _, test in pending], cache, args)
+        for (i, test), result in zip(pending, batch_results):
+            if "error" in result:
+                outcome = exception_outcome(i, test, result["error"])
+            else:
+                outcome = classify_response(i, test, result["response"])
+            on_result(None, (i, test), outcome)
+    else:
+        if budget:
+            budget.start()
+        run_cases(pending, evaluate_pending, concurrency=args.concurrency, on_result=on_result,
+                  on_finish=client.aclose, should_stop=budget.expired if budget else None)
+finally:
+    journal.close()
+    warehouse.flush()
+# A shared --journal keeps the cases outside this filter
+journal.compact(None if filtered else keys)
+
+# Tally in dataset order (cases left out by the budget have no outcome)
+for outcome in outcomes:
+    if outcome is None:
+        continue
+    if outcome.get("request_time") is not None:
+        results["response_times"].append(outcome["request_time"])
+    if outcome["status"] == "passed":
+        results["passed"] += 1
+        continue
+    if outcome["status"] == "failed":
+        results["failed"] += 1
+    elif outcome["status"] == "timeout":
+        results["timeouts"] += 1
+    else:
+        results["errors"] += 1
+    results["failures"].append(outcome["failure"])
+
 # Calculate final statistics
 results["end_time"] = datetime.now().isoformat()
 results["total_time_seconds"] = time.time() - start_time
@@ -248,17 +321,24 @@ if results["response_times"]:
 else:
     results["avg_response_time"] = None
 
-results["pass_rate"] = (results["passed"] / results["total"]) * 100 if results["total"] > 0 else 0
+if args.stream:
+    results["streaming"] = summarize_timings([o["timing"] for o in outcomes if o and o.get("timing")])
+
+results["evaluated"] = sum(outcome is not None for outcome in outcomes)
+results["pass_rate"] = (results["passed"] / results["evaluated"]) * 100 if results["evaluated"] > 0 else 0
 
 # Print final results
 print("\n" + "="*70)
 print("FINAL RESULTS - GPT-5 (FULL MODEL)")
 print("="*70)
+evaluated = results['evaluated'] or 1
 print(f"Total tests:     {results['total']}")
-print(f"Passed:          {results['passed']} ({results['passed']/results['total']*100:.1f}%)")
-print(f"Failed:          {results['failed']} ({results['failed']/results['total']*100:.1f}%)")
-print(f"Timeouts:        {results['timeouts']} ({results['timeouts']/results['total']*100:.1f}%)")
-print(f"Errors:          {results['errors']} ({results['errors']/results['total']*100:.1f}%)")
+if results['evaluated'] < results['total']:
+    print(f"Evaluated:       {results['evaluated']}")
+print(f"Passed:          {results['passed']} ({results['passed']/evaluated*100:.1f}%)")
+print(f"Failed:          {results['failed']} ({results['failed']/evaluated*100:.1f}%)")
+print(f"Timeouts:        {results['timeouts']} ({results['timeouts']/evaluated*100:.1f}%)")
+print(f"Errors:          {results['errors']} ({results['errors']/evaluated*100:.1f}%)")
 print()
 print(f"Pass Rate:       {results['pass_rate']:.1f}%")
 print()
@@ -268,13 +348,40 @@ if results["avg_response_time"]:
     print(f"Avg per test:    {results['avg_response_time']:.1f} seconds")
     print(f"Min time:        {results['min_response_time']:.1f} seconds")
     print(f"Max time:        {results['max_response_time']:.1f} seconds")
+if args.stream:
+    print_timing_summary(results["streaming"])
 print("="*70)
+if not args.batch:
+    limiter.print_summary()
+    client.stats.print_summary()
+    timeouts.print_summary()
+    results["timeout_policy"] = timeouts.summary()
+    timeouts.save()
+    retries.print_summary()
+    results["retries"] = retries.summary()
+if hedger:
+    hedger.print_summary()
+    results["hedging"] = hedger.summary()
+if partial:
+    results["partial_pass_rates"] = partial.timeline
+if budget:
+    passed = [outcome["status"] == "passed" if outcome else None for outcome in outcomes]
+    budget.print_estimate(passed)
+    results["budget"] = budget.summary(passed)
+cache.print_summary()
+cache.close()
+# Filtered and budget-limited runs don't count towards the --fail-first history
+warehouse.finish_run(run_id, results, partial=filtered or results["evaluated"] < results["total"])
+warehouse.print_summary()
+warehouse.close()
 
 # Save results
-with open('gpt5_full_complete_results.json', 'w') as f:
+with open(results_file, 'w') as f:
     json.dump(results, f, indent=2)
+if not args.batch:
+    limiter.export(args.rate_limit_log or selection_name('gpt5_full_complete_ratelimit.json', args))
 
-print(f"\nDetailed results saved to gpt5_full_complete_results.json")
+print(f"\nDetailed results saved to {results_file}")
 
 # Show some failure examples
 if results["failures"]:
@@ -3,36 +3,32 @@
 Run evaluation with minimal prompt iterations
 """
 
+import argparse
 import json
-import time
-import requests
+import random
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 import sys
 
 # Add parent directory to path to import from test/evals
 sys.path.append(str(Path(__file__).parent.parent))
+from eval_engine import DEFAULT_CONCURRENCY, add_concurrency_argument, run_cases
+from rate_limiter import AdaptiveRateLimiter, add_rate_limit_arguments
+from http_client import AsyncEvalHttpClient, TimeoutException, require_api_key
+from response_cache import ResponseCache, add_cache_arguments
+from checkpoint import CheckpointJournal, add_checkpoint_arguments, case_hash, content_hash, read_journal
+from timeout_policy import TimeoutPolicy, add_timeout_arguments
+from retry import RetryPolicy, add_retry_arguments, attempts_of
+from scheduling import FailureHistory, PartialPassRate, add_scheduling_arguments
+from sequential import DEFAULT_CONFIDENCE, DEFAULT_MIN_CASES, PairedSequentialTest, add_early_stop_arguments
+from providers import ChatCompletionsProvider
+from dataset import dataset_version, load_cases
+from warehouse import ResultsWarehouse, add_warehouse_arguments
+from incremental import add_incremental_arguments, stored_outputs
+from significance import compare_paired, format_interval, pass_rate_interval
 
-# Load API key from .env file
-def load_api_key():
-    env_path = Path(__file__).parent.parent.parent.parent / '.env'
-    if env_path.exists():
-        with open(env_path, 'r') as f:
-            for line in f:
-                if line.startswith('OPENAI_API_KEY='):
-                    return line.strip().split('=')[1]
-    return None
-
-API_KEY = load_api_key()
-if not API_KEY:
-    print("Error: OPENAI_API_KEY not found in .env file")
-    exit(1)
-
-BASE_URL = "https://api.openai.com/v1"
-HEADERS = {
-    "Authorization": f"Bearer {API_KEY}",
-    "Content-Type": "application/json"
-}
+API_KEY = require_api_key()
+MODEL = "gpt-4.1"  # Testing with GPT-4.1
 
 def load_prompt(iteration: int = 0) -> str:
     """Load the prompt for a specific iteration"""
@@ -66,18 +62,122 @@ def load_prompt(iteration: int = 0) -> str:
         print(f"Error: Prompt file not found: {prompt_file}")
         exit(1)
 
-def test_prompt_on_dataset(prompt: str, save_results: bool = True, iteration: int = 0) -> Dict:
-    """Test a prompt against the full dataset"""
+def grade_entries(test_case: Dict, entries: Optional[List[Dict]], attempts: int, cost: Optional[float],
+                  timing: Optional[Dict]) -> Dict:
+    """Passed/failed outcome of a model's entries for one case"""
+    # Check against expected values
+    output = entries[0] if entries else {}
+    expected_entry = test_case["expected_entries"][0]
+    category_match = output.get("category") == expected_entry["category"]
+    task_match = output.get("is_task") == expected_entry["is_task"]
     
-    # Load test cases
-    dataset_path = Path(__file__).parent.parent / "eval_dataset.jsonl"
-    test_cases = []
+    if category_match and task_match:
+        return {"status": "passed", "attempts": attempts, "cost_usd": cost, "entries": entries, "timing": timing}
+    
+    # Track failure details
+    return {
+        "status": "failed",
+        "attempts": attempts,
+        "cost_usd": cost,
+        "entries": entries,
+        "timing": timing,
+        "failure": {
+            "input": test_case["input_text"],
+            "expected_category": expected_entry["category"],
+            "expected_is_task": expected_entry["is_task"],
+            "actual_category": output.get("category"),
+            "actual_is_task": output.get("is_task"),
+            "test_type": test_case.get("test_type", "unknown")
+        }
+    }
+
+async def evaluate_case(prompt: str, index: int, test_case: Dict, limiter: AdaptiveRateLimiter,
+                        client: AsyncEvalHttpClient, cache: ResponseCache, timeouts: TimeoutPolicy,
+                        retries: RetryPolicy) -> Dict:
+    """Call the model for one case and classify the outcome, with the attempts it took"""
+    # Throttled by the rate-limit headers of earlier responses; 429/5xx are
+    # retried with backoff instead of being counted as errors
+    provider = ChatCompletionsProvider(MODEL, prompt, client, limiter, cache, temperature=0,
+                                       timeouts=timeouts, retries=retries)
+    timeout = provider.timeout(test_case["input_text"])
+    
+    try:
+        completion = await provider.complete(test_case["input_text"], timeout)
+        attempts = completion.attempts
+        
+        if completion.status_code != 200:
+            print(f"API error for case {index+1}: {completion.status_code} after {attempts} attempts")
+            return {"status": "error", "attempts": attempts, "error": completion.error}
+        
+        cost = completion.cost_usd
+        timing = completion.timing()
+        if not completion.ok:
+            print(f"JSON decode error for case {index+1}")
+            return {"status": "error", "attempts": attempts, "cost_usd": cost, "error": completion.error,
+                    "timing": timing}
+        
+        return grade_entries(test_case, completion.entries, attempts, cost, timing)
+    except TimeoutException as e:
+        print(f"Timeout for case {index+1} after {timeout:.1f}s")
+        return {"status": "timeout", "attempts": attempts_of(e), "error": f"Timeout after {timeout:.1f}s"}
+    except Exception as e:
+        print(f"Error testing case {index+1}: {str(e)}")
+        return {"status": "error", "attempts": attempts_of(e), "error": str(e)}
+
+def record_in_warehouse(warehouse: ResultsWarehouse, run_id: Optional[int], test_case: Dict,
+                        outcome: Dict) -> None:
+    """Write one case outcome to the results warehouse"""
+    warehouse.record(run_id, test_case, outcome["status"], output=outcome.get("entries"),
+                     error=outcome.get("error"), timing=outcome.get("timing"), attempts=outcome.get("attempts"),
+                     detail=outcome.get("failure"))
+
+def record_outcome(results: Dict, outcome: Optional[Dict]) -> None:
+    """Fold one case outcome into the results dict (None: skipped by an early stop)"""
+    if outcome is None:
+        return
+    if outcome["status"] == "passed":
+        results["passed"] += 1
+    elif outcome["status"] == "failed":
+        results["failed"] += 1
+        results["failures"].append(outcome["failure"])
+        
+        # Count failure types
+        test_type = outcome["failure"]["test_type"]
+        if test_type not in results["failure_types"]:
+            results["failure_types"][test_type] = 0
+        results["failure_types"][test_type] += 1
+    elif outcome["status"] == "timeout":
+        results["timeouts"] += 1
+    else:
+        results["errors"] += 1
+
+def test_prompt_on_dataset(prompt: str, save_results: bool = True, iteration: int = 0,
+                           concurrency: int = DEFAULT_CONCURRENCY,
+                           rate_limit_log: Optional[Path] = None,
+                           cache: Optional[ResponseCache] = None,
+                           journal: Optional[CheckpointJournal] = None,
+                           timeouts: Optional[TimeoutPolicy] = None,
+                           retries: Optional[RetryPolicy] = None,
+                           history: Optional[FailureHistory] = None,
+                           early_stop: Optional[PairedSequentialTest] = None,
+                           seed: Optional[int] = None,
+                           warehouse: Optional[ResultsWarehouse] = None,
+                           incremental: bool = False) -> Dict:
+    """Test a prompt against the full dataset
+
+    With a journal, cases it already holds are skipped and every new outcome
+    is appended to it. Request timeouts come from `timeouts` (by default the
+    shared latency history) and throttled requests are retried per `retries`.
+    With a failure history, cases that failed before run first and partial
+    pass rates are printed as they finish. With early_stop, cases run in a
+    random order (`seed`) and the run stops once the test has decided.
+    With a warehouse, every case is recorded there as run iteration_N. With
+    incremental too, outputs it already holds for this prompt are re-graded
+    instead of sent.
+    """
     
-    with open(dataset_path, "r") as f:
-        for line in f:
-            if line.strip():
-                data = json.loads(line)
-                test_cases.append(data["item"])
+    # Load test cases
+    test_cases = [case["item"] for case in load_cases()]
     
     # Test each case
     results = {
@@ -85,89 +185,139 @@ def test_prompt_on_dataset(prompt: str, save_results: bool = True, iteration: in
         "passed": 0,
         "failed": 0,
         "errors": 0,
+        "timeouts": 0,
         "failures": [],
         "failure_types": {}
     }
     
-    print(f"\nTesting {len(test_cases)} cases...")
-    
-    for i, test_case in enumerate(test_cases):
-        try:
-            # Make API call
-            response = requests.post(
-                f"{BASE_URL}/chat/completions",
-                headers=HEADERS,
-                json={
-                    "model": "gpt-4.1",  # Testing with GPT-4.1
-                    "messages": [
-                        {"role": "system", "content": prompt},
-                        {"role": "user", "content": test_case["input_text"]}
-                    ],
-                    "temperature": 0,
-                    "response_format": {"type": "json_object"}
-                }
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                content = result['choices'][0]['message']['content']
-                
-                try:
-                    output = json.loads(content)
-                    
-                    # Check against expected values
-                    expected_entry = test_case["expected_entries"][0]
-                    category_match = output.get("category") == expected_entry["category"]
-                    task_match = output.get("is_task") == expected_entry["is_task"]
-                    
-                    if category_match and task_match:
-                        results["passed"] += 1
-                    else:
-                        results["failed"] += 1
-                        
-                        # Track failure details
-                        failure = {
-                            "input": test_case["input_text"],
-                            "expected_category": expected_entry["category"],
-                            "expected_is_task": expected_entry["is_task"],
-                            "actual_category": output.get("category"),
-                            "actual_is_task": output.get("is_task"),
-                            "test_type": test_case.get("test_type", "unknown")
-                        }
-                        results["failures"].append(failure)
-                        
-                        # Count failure types
-                        test_type = test_case.get("test_type", "unknown")
-                        if test_type not in results["failure_types"]:
-                            results["failure_types"][test_type] = 0
-                        results["failure_types"][test_type] += 1
-                        
-                except json.JSONDecodeError:
-                    results["errors"] += 1
-                    print(f"JSON decode error for case {i+1}")
-            else:
-                results["errors"] += 1
-                print(f"API error for case {i+1}: {response.status_code}")
-                
-        except Exception as e:
-            results["errors"] += 1
-            print(f"Error testing case {i+1}: {str(e)}")
-        
+    keys = [case_hash(test_case) for test_case in test_cases]
+    outcomes = [journal.get(key) if journal else None for key in keys]
+    pending = [(index, test_case) for index, test_case in enumerate(test_cases) if outcomes[index] is None]
+    
+    # Stored outputs for this prompt are re-graded rather than sent
+    warehouse = warehouse or ResultsWarehouse(enabled=False)
+    reuse = stored_outputs(incremental, warehouse, Path(__file__).name, content_hash(prompt))
+    if reuse:
+        remaining = []
+        for index, test_case in pending:
+            stored = reuse.lookup(MODEL, test_case)
+            if stored is None:
+                remaining.append((index, test_case))
+                continue
+            outcome = grade_entries(test_case, stored.entries, 0, None, {"cached": True})
+            outcome["reused_from_run"] = stored.run_id
+            reuse.regraded(stored, outcome["status"] == "passed")
+            outcomes[index] = outcome
+            if journal:
+                journal.record(keys[index], outcome)
+        pending = remaining
+    
+    print(f"\nTesting {len(test_cases)} cases (concurrency {concurrency})...")
+    if journal:
+        journal.print_resume_summary(len(pending))
+    
+    if early_stop:
+        # Resumed and re-graded cases count towards the test before any new ones run
+        for key, outcome in zip(keys, outcomes):
+            if outcome is not None and outcome["status"] in ("passed", "failed"):
+                early_stop.record(key, outcome["status"] == "passed")
+        # The sequential test needs cases in random order
+        random.Random(seed).shuffle(pending)
+    
+    partial = None
+    if history:
+        pending = history.order(pending, lambda pending_case: pending_case[1]["input_text"])
+        history.print_summary(pending, lambda pending_case: pending_case[1]["input_text"])
+        partial = PartialPassRate(history, len(pending))
+    
+    run_id = warehouse.start_run(f"iteration_{iteration}", MODEL, content_hash(prompt), script=Path(__file__).name,
+                                 config={"early_stop": early_stop is not None, "seed": seed},
+                                 dataset_version=dataset_version(test_cases))
+    for test_case, outcome in zip(test_cases, outcomes):
+        if outcome is not None:
+            record_in_warehouse(warehouse, run_id, test_case, outcome)
+    
+    completed = len(test_cases) - len(pending)
+    limiter = AdaptiveRateLimiter(max_concurrency=concurrency)
+    client = AsyncEvalHttpClient(API_KEY)
+    cache = cache or ResponseCache()
+    timeouts = timeouts or TimeoutPolicy()
+    retries = retries or RetryPolicy()
+    
+    async def evaluate(_, pending_case) -> Dict:
+        index, test_case = pending_case
+        return await evaluate_case(prompt, index, test_case, limiter, client, cache, timeouts, retries)
+    
+    def on_result(_, pending_case, outcome: Dict) -> None:
+        nonlocal completed
+        index, test_case = pending_case
+        outcomes[index] = outcome
+        if journal:
+            journal.record(keys[index], outcome)
+        record_in_warehouse(warehouse, run_id, test_case, outcome)
+        if partial:
+            partial.record(test_case["input_text"], outcome["status"] == "passed")
+        if early_stop and outcome["status"] in ("passed", "failed"):
+            early_stop.record(keys[index], outcome["status"] == "passed")
+        completed += 1
         # Progress indicator
-        if (i + 1) % 10 == 0:
-            print(f"Progress: {i+1}/{len(test_cases)}")
-        
-        # Rate limiting
-        time.sleep(0.5)
+        if completed % 10 == 0:
+            print(f"Progress: {completed}/{len(test_cases)}")
     
-    # Calculate pass rate
-    results["pass_rate"] = (results["passed"] / results["total"] * 100) if results["total"] > 0 else 0
+    try:
+        run_cases(pending, evaluate, concurrency=concurrency, on_result=on_result,
+                  on_finish=client.aclose,
+                  should_stop=(lambda: early_stop.decision is not None) if early_stop else None)
+    finally:
+        if journal:
+            journal.close()
+        warehouse.flush()
+    if journal:
+        journal.compact(keys)
+    
+    # Fold in dataset order so failures stay in the same order as the sequential runner
+    for outcome in outcomes:
+        record_outcome(results, outcome)
+    
+    # Calculate pass rate, over the cases that ran if the run stopped early
+    evaluated = sum(outcome is not None for outcome in outcomes)
+    results["evaluated"] = evaluated
+    results["pass_rate"] = (results["passed"] / evaluated * 100) if evaluated > 0 else 0
+    
+    if early_stop:
+        costs = [outcome["cost_usd"] for outcome in outcomes if outcome and outcome.get("cost_usd") is not None]
+        cost_per_case = sum(costs) / len(costs) if costs else None
+        skipped = len(test_cases) - evaluated
+        early_stop.print_summary(skipped, cost_per_case)
+        results["early_stop"] = early_stop.summary()
+        results["early_stop"]["cases_saved"] = skipped
+        results["early_stop"]["usd_saved"] = (round(skipped * cost_per_case, 4)
+                                              if cost_per_case is not None else None)
+    
+    limiter.print_summary()
+    client.stats.print_summary()
+    timeouts.print_summary()
+    timeouts.save()
+    retries.print_summary()
+    results["retries"] = retries.summary()
+    if partial:
+        results["partial_pass_rates"] = partial.timeline
+    cache.print_summary()
+    cache.close()
+    if reuse:
+        reuse.print_summary()
+        results["incremental"] = reuse.summary()
+    warehouse.finish_run(run_id, results, partial=evaluated < len(test_cases))
+    warehouse.print_summary()
+    warehouse.close()
     
     # Save results if requested
     if save_results:
         results_file = Path(__file__).parent / "results" / f"iteration_{iteration}_results.json"
+        results_file.parent.mkdir(exist_ok=True)
         with open(results_file, "w") as f:
             json.dump(results, f, indent=2)
+        limiter.export(rate_limit_log or results_file.with_name(f"iteration_{iteration}_ratelimit.json"))
     
     return results
 
@@ -213,17 +363,64 @@ def analyze_failures(results: Dict) -> None:
 
 def main():
     """Run evaluation with minimal prompt"""
-    import sys
+    parser = argparse.ArgumentParser(description="Run the minimal prompt evaluation")
+    # Run iteration 0 by default
+    parser.add_argument("iteration", type=int, nargs="?", default=0,
+                        help="prompt iteration to evaluate (0 = baseline)")
+    add_concurrency_argument(parser)
+    add_rate_limit_arguments(parser)
+    add_cache_arguments(parser)
+    add_checkpoint_arguments(parser)
+    add_timeout_arguments(parser)
+    add_retry_arguments(parser)
+    add_scheduling_arguments(parser)
+    add_early_stop_arguments(parser)
+    add_warehouse_arguments(parser)
+    add_incremental_arguments(parser)
+    args = parser.parse_args()
+    if args.early_stop and args.fail_first:
+        parser.error("--early-stop needs cases in random order, so it can't be combined with --fail-first")
     
-    # Check if specific iteration requested
-    if len(sys.argv) > 1:
-        iteration = int(sys.argv[1])
-        run_single_iteration(iteration)
-    else:
-        # Run iteration 0 by default
-        run_single_iteration(0)
+    warehouse = ResultsWarehouse.from_args(args)
+    run_single_iteration(args.iteration, concurrency=args.concurrency, rate_limit_log=args.rate_limit_log,
+                         cache=ResponseCache.from_args(args), resume=args.resume, journal_path=args.journal,
+                         timeouts=TimeoutPolicy.from_args(args), retries=RetryPolicy.from_args(args),
+                         history=(FailureHistory.from_args(args, warehouse, MODEL, Path(__file__).name)
+                                  if args.fail_first else None),
+                         early_stop=args.early_stop, early_stop_confidence=args.early_stop_confidence,
+                         early_stop_min_cases=args.early_stop_min_cases, seed=args.seed,
+                         warehouse=warehouse, incremental=args.incremental)
+
+def load_baseline(iteration: int, journal_path: Optional[Path] = None,
+                  warehouse: Optional[ResultsWarehouse] = None) -> Dict[str, bool]:
+    """Pass/fail per case key of the cases an earlier iteration graded
 
-def run_single_iteration(iteration: int):
+    Its checkpoint journal has exact per-case outcomes. Without one, the
+    grades of its latest warehouse run are used. Errors, timeouts and cases
+    that never ran are left out either way; with neither source it's {}.
+    """
+    journal_path = journal_path or Path(__file__).parent / "results" / f"iteration_{iteration}_journal.jsonl"
+    journaled = read_journal(journal_path)
+    if journaled:
+        return {key: outcome["status"] == "passed" for key, outcome in journaled.items()
+                if outcome.get("status") in ("passed", "failed")}
+    if warehouse is None or not warehouse.enabled:
+        return {}
+    run_id = warehouse.resolve_run(f"iteration_{iteration}", MODEL)
+    if run_id is None:
+        return {}
+    return {case_id: status == "passed" for _, case_id, _, _, _, status in warehouse.case_outcomes([run_id])
+            if status in ("passed", "failed")}
+
+def run_single_iteration(iteration: int, concurrency: int = DEFAULT_CONCURRENCY,
+                         rate_limit_log: Optional[Path] = None, cache: Optional[ResponseCache] = None,
+                         resume: bool = False, journal_path: Optional[Path] = None,
+                         timeouts: Optional[TimeoutPolicy] = None, retries: Optional[RetryPolicy] = None,
+                         history: Optional[FailureHistory] = None, early_stop: bool = False,
+                         early_stop_confidence: float = DEFAULT_CONFIDENCE,
+                         early_stop_min_cases: int = DEFAULT_MIN_CASES,
+                         seed: Optional[int] = None, warehouse: Optional[ResultsWarehouse] = None,
+                         incremental: bool = False):
     """Run a single iteration of the evaluation"""
     print("=== Minimal Prompt Evaluation ===")
     
@@ -235,13 +432,36 @@ def run_single_iteration(iteration: int):
     prompt = load_prompt(iteration)
     print(f"Prompt size: {len(prompt.split())} words, {len(prompt.splitlines())} lines")
     
-    results = test_prompt_on_dataset(prompt, save_results=True, iteration=iteration)
+    journal = CheckpointJournal(
+        journal_path or Path(__file__).parent / "results" / f"iteration_{iteration}_journal.jsonl",
+        fingerprint=content_hash({"model": MODEL, "prompt": prompt}), resume=resume
+    )
+    sequential_test = None
+    # Read before the run, which closes the warehouse
+    baseline = load_baseline(iteration - 1, warehouse=warehouse) if iteration > 0 else {}
+    if early_stop:
+        if baseline:
+            print(f"Early stop: comparing against {len(baseline)} stored outcomes from iteration {iteration-1}")
+            sequential_test = PairedSequentialTest(baseline, early_stop_confidence, early_stop_min_cases)
+        else:
+            print("Early stop: no stored results for the previous iteration; running every case")
+    
+    results = test_prompt_on_dataset(prompt, save_results=True, iteration=iteration,
+                                     concurrency=concurrency, rate_limit_log=rate_limit_log,
+                                     cache=cache, journal=journal, timeouts=timeouts,
+                                     retries=retries, history=history, early_stop=sequential_test,
+                                     seed=seed, warehouse=warehouse, incremental=incremental)
     
     print(f"\nResults:")
-    print(f"  Passed: {results['passed']}/{results['total']}")
+    print(f"  Passed: {results['passed']}/{results['evaluated']}")
+    if results["evaluated"] < results["total"]:
+        print(f"  Stopped early: {results['evaluated']} of {results['total']} cases run")
     print(f"  Failed: {results['failed']}")
     print(f"  Errors: {results['errors']}")
-    print(f"  Pass Rate: {results['pass_rate']:.1f}%")
+    print(f"  Timeouts: {results['timeouts']}")
+    current = load_baseline(iteration, journal.path)
+    interval = pass_rate_interval(current.values())
+    print(f"  Pass Rate: {results['pass_rate']:.1f}% {format_interval(interval)}")
     
     # Compare to previous iteration if not baseline
     if iteration > 0:
@@ -251,6 +471,14 @@ def run_single_iteration(iteration: int):
                 prev_results = json.load(f)
             improvement = results['pass_rate'] - prev_results['pass_rate']
             print(f"  Improvement: {improvement:+.1f}% from iteration {iteration-1}")
+        # Paired on the cases both iterations graded, so dataset edits and errors don't skew it
+        comparison = compare_paired(baseline, current)
+        if comparison["cases"]:
+            print(f"  Paired over {comparison['cases']} cases: "
+                  f"{comparison['difference']['estimate']:+.1f} pts "
+                  f"{format_interval(comparison['difference'], ' pts', signed=True)} "
+                  f"({comparison['fixed']} fixed, {comparison['broken']} broken, "
+                  f"McNemar p={comparison['mcnemar_p']:.3f})")
     
     analyze_failures(results)
     
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Label edits to the eval dataset, by case ID, with a changelog
+
+update_test_dataset.py matched cases on their exact input_text. It read the
+whole JSONL into memory and wrote it back in place, so a crash halfway left
+a truncated dataset. This tool finds the cases through the dataset index
+(dataset.py), by case ID or a unique prefix of one, and parses only those
+lines. The dataset is streamed into a temporary file next to it: the
+unchanged byte ranges are copied as they are and the edited lines are
+re-serialised. Once the file is complete and synced, it is renamed over the
+original. Memory use grows with the number of edited cases, not the size of
+the dataset. If the dataset changes while the patch is written, the patch
+is abandoned.
+
+A case ID is the content hash of the case, labels included, so an edit
+gives the case a new ID. Every patch appends a numbered version to
+<dataset>.changelog.jsonl. The entry holds the note, each edited case's old
+and new ID with its fields before and after, and a hash of the file before
+and after the patch.
+
+    python patch_dataset.py set 5e92b6ec is_task=false --note "user feedback"
+    python patch_dataset.py set 5e92b6ec category=Health --entry 0
+    python patch_dataset.py apply edits.jsonl --note "is_task review"   # {"id": ..., "set": {...}}
+    python patch_dataset.py log
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from checkpoint import case_hash
+from dataset import DATASET_PATH, EvalDataset
+
+CHUNK_SIZE = 1 << 20
+
+
+class PatchError(Exception):
+    """A patch that can't be applied as written; the dataset is left unchanged"""
+
+
+def changelog_path(dataset_path: Path) -> Path:
+    return dataset_path.with_name(f"{dataset_path.stem}.changelog.jsonl")
+
+
+def parse_assignment(assignment: str) -> Tuple[str, Any]:
+    """("is_task", False) from "is_task=false"; values that aren't JSON are strings"""
+    field, sep, value = assignment.partition("=")
+    if not sep or not field:
+        raise PatchError(f"Expected FIELD=VALUE, got {assignment!r}")
+    try:
+        return field, json.loads(value)
+    except ValueError:
+        return field, value
+
+
+def read_edits(path: Path) -> List[Dict]:
+    """Edits from a JSONL file, one {"id": ..., "set": {...}, "entry": N (optional)} per line"""
+    edits = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                edit = json.loads(line)
+            except ValueError as e:
+                raise PatchError(f"{path}:{line_number}: not valid JSON: {e}") from e
+            if not isinstance(edit, dict) or not isinstance(edit.get("id"), str) or \
+                    not isinstance(edit.get("set"), dict) or not edit["set"]:
+                raise PatchError(f"{path}:{line_number}: expected {{\"id\": ..., \"set\": {{...}}}}")
+            edits.append(edit)
+    return edits
+
+
+def edit_case(case: Dict, changes: Dict[str, Any], entry: Optional[int]) -> Dict[str, List[Dict]]:
+    """Set `changes` on one expected entry (or all of them) in place; the fields before and after"""
+    entries = case.get("item", case).get("expected_entries") or []
+    targets = range(len(entries)) if entry is None else [entry]
+    if entry is not None and not 0 <= entry < len(entries):
+        raise PatchError(f"case {case_hash(case)} has {len(entries)} expected entries, no entry {entry}")
+    before, after = [], []
+    for index in targets:
+        for field in changes:
+            if field not in entries[index]:
+                raise PatchError(f"case {case_hash(case)}: expected entry {index} has no field {field!r}")
+        before.append({"entry": index, **{field: entries[index][field] for field in changes}})
+        entries[index].update(changes)
+        after.append({"entry": index, **changes})
+    return {"before": before, "after": after}
+
+
+class DatasetPatch:
+    """Label edits to one dataset, applied by streaming it into a new file"""
+
+    def __init__(self, path: Path = DATASET_PATH):
+        self.path = Path(path)
+        self.edits: List[Dict] = []
+
+    def add(self, case_id: str, changes: Dict[str, Any], entry: Optional[int] = None) -> None:
+        self.edits.append({"id": case_id, "set": changes, "entry": entry})
+
+    def _plan(self, dataset: EvalDataset) -> Dict[int, Tuple[Dict, List[Dict]]]:
+        """Position -> (edited case, what changed), parsing only the edited lines"""
+        found = dataset.find(edit["id"] for edit in self.edits)
+        planned: Dict[int, Tuple[Dict, List[Dict]]] = {}
+        for edit in self.edits:
+            positions = found[edit["id"].lower()]
+            if not positions:
+                raise PatchError(f"No case with ID {edit['id']} (was it edited since the ID was taken?)")
+            if len(positions) > 1 and len({dataset.case_id(position) for position in positions}) > 1:
+                raise PatchError(f"Case ID prefix {edit['id']} matches {len(positions)} cases; use more of it")
+            for position in positions:
+                case, changes = planned.get(position, (None, []))
+                if case is None:
+                    case = dataset.case(position)
+                changes.append(edit_case(case, edit["set"], edit.get("entry")))
+                planned[position] = (case, changes)
+        return planned
+
+    def apply(self, note: str = "", dry_run: bool = False) -> Optional[Dict]:
+        """Write the patched dataset and append its changelog entry; returns the entry
+
+        Edits that leave a case as it was are dropped. If nothing changes, nothing is
+        written and None is returned.
+        """
+        with EvalDataset(self.path) as dataset:
+            dataset.print_summary()
+            before_stat = self.path.stat()
+            planned = self._plan(dataset)
+            spans = {position: dataset.span(position) for position in planned}
+            old_ids = {position: dataset.case_id(position) for position in planned}
+
+        cases = []
+        for position in sorted(planned):
+            case, changes = planned[position]
+            new_id = case_hash(case)
+            if new_id == old_ids[position]:
+                continue  # Already had these labels
+            cases.append({"position": position, "old_id": old_ids[position], "new_id": new_id,
+                          "input_text": case.get("item", case).get("input_text", "")[:80], "changes": changes})
+        if not cases or dry_run:
+            return {"cases": cases} if cases else None
+
+        lines = {entry["position"]: json.dumps(planned[entry["position"]][0]).encode("utf-8") for entry in cases}
+        hashes = self._write(lines, {position: spans[position] for position in lines}, before_stat)
+        history = read_changelog(self.path)
+        entry = {
+            "version": (history[-1]["version"] if history else 0) + 1,
+            "at": datetime.now().isoformat(timespec="seconds"),
+            "note": note,
+            "file_hash_before": hashes[0],
+            "file_hash_after": hashes[1],
+            "cases": cases,
+        }
+        with open(changelog_path(self.path), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return entry
+
+    def _write(self, lines: Dict[int, bytes], spans: Dict[int, Tuple[int, int]],
+               before_stat: os.stat_result) -> Tuple[str, str]:
+        """Stream the dataset into a temp file with `lines` swapped in, then rename it into place"""
+        before_hash, after_hash = hashlib.blake2b(digest_size=16), hashlib.blake2b(digest_size=16)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        try:
+            with open(self.path, "rb") as source, open(tmp_path, "wb") as target:
+                def copy(length: int) -> None:
+                    while length > 0:
+                        chunk = source.read(min(CHUNK_SIZE, length))
+                        if not chunk:
+                            raise PatchError(f"{self.path} ended early; was it changed during the patch?")
+                        before_hash.update(chunk)
+                        after_hash.update(chunk)
+                        target.write(chunk)
+                        length -= len(chunk)
+
+                for position in sorted(lines):
+                    offset, length = spans[position]
+                    copy(offset - source.tell())
+                    old_line = source.read(length)
+                    before_hash.update(old_line)
+                    after_hash.update(lines[position])
+                    target.write(lines[position])
+                copy(before_stat.st_size - source.tell())
+                target.flush()
+                os.fsync(target.fileno())
+
+            after_stat = self.path.stat()
+            if (after_stat.st_size, after_stat.st_mtime_ns) != (before_stat.st_size, before_stat.st_mtime_ns):
+                raise PatchError(f"{self.path} changed while the patch was being written; nothing was changed")
+            os.replace(tmp_path, self.path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        # The rename itself is durable once the directory entry is synced
+        directory = os.open(self.path.parent, os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+        return before_hash.hexdigest(), after_hash.hexdigest()
+
+
+def read_changelog(path: Path = DATASET_PATH) -> List[Dict]:
+    """Every changelog entry of the dataset at `path`, oldest first"""
+    log = changelog_path(Path(path))
+    if not log.exists():
+        return []
+    with open(log, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def print_patch(entry: Dict, dry_run: bool = False) -> None:
+    header = "Would change" if dry_run else f"Version {entry['version']}: changed"
+    print(f"{header} {len(entry['cases'])} case(s)")
+    for case in entry["cases"]:
+        changes = []
+        for change in case["changes"]:
+            for before, after in zip(change["before"], change["after"]):
+                changes += [f"entry {before['entry']} {field} {before[field]!r} -> {value!r}"
+                            for field, value in after.items() if field != "entry" and before[field] != value]
+        print(f"  {case['old_id']} -> {case['new_id']}  {case['input_text'][:50]!r}: {'; '.join(changes)}")
+
+
+def print_changelog(history: Iterable[Dict]) -> None:
+    for entry in history:
+        note = f"  {entry['note']}" if entry.get("note") else ""
+        print(f"v{entry['version']:<4} {entry['at']}  {len(entry['cases'])} case(s){note}")
+        for case in entry["cases"]:
+            print(f"      {case['old_id']} -> {case['new_id']}  {case['input_text'][:60]!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Edit eval dataset labels by case ID")
+    parser.add_argument("--dataset", type=Path, default=DATASET_PATH, metavar="PATH")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    set_parser = commands.add_parser("set", help="set fields on one case's expected entries")
+    set_parser.add_argument("case_id", help="case ID (checkpoint case hash) or a unique prefix of one")
+    set_parser.add_argument("assignments", nargs="+", metavar="FIELD=VALUE",
+                            help="values are JSON (is_task=false) or plain strings (category=Health)")
+    set_parser.add_argument("--entry", type=int, default=None,
+                            help="only this expected entry (default: all of them)")
+    apply_parser = commands.add_parser("apply", help="apply a JSONL file of edits")
+    apply_parser.add_argument("edits", type=Path)
+    for command in (set_parser, apply_parser):
+        command.add_argument("--note", default="", help="why; stored in the changelog")
+        command.add_argument("--dry-run", action="store_true", help="show the changes without writing them")
+    commands.add_parser("log", help="show the changelog")
+    args = parser.parse_args()
+
+    if args.command == "log":
+        print_changelog(read_changelog(args.dataset))
+        return 0
+
+    patch = DatasetPatch(args.dataset)
+    try:
+        if args.command == "set":
+            patch.add(args.case_id, dict(parse_assignment(assignment) for assignment in args.assignments),
+                      args.entry)
+        else:
+            for edit in read_edits(args.edits):
+                patch.add(edit["id"], edit["set"], edit.get("entry"))
+        entry = patch.apply(args.note, dry_run=args.dry_run)
+    except PatchError as e:
+        print(f"❌ {e}")
+        return 1
+    if entry is None:
+        print("Nothing to change: the cases already have those labels")
+    else:
+        print_patch(entry, dry_run=args.dry_run)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Token prices for the models the evals call, and per-response cost
+
+Prices are USD per million tokens (input, output) from the OpenAI pricing
+page as of August 2025; update them here when they change. Both usage
+shapes are understood: Chat Completions (prompt_tokens/completion_tokens)
+and Responses (input_tokens/output_tokens).
+"""
+
+from typing import Dict, Optional, Tuple
+
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "o3": (2.00, 8.00),
+    "gpt-5": (1.25, 10.00),
+    "gpt-5-mini": (0.25, 2.00),
+    "gpt-5-nano": (0.05, 0.40),
+}
+
+
+def token_counts(usage: Optional[Dict]) -> Tuple[int, int]:
+    """(input, output) tokens from either API's usage block"""
+    if not usage:
+        return 0, 0
+    input_tokens = usage.get("input_tokens", usage.get("prompt_tokens", 0)) or 0
+    output_tokens = usage.get("output_tokens", usage.get("completion_tokens", 0)) or 0
+    return input_tokens, output_tokens
+
+
+def cost_usd(model: str, usage: Optional[Dict]) -> Optional[float]:
+    """Cost of one response, or None when the model's price or the usage is unknown"""
+    if model not in MODEL_PRICES or not usage:
+        return None
+    input_price, output_price = MODEL_PRICES[model]
+    input_tokens, output_tokens = token_counts(usage)
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
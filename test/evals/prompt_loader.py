@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Production system prompts, read from lib/services/ai_service.dart
+
+OpenAiService.extractEntries picks _buildRephrasePrompt or
+_buildVerbatimPrompt, depending on the user's rephrase setting, so the
+evals send exactly what those methods return. The loader finds the
+triple-quoted string each method returns. It locates the file from the repo
+root, not a developer's checkout path, and doesn't rely on comment markers.
+The string is kept as a template with its $categoriesListString
+placeholder. Any other interpolation is an error, rather than being sent
+as literal text.
+
+Parsed templates are cached in .cache/prompt_templates.json, keyed by the
+Dart file's mtime and size. When those change but the content hash
+doesn't, the cached templates are still used. An unchanged file is
+therefore not parsed again. Each rendered prompt carries a fingerprint, a
+hash of its text, which is a stable key for caches and results.
+"""
+
+import hashlib
+import json
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+from checkpoint import content_hash
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+AI_SERVICE_PATH = REPO_ROOT / "lib" / "services" / "ai_service.dart"
+DEFAULT_TEMPLATE_CACHE = Path(__file__).parent / ".cache" / "prompt_templates.json"
+PLACEHOLDER = "$categoriesListString"
+
+# Prompt variant -> the OpenAiService method that builds it
+PROMPT_BUILDERS = {
+    "rephrase": "_buildRephrasePrompt",
+    "verbatim": "_buildVerbatimPrompt",
+}
+DEFAULT_VARIANT = "rephrase"  # The app's default (ai_rephrase_enabled ?? true)
+
+# The default categories and descriptions the evals were written against
+DEFAULT_CATEGORIES: Sequence[Tuple[str, str]] = (
+    ("Personal", "Personal life, social activities, family, hobbies, errands"),
+    ("Work", "Work-related activities, meetings, projects, professional tasks"),
+    ("Health", "Medical appointments, exercise, wellness, mental health"),
+    ("Finance", "Money management, purchases, banking, investments"),
+    ("Misc", "Random thoughts, observations, miscellaneous items"),
+)
+
+_INTERPOLATION = re.compile(r'(?<!\\)\$(\{[^}]*\}|[A-Za-z_]\w*)')
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r"}
+
+
+class PromptExtractionError(Exception):
+    """ai_service.dart no longer has a prompt builder in the shape the loader expects"""
+
+
+def _builder_pattern(method: str) -> re.Pattern:
+    return re.compile(r'String\s+' + re.escape(method) + r'\s*\(\s*String\s+categoriesListString\s*\)\s*\{\s*'
+                      r'return\s+"""(.*?)""";', re.DOTALL)
+
+
+def _compile_literal(method: str, literal: str) -> str:
+    """Template text from a Dart triple-quoted literal; only $categoriesListString may be interpolated"""
+    for match in _INTERPOLATION.finditer(literal):
+        if match.group(1) not in ("categoriesListString", "{categoriesListString}"):
+            raise PromptExtractionError(f"{method} interpolates ${match.group(1)}, which the loader can't fill in")
+    literal = literal.replace("${categoriesListString}", PLACEHOLDER)
+    return re.sub(r'\\(.)', lambda m: _ESCAPES.get(m.group(1), m.group(1)), literal)
+
+
+def parse_prompt_templates(source: str) -> Dict[str, str]:
+    """Template per variant from the text of ai_service.dart"""
+    templates = {}
+    for variant, method in PROMPT_BUILDERS.items():
+        match = _builder_pattern(method).search(source)
+        if not match:
+            raise PromptExtractionError(f"Could not find {method}(String categoriesListString) "
+                                        f"returning a \"\"\"...\"\"\" string")
+        templates[variant] = _compile_literal(method, match.group(1))
+        if PLACEHOLDER not in templates[variant]:
+            raise PromptExtractionError(f"{method} no longer includes {PLACEHOLDER}")
+    return templates
+
+
+def categories_list_string(categories: Sequence[Tuple[str, str]] = DEFAULT_CATEGORIES) -> str:
+    """Category list formatted the way extractEntries does: "- Name: description" per line"""
+    return "\n".join(f"- {name}: {description}" if description.strip() else f"- {name}"
+                     for name, description in categories)
+
+
+@dataclass(frozen=True)
+class Prompt:
+    """A rendered production prompt and where it came from"""
+    variant: str
+    text: str
+    template_hash: str
+    source_hash: str
+
+    @property
+    def fingerprint(self) -> str:
+        return content_hash(self.text)
+
+    def summary(self) -> Dict:
+        return {
+            "variant": self.variant,
+            "builder": PROMPT_BUILDERS[self.variant],
+            "fingerprint": self.fingerprint,
+            "template_hash": self.template_hash,
+            "source_hash": self.source_hash,
+            "chars": len(self.text),
+        }
+
+
+class PromptLoader:
+    """Templates from ai_service.dart, re-parsed only when the file's content changes"""
+
+    def __init__(self, path: Path = AI_SERVICE_PATH, cache_path: Optional[Path] = DEFAULT_TEMPLATE_CACHE):
+        self.path = Path(path)
+        self.cache_path = Path(cache_path) if cache_path is not None else None
+        self.parsed = False  # Whether the last templates() call had to parse the file
+        self._templates: Optional[Tuple[str, Dict[str, str]]] = None
+
+    def _read_cache(self) -> Dict:
+        if self.cache_path is None or not self.cache_path.exists():
+            return {}
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                return json.load(f).get(str(self.path), {})
+        except (OSError, ValueError):
+            return {}
+
+    def _write_cache(self, entry: Dict) -> None:
+        if self.cache_path is None:
+            return
+        entries = {}
+        if self.cache_path.exists():
+            try:
+                with open(self.cache_path, "r", encoding="utf-8") as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                pass
+        entries[str(self.path)] = entry
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_name(self.cache_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, indent=2)
+        os.replace(tmp_path, self.cache_path)
+
+    def templates(self) -> Tuple[str, Dict[str, str]]:
+        """(source hash, template per variant), from the cache when the file is unchanged"""
+        if self._templates is not None:
+            return self._templates
+        try:
+            stat = self.path.stat()
+        except OSError as e:
+            raise PromptExtractionError(f"Cannot read {self.path}: {e}") from e
+        cached = self._read_cache()
+        self.parsed = False
+        if cached.get("mtime_ns") == stat.st_mtime_ns and cached.get("size") == stat.st_size:
+            self._templates = cached["source_hash"], cached["templates"]
+            return self._templates
+        source = self.path.read_bytes()
+        source_hash = hashlib.sha256(source).hexdigest()[:16]
+        if cached.get("source_hash") == source_hash:
+            templates = cached["templates"]
+        else:
+            templates = parse_prompt_templates(source.decode("utf-8"))
+            self.parsed = True
+        self._write_cache({"mtime_ns": stat.st_mtime_ns, "size": stat.st_size,
+                           "source_hash": source_hash, "templates": templates})
+        self._templates = source_hash, templates
+        return self._templates
+
+    def load(self, variant: str = DEFAULT_VARIANT,
+             categories: Sequence[Tuple[str, str]] = DEFAULT_CATEGORIES) -> Prompt:
+        """The prompt extractEntries would send for `variant` with these categories"""
+        if variant not in PROMPT_BUILDERS:
+            raise ValueError(f"Unknown prompt variant {variant!r}; expected one of {', '.join(PROMPT_BUILDERS)}")
+        source_hash, templates = self.templates()
+        template = templates[variant]
+        return Prompt(variant, template.replace(PLACEHOLDER, categories_list_string(categories)),
+                      content_hash(template), source_hash)
+
+
+def load_production_prompt(variant: str = DEFAULT_VARIANT) -> Prompt:
+    """Production prompt for `variant` from this repo's ai_service.dart"""
+    return PromptLoader().load(variant)
+
+
+def add_prompt_arguments(parser) -> None:
+    """Add the shared --prompt-variant option to an argparse parser"""
+    parser.add_argument("--prompt-variant", choices=sorted(PROMPT_BUILDERS), default=DEFAULT_VARIANT,
+                        help=f"which ai_service.dart prompt to send: rephrase ({PROMPT_BUILDERS['rephrase']}) "
+                             f"or verbatim ({PROMPT_BUILDERS['verbatim']}) (default: {DEFAULT_VARIANT})")
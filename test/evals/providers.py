@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+One async interface over the two ways the evals ask for structured output
+
+The Responses API runners send the strict json_schema that
+OpenAiService.extractEntries uses. compare_models, run_minimal_eval and
+run_gpt41_full_eval send Chat Completions with json_object. A provider
+builds the request body for its API, sends it through the shared stack
+(response cache, then hedging and retries if given, then a rate limiter slot
+with a timeout from the latency history), and parses the output into a list
+of entries. The result also carries the usage and timing. Runners that score
+through a provider therefore share the caching, retry and timeout behaviour
+whichever API they call, and the two output modes can be compared on equal
+terms (see minimal_prompt/compare_output_modes.py).
+"""
+
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from http_client import AsyncEvalHttpClient, TimeoutException
+from rate_limiter import AdaptiveRateLimiter
+from response_cache import CACHE_HEADER, ResponseCache
+from hedging import HedgingPolicy
+from timeout_policy import TimeoutPolicy
+from retry import RetryPolicy, attempts_of
+from pricing import cost_usd, token_counts
+
+# Define the JSON schema for structured outputs
+ENTRY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "entries": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "text_segment": {"type": "string"},
+                    "category": {"type": "string"},
+                    "is_task": {"type": "boolean"},
+                },
+                "required": ["text_segment", "category", "is_task"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["entries"],
+    "additionalProperties": False,
+}
+
+
+def build_request_body(model: str, system_prompt: str, input_text: str,
+                       temperature: Optional[float] = None) -> Dict:
+    """Responses API request body matching OpenAiService.extractEntries"""
+    body = {
+        'model': model,
+        'input': [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": input_text}
+        ],
+        'text': {
+            'format': {
+                'type': 'json_schema',
+                'name': 'multiple_entry_extraction',
+                'schema': ENTRY_SCHEMA,
+                'strict': True
+            },
+        },
+    }
+    if temperature is not None:
+        body['temperature'] = temperature
+    return body
+
+
+def build_chat_body(model: str, system_prompt: str, input_text: str, temperature: Optional[float] = 0,
+                    system_role: bool = True, json_mode: bool = True) -> Dict:
+    """Chat Completions request body; without system_role the prompt goes in the user message (o3)"""
+    if system_role:
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": input_text}
+        ]
+    else:
+        messages = [{"role": "user", "content": f"{system_prompt}\n\nUser input: {input_text}"}]
+    body = {"model": model, "messages": messages}
+    if temperature is not None:
+        body["temperature"] = temperature
+    if json_mode:
+        body["response_format"] = {"type": "json_object"}
+    return body
+
+
+def extract_entries(response_json: Dict) -> List[Dict]:
+    """Extract the JSON entries from a Responses API response"""
+    entries = []
+    if response_json.get('output'):
+        for output_item in response_json['output']:
+            if output_item['type'] == 'message' and output_item.get('content'):
+                for content_item in output_item['content']:
+                    if content_item['type'] == 'output_text':
+                        result = json.loads(content_item['text'])
+                        entries = result.get("entries", [])
+                        break
+    return entries
+
+
+def parse_json_content(content: str) -> Any:
+    """JSON from a message, tolerating a ```json fence or prose around the object"""
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        pass
+    if "```json" in content:
+        start = content.find("```json") + 7
+        end = content.find("```", start)
+        return json.loads(content[start:end if end != -1 else None].strip())
+    start, end = content.find("{"), content.rfind("}")
+    if start == -1 or end < start:
+        raise json.JSONDecodeError("No JSON object found", content, 0)
+    return json.loads(content[start:end + 1])
+
+
+def as_entries(output: Any) -> List[Dict]:
+    """Entries from an {"entries": [...]} object, a bare list, or one entry object"""
+    if isinstance(output, dict) and "entries" in output:
+        entries = output["entries"]
+    elif isinstance(output, list):
+        entries = output
+    else:
+        entries = [output]
+    # The single-object prompt calls the cleaned-up text "text"
+    return [{**entry, "text_segment": entry.get("text_segment", entry.get("text", ""))}
+            if isinstance(entry, dict) else {} for entry in entries]
+
+
+@dataclass
+class Completion:
+    """One provider call: the parsed entries plus usage and timing"""
+    status_code: int
+    entries: List[Dict] = field(default_factory=list)
+    output: Any = None
+    content: Optional[str] = None
+    error: Optional[str] = None
+    usage: Optional[Dict] = None
+    cost_usd: Optional[float] = None
+    seconds: float = 0.0
+    attempts: int = 1
+    cached: bool = False
+    response: Optional[Dict] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def timing(self) -> Dict:
+        """Per-case timing and token counts kept in the results"""
+        input_tokens, output_tokens = token_counts(self.usage)
+        return {
+            "seconds": round(self.seconds, 4),
+            "cached": self.cached,
+            "attempts": self.attempts,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cost_usd": round(self.cost_usd, 8) if self.cost_usd is not None else None,
+        }
+
+
+class Provider:
+    """Sends one case through the cache/hedging/retry/limiter stack and parses its entries"""
+
+    endpoint = ""
+    output_mode = ""
+
+    def __init__(self, model: str, system_prompt: str, client: AsyncEvalHttpClient,
+                 limiter: AdaptiveRateLimiter, cache: ResponseCache,
+                 temperature: Optional[float] = None,
+                 timeouts: Optional[TimeoutPolicy] = None,
+                 retries: Optional[RetryPolicy] = None,
+                 hedger: Optional[HedgingPolicy] = None):
+        self.model = model
+        self.system_prompt = system_prompt
+        self.client = client
+        self.limiter = limiter
+        self.cache = cache
+        self.temperature = temperature
+        self.timeouts = timeouts
+        self.retries = retries
+        self.hedger = hedger
+
+    def build_body(self, input_text: str) -> Dict:
+        raise NotImplementedError
+
+    def parse(self, response_json: Dict) -> Completion:
+        """Completion for a 200 response; error is set when the output can't be used"""
+        raise NotImplementedError
+
+    def timeout(self, input_text: str) -> Optional[float]:
+        return self.timeouts.timeout(self.model, input_text) if self.timeouts else None
+
+    async def send(self, input_text: str, timeout: Optional[float] = None) -> httpx.Response:
+        """POST one case inside a rate limiter slot, unless cached
+
+        With a retry policy, 429/5xx responses are retried after a backoff
+        (outside the limiter slot). With a hedger, a slow request gets a
+        duplicate and the first answer wins. With a timeout policy, uncached
+        latencies and timeouts are recorded in it.
+        """
+        body = self.build_body(input_text)
+
+        async def send():
+            async with self.limiter.slot(self.model):
+                request_start = time.perf_counter()
+                try:
+                    response = await self.client.post(
+                        self.endpoint,
+                        json=body,
+                        timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT
+                    )
+                except TimeoutException:
+                    if self.timeouts:
+                        self.timeouts.record_timeout(self.model)
+                    raise
+                self.limiter.record(self.model, response.status_code, response.headers)
+            if self.timeouts and response.status_code == 200:
+                self.timeouts.record(self.model, input_text, time.perf_counter() - request_start,
+                                     response.json().get("usage"))
+            return response
+
+        async def retrying_send():
+            return await self.retries.run(send)
+
+        attempt = retrying_send if self.retries else send
+
+        async def hedged_send():
+            return await self.hedger.run(self.model, attempt)
+
+        return await self.cache.fetch(self.endpoint, body, hedged_send if self.hedger else attempt)
+
+    async def complete(self, input_text: str, timeout: Optional[float] = None) -> Completion:
+        """Send one case and parse it; a timeout is raised (TimeoutException), other failures set error
+
+        Without an explicit timeout, the timeout policy (if any) picks one.
+        """
+        if timeout is None:
+            timeout = self.timeout(input_text)
+        start = time.perf_counter()
+        response = await self.send(input_text, timeout)
+        if response.status_code != 200:
+            completion = Completion(response.status_code,
+                                    error=f"API Error {response.status_code}: {response.text[:200]}")
+        else:
+            response_json = response.json()
+            completion = self.parse(response_json)
+            completion.response = response_json
+            completion.usage = response_json.get("usage")
+            completion.cost_usd = cost_usd(self.model, completion.usage)
+        completion.seconds = time.perf_counter() - start
+        completion.attempts = attempts_of(response)
+        completion.cached = response.headers.get(CACHE_HEADER) == "hit"
+        return completion
+
+
+class ResponsesProvider(Provider):
+    """Responses API with the strict json_schema that OpenAiService.extractEntries sends"""
+
+    endpoint = "/responses"
+    output_mode = "json_schema"
+
+    def build_body(self, input_text: str) -> Dict:
+        return build_request_body(self.model, self.system_prompt, input_text, self.temperature)
+
+    def parse(self, response_json: Dict) -> Completion:
+        if response_json.get('status') != 'completed':
+            return Completion(200, error=f"API request failed: {response_json}")
+        try:
+            entries = extract_entries(response_json)
+        except (ValueError, KeyError, TypeError) as e:
+            return Completion(200, error=f"JSON decode error: {e}")
+        return Completion(200, entries=entries, output={"entries": entries})
+
+
+class ChatCompletionsProvider(Provider):
+    """Chat Completions with json_object output
+
+    system_role=False folds the prompt into the user message and json_mode=False
+    drops response_format, for models that support neither (o3).
+    """
+
+    endpoint = "/chat/completions"
+    output_mode = "json_object"
+
+    def __init__(self, *args, system_role: bool = True, json_mode: bool = True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.system_role = system_role
+        self.json_mode = json_mode
+        if self.temperature is None:
+            self.temperature = 0
+
+    def build_body(self, input_text: str) -> Dict:
+        return build_chat_body(self.model, self.system_prompt, input_text, self.temperature,
+                               self.system_role, self.json_mode)
+
+    def parse(self, response_json: Dict) -> Completion:
+        content = response_json['choices'][0]['message']['content']
+        try:
+            output = parse_json_content(content) if not self.json_mode else json.loads(content)
+        except json.JSONDecodeError:
+            return Completion(200, content=content, error="JSON decode error")
+        return Completion(200, entries=as_entries(output), output=output, content=content)
+
+
+PROVIDERS = {
+    "json_schema": ResponsesProvider,
+    "json_object": ChatCompletionsProvider,
+}
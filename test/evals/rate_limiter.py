@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Adaptive per-model rate limiter driven by OpenAI rate-limit response headers
+
+Each model gets an in-flight concurrency window that grows while responses show
+spare quota and shrinks (AIMD) on 429/5xx or when the remaining quota drops
+below the headroom fraction. Every observation is kept as a time series sample
+so a run can show how close it came to the quota.
+"""
+
+import asyncio
+import json
+import re
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional
+
+# 429 and transient server errors both mean "back off"
+CONGESTION_STATUSES = {429, 500, 502, 503, 504}
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Parse x-ratelimit-reset-* values such as "1s", "6m0s" or "20ms" into seconds"""
+    if value is None:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def _header_int(headers: Mapping[str, str], name: str) -> Optional[int]:
+    value = headers.get(name)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class _ModelState:
+    """Concurrency window and latest quota snapshot for one model"""
+
+    def __init__(self, initial: float, max_limit: float):
+        self.limit = initial
+        self.max_limit = max_limit
+        self.min_interval = 0.0
+        self.next_start = 0.0
+        self.in_flight = 0
+        self.peak_limit = initial
+        self.slow_start = True
+        self.pause_until = 0.0
+        self.last_decrease = 0.0
+        self.condition: Optional[asyncio.Condition] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.responses = 0
+        self.congestion_events = 0
+        self.min_requests_fraction: Optional[float] = None
+        self.min_tokens_fraction: Optional[float] = None
+
+
+class AdaptiveRateLimiter:
+    """AIMD concurrency limiter shared by all requests of a run"""
+
+    def __init__(self, max_concurrency: int, initial_concurrency: int = 4,
+                 min_concurrency: int = 1, headroom: float = 0.1,
+                 decrease_factor: float = 0.5, decrease_cooldown: float = 1.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.initial_concurrency = max(min_concurrency, min(initial_concurrency, self.max_concurrency))
+        self.min_concurrency = min_concurrency
+        self.headroom = headroom
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self.started = time.monotonic()
+        self.samples: List[Dict] = []
+        self._models: Dict[str, _ModelState] = {}
+
+    def _state(self, model: str) -> _ModelState:
+        if model not in self._models:
+            self._models[model] = _ModelState(float(self.initial_concurrency), float(self.max_concurrency))
+        return self._models[model]
+
+    def set_budget(self, model: str, max_concurrency: Optional[int] = None,
+                   requests_per_minute: Optional[float] = None) -> None:
+        """Give `model` its own concurrency ceiling and/or request rate cap"""
+        state = self._state(model)
+        if max_concurrency is not None:
+            state.max_limit = float(max(self.min_concurrency, max_concurrency))
+            state.limit = min(state.limit, state.max_limit)
+            state.peak_limit = state.limit
+        if requests_per_minute:
+            state.min_interval = 60.0 / requests_per_minute
+
+    @asynccontextmanager
+    async def slot(self, model: str):
+        """Wait for a free in-flight slot for `model` and hold it for the request"""
+        state = self._state(model)
+        # A limiter can outlive one asyncio.run() (e.g. one run per model)
+        loop = asyncio.get_running_loop()
+        if state.loop is not loop:
+            state.condition = asyncio.Condition()
+            state.loop = loop
+        async with state.condition:
+            while True:
+                now = time.monotonic()
+                # Quota pause, then request-rate spacing
+                delay = max(state.pause_until, state.next_start) - now
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(state.condition.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                if state.in_flight < int(state.limit):
+                    break
+                await state.condition.wait()
+            state.in_flight += 1
+            state.next_start = max(now, state.next_start) + state.min_interval
+        try:
+            yield
+        finally:
+            async with state.condition:
+                state.in_flight -= 1
+                state.condition.notify_all()
+
+    def record(self, model: str, status_code: int, headers: Mapping[str, str]) -> None:
+        """Update the window for `model` from one response's status and headers"""
+        state = self._state(model)
+        now = time.monotonic()
+        state.responses += 1
+
+        remaining_requests = _header_int(headers, "x-ratelimit-remaining-requests")
+        limit_requests = _header_int(headers, "x-ratelimit-limit-requests")
+        remaining_tokens = _header_int(headers, "x-ratelimit-remaining-tokens")
+        limit_tokens = _header_int(headers, "x-ratelimit-limit-tokens")
+        reset_requests = parse_reset_duration(headers.get("x-ratelimit-reset-requests"))
+        reset_tokens = parse_reset_duration(headers.get("x-ratelimit-reset-tokens"))
+        retry_after = parse_reset_duration(headers.get("retry-after"))
+
+        requests_fraction = (remaining_requests / limit_requests
+                             if remaining_requests is not None and limit_requests else None)
+        tokens_fraction = (remaining_tokens / limit_tokens
+                           if remaining_tokens is not None and limit_tokens else None)
+        if requests_fraction is not None:
+            state.min_requests_fraction = min(requests_fraction, state.min_requests_fraction
+                                              if state.min_requests_fraction is not None else 1.0)
+        if tokens_fraction is not None:
+            state.min_tokens_fraction = min(tokens_fraction, state.min_tokens_fraction
+                                            if state.min_tokens_fraction is not None else 1.0)
+
+        low_headroom = any(fraction is not None and fraction < self.headroom
+                           for fraction in (requests_fraction, tokens_fraction))
+
+        if status_code in CONGESTION_STATUSES or low_headroom:
+            # Multiplicative decrease, at most once per cooldown so one burst of
+            # 429s from requests already in flight doesn't collapse the window
+            if now - state.last_decrease >= self.decrease_cooldown:
+                state.limit = max(float(self.min_concurrency), state.limit * self.decrease_factor)
+                state.last_decrease = now
+                state.congestion_events += 1
+            state.slow_start = False
+        elif 200 <= status_code < 300:
+            # Additive increase: +1 per response during slow start, then +1 per window
+            increase = 1.0 if state.slow_start else 1.0 / state.limit
+            state.limit = min(state.max_limit, state.limit + increase)
+        state.peak_limit = max(state.peak_limit, state.limit)
+
+        # Pause the model entirely until its quota resets when it is exhausted
+        pause = None
+        if status_code == 429:
+            pause = retry_after or max(reset_requests or 0.0, reset_tokens or 0.0) or 1.0
+        elif remaining_requests == 0 and reset_requests:
+            pause = reset_requests
+        elif remaining_tokens == 0 and reset_tokens:
+            pause = reset_tokens
+        if pause:
+            state.pause_until = max(state.pause_until, now + pause)
+
+        self.samples.append({
+            "t": round(now - self.started, 3),
+            "model": model,
+            "status": status_code,
+            "limit": round(state.limit, 2),
+            "in_flight": state.in_flight,
+            "remaining_requests": remaining_requests,
+            "limit_requests": limit_requests,
+            "remaining_tokens": remaining_tokens,
+            "limit_tokens": limit_tokens,
+            "reset_requests_s": reset_requests,
+            "reset_tokens_s": reset_tokens,
+            "paused_s": round(max(0.0, state.pause_until - now), 3),
+        })
+
+    def summary(self) -> Dict[str, Dict]:
+        """Per-model limiter statistics for the run summary"""
+        return {
+            model: {
+                "responses": state.responses,
+                "max_concurrency": round(state.max_limit, 2),
+                "requests_per_minute": round(60.0 / state.min_interval, 1) if state.min_interval else None,
+                "congestion_events": state.congestion_events,
+                "final_concurrency": round(state.limit, 2),
+                "peak_concurrency": round(state.peak_limit, 2),
+                "min_remaining_requests_pct": (round(state.min_requests_fraction * 100, 1)
+                                               if state.min_requests_fraction is not None else None),
+                "min_remaining_tokens_pct": (round(state.min_tokens_fraction * 100, 1)
+                                             if state.min_tokens_fraction is not None else None),
+            }
+            for model, state in self._models.items()
+        }
+
+    def print_summary(self) -> None:
+        """Print how close each model came to its quota"""
+        print("\nRate limiter:")
+        for model, stats in self.summary().items():
+            requests_pct = stats["min_remaining_requests_pct"]
+            tokens_pct = stats["min_remaining_tokens_pct"]
+            print(f"  {model}: concurrency {stats['final_concurrency']:.1f} "
+                  f"(peak {stats['peak_concurrency']:.1f}), "
+                  f"{stats['congestion_events']} backoffs, min remaining quota: "
+                  f"requests {'n/a' if requests_pct is None else f'{requests_pct:.1f}%'}, "
+                  f"tokens {'n/a' if tokens_pct is None else f'{tokens_pct:.1f}%'}")
+
+    def export(self, path: Path) -> None:
+        """Save the limiter time series and summary as JSON"""
+        with open(path, "w") as f:
+            json.dump({"summary": self.summary(), "samples": self.samples}, f, indent=2)
+
+
+def parse_model_values(values: Optional[List[str]], cast=int) -> Dict[str, float]:
+    """Turn repeated MODEL=VALUE options into a dict"""
+    parsed = {}
+    for value in values or []:
+        model, sep, amount = value.rpartition("=")
+        if not sep or not model:
+            raise ValueError(f"Expected MODEL=VALUE, got {value!r}")
+        parsed[model] = cast(amount)
+    return parsed
+
+
+def add_model_budget_arguments(parser) -> None:
+    """Add per-model --model-concurrency/--model-rpm options to an argparse parser"""
+    parser.add_argument("--model-concurrency", action="append", metavar="MODEL=N",
+                        help="in-flight ceiling for one model (repeatable; default: --concurrency)")
+    parser.add_argument("--model-rpm", action="append", metavar="MODEL=N",
+                        help="requests per minute cap for one model (repeatable; default: uncapped)")
+
+
+def add_rate_limit_arguments(parser) -> None:
+    """Add the shared limiter options to an argparse parser"""
+    parser.add_argument(
+        "--rate-limit-log", type=Path, default=None, metavar="PATH",
+        help="where to save the limiter time series (default: next to the results file)"
+    )
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Content-addressed on-disk cache for eval API responses
+
+The key is a SHA-256 of the endpoint and the full canonical request body, so
+the model, system prompt, user input, response format/schema and sampling
+parameters all take part. Changing one line of a prompt or adding dataset
+cases only misses for the requests that actually changed. Entries live in a
+single SQLite file and the least recently used ones are evicted once the
+cache grows past its size limit.
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+
+import httpx
+
+from http_client import BASE_URL
+
+DEFAULT_CACHE_PATH = Path(__file__).parent / ".cache" / "responses.sqlite3"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Marks responses served from the cache
+CACHE_HEADER = "x-eval-cache"
+
+
+def cache_key(path: str, body: Dict) -> str:
+    """Hash of the endpoint and canonical request body"""
+    canonical = json.dumps({"base_url": BASE_URL, "path": path, "body": body},
+                           sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Size-bounded LRU cache of successful JSON responses"""
+
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES,
+                 enabled: bool = True, refresh: bool = False):
+        # enabled=False bypasses the cache; refresh=True skips reads but still stores
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._total_bytes = 0
+        if enabled:
+            self._open()
+
+    @classmethod
+    def from_args(cls, args) -> "ResponseCache":
+        return cls(enabled=not args.no_cache, refresh=args.refresh)
+
+    def _open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                body TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Cached response JSON for `key`, or None"""
+        if not self.enabled or self.refresh:
+            return None
+        row = self._db.execute("SELECT body FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with self._db:
+            self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key: str, response_json: Dict) -> None:
+        """Store a response and evict least recently used entries over the size limit"""
+        if not self.enabled:
+            return
+        body = json.dumps(response_json, separators=(",", ":"))
+        size = len(body.encode("utf-8"))
+        now = time.time()
+        with self._db:
+            old = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, body, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, body, size, now, now)
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            self.stores += 1
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        rows = self._db.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall()
+        for key, size in rows:
+            if self._total_bytes <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def lookup(self, path: str, body: Dict) -> Optional[Dict]:
+        """Cached response JSON for this request, counted as a hit or miss"""
+        if not self.enabled:
+            return None
+        cached = self.get(cache_key(path, body))
+        if cached is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return cached
+
+    def store(self, path: str, body: Dict, response_json: Dict) -> None:
+        """Cache a successful response obtained outside fetch() (e.g. from a batch)"""
+        self.put(cache_key(path, body), response_json)
+
+    async def fetch(self, path: str, body: Dict,
+                    send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        """Return the cached response for this request, or call send() and cache a 200"""
+        if not self.enabled:
+            return await send()
+        cached = self.lookup(path, body)
+        if cached is not None:
+            return httpx.Response(200, json=cached, headers={CACHE_HEADER: "hit"})
+        response = await send()
+        if response.status_code == 200:
+            try:
+                self.store(path, body, response.json())
+            except ValueError:
+                pass
+        return response
+
+    def summary(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "refresh": self.refresh,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups * 100, 1) if lookups else None,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "bytes": self._total_bytes,
+        }
+
+    def print_summary(self) -> None:
+        """Print hit/miss statistics for the run summary"""
+        if not self.enabled:
+            print("\nResponse cache: disabled (--no-cache)")
+            return
+        stats = self.summary()
+        hit_rate = f"{stats['hit_rate']:.1f}%" if stats["hit_rate"] is not None else "n/a"
+        mode = " (refresh)" if self.refresh else ""
+        print(f"\nResponse cache{mode}: {self.hits} hits, {self.misses} misses ({hit_rate} hit rate), "
+              f"{self.stores} stored, {self.evictions} evicted, {self._total_bytes / 1024 / 1024:.1f} MB on disk")
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def add_cache_arguments(parser) -> None:
+    """Add the shared --no-cache/--refresh options to an argparse parser"""
+    parser.add_argument("--no-cache", action="store_true",
+                        help="neither read nor write the response cache")
+    parser.add_argument("--refresh", action="store_true",
+                        help="ignore cached responses but store the fresh ones")
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Retries with exponential backoff for transient API failures
+
+A 429, a 5xx or a dropped connection is retried after a full-jitter backoff
+(a random delay between 0 and base * 2^attempt, capped). When the server
+sends Retry-After, that delay is used instead. Retries come out of a per-run
+budget: a fraction of all requests, with a small floor. A throttling storm
+therefore can't multiply the run's traffic, and once the budget is spent the
+remaining failures are reported as errors. The final response carries the
+number of attempts in a header, so runners can record attempts per case.
+"""
+
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional
+
+import httpx
+
+from rate_limiter import CONGESTION_STATUSES, parse_reset_duration
+
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 60.0
+DEFAULT_BUDGET = 0.2
+MIN_BUDGET = 10
+
+# Added to the final response, like the cache's x-eval-cache marker
+ATTEMPTS_HEADER = "x-eval-attempts"
+
+
+def retry_after_seconds(headers: Mapping[str, str]) -> Optional[float]:
+    """Server-requested delay from retry-after-ms or Retry-After (seconds or an HTTP date)"""
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms is not None:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    seconds = parse_reset_duration(value)
+    if seconds is not None:
+        return max(0.0, seconds)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def attempts_of(result: Any) -> int:
+    """Attempts recorded on a response or exception by RetryPolicy.run (1 if it wasn't retried)"""
+    headers = getattr(result, "headers", None)
+    if headers is not None and ATTEMPTS_HEADER in headers:
+        return int(headers[ATTEMPTS_HEADER])
+    return getattr(result, "eval_attempts", 1)
+
+
+def _is_retryable_error(error: BaseException) -> bool:
+    # Timeouts have their own outcome class and aren't retried here
+    return isinstance(error, httpx.TransportError) and not isinstance(error, httpx.TimeoutException)
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, Retry-After and a per-run retry budget"""
+
+    def __init__(self, max_retries: int = DEFAULT_MAX_RETRIES, base_delay: float = DEFAULT_BASE_DELAY,
+                 max_delay: float = DEFAULT_MAX_DELAY, budget: float = DEFAULT_BUDGET,
+                 min_budget: int = MIN_BUDGET):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.min_budget = min_budget
+        self.requests = 0
+        self.attempts = 0
+        self.retries = 0
+        self.recovered = 0
+        self.gave_up = 0
+        self.budget_exhausted = 0
+        self.backoff_seconds = 0.0
+        self.retries_by_cause: Dict[str, int] = {}
+        self.attempt_counts: Dict[int, int] = {}
+
+    @classmethod
+    def from_args(cls, args) -> "RetryPolicy":
+        return cls(max_retries=args.max_retries, base_delay=args.retry_base_delay,
+                   budget=args.retry_budget)
+
+    def _budget_left(self) -> bool:
+        return self.retries < max(self.min_budget, self.budget * self.requests)
+
+    def backoff(self, retry: int, headers: Optional[Mapping[str, str]] = None) -> float:
+        """Delay before retry number `retry` (0-based): Retry-After if given, else full jitter"""
+        if headers is not None:
+            retry_after = retry_after_seconds(headers)
+            if retry_after is not None:
+                return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+    def _may_retry(self, retry: int) -> bool:
+        if retry >= self.max_retries:
+            self.gave_up += 1
+            return False
+        if not self._budget_left():
+            self.budget_exhausted += 1
+            self.gave_up += 1
+            return False
+        return True
+
+    async def run(self, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        """Call send() until it succeeds, fails permanently or runs out of retries"""
+        self.requests += 1
+        retry = 0
+        while True:
+            self.attempts += 1
+            try:
+                response = await send()
+            except Exception as e:
+                if not _is_retryable_error(e) or not self._may_retry(retry):
+                    self._count_attempts(retry + 1)
+                    e.eval_attempts = retry + 1
+                    raise
+                cause = type(e).__name__
+                delay = self.backoff(retry)
+            else:
+                if response.status_code not in CONGESTION_STATUSES or not self._may_retry(retry):
+                    if retry and response.status_code < 400:
+                        self.recovered += 1
+                    self._count_attempts(retry + 1)
+                    response.headers[ATTEMPTS_HEADER] = str(retry + 1)
+                    return response
+                cause = str(response.status_code)
+                delay = self.backoff(retry, response.headers)
+            self.retries += 1
+            self.retries_by_cause[cause] = self.retries_by_cause.get(cause, 0) + 1
+            self.backoff_seconds += delay
+            retry += 1
+            await asyncio.sleep(delay)
+
+    def _count_attempts(self, attempts: int) -> None:
+        self.attempt_counts[attempts] = self.attempt_counts.get(attempts, 0) + 1
+
+    def summary(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "retries_by_cause": self.retries_by_cause,
+            "recovered": self.recovered,
+            "gave_up": self.gave_up,
+            "budget_exhausted": self.budget_exhausted,
+            "backoff_seconds": round(self.backoff_seconds, 2),
+            "attempts_per_request": {str(n): count for n, count in sorted(self.attempt_counts.items())},
+        }
+
+    def print_summary(self) -> None:
+        """Print how many requests needed retries and how much time went to backoff"""
+        if not self.retries and not self.gave_up:
+            return
+        causes = ", ".join(f"{cause} x{count}" for cause, count in sorted(self.retries_by_cause.items()))
+        print(f"\nRetries: {self.retries} over {self.requests} requests ({self.attempts} attempts; {causes})")
+        print(f"  {self.recovered} recovered, {self.gave_up} gave up "
+              f"({self.budget_exhausted} because the retry budget ran out), "
+              f"{self.backoff_seconds:.1f}s spent in backoff")
+        histogram = ", ".join(f"{n} attempt{'s' if n > 1 else ''}: {count}"
+                              for n, count in sorted(self.attempt_counts.items()))
+        print(f"  Requests by attempts - {histogram}")
+
+
+def add_retry_arguments(parser) -> None:
+    """Add the shared retry options to an argparse parser"""
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES, metavar="N",
+                        help=f"retries per request on 429/5xx/connection errors "
+                             f"(default: {DEFAULT_MAX_RETRIES}; 0 disables)")
+    parser.add_argument("--retry-base-delay", type=float, default=DEFAULT_BASE_DELAY, metavar="SECONDS",
+                        help=f"backoff base; retry n waits up to base * 2^n seconds (default: {DEFAULT_BASE_DELAY:g})")
+    parser.add_argument("--retry-budget", type=float, default=DEFAULT_BUDGET, metavar="FRACTION",
+                        help=f"retries allowed per run as a fraction of requests, at least {MIN_BUDGET} "
+                             f"(default: {DEFAULT_BUDGET:g})")
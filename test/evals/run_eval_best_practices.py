@@ -5,31 +5,14 @@ Based on OpenAI's eval design best practices guide.
 """
 
 import json
-import requests
 import time
 from pathlib import Path
 from typing import Dict, Any, List
 
-# Load API key from .env file
-def load_api_key():
-    env_path = Path(__file__).parent.parent.parent / '.env'
-    if env_path.exists():
-        with open(env_path, 'r') as f:
-            for line in f:
-                if line.startswith('OPENAI_API_KEY='):
-                    return line.strip().split('=')[1]
-    return None
+from http_client import EvalHttpClient, require_api_key
 
-API_KEY = load_api_key()
-if not API_KEY:
-    print("Error: OPENAI_API_KEY not found in .env file")
-    exit(1)
-
-BASE_URL = "https://api.openai.com/v1"
-HEADERS = {
-    "Authorization": f"Bearer {API_KEY}",
-    "Content-Type": "application/json"
-}
+API_KEY = require_api_key()
+CLIENT = EvalHttpClient(API_KEY)
 
 def create_evaluation() -> str:
     """Create an evaluation following best practices"""
@@ -116,9 +99,8 @@ Evaluate this output step by step."""
         ]
     }
     
-    response = requests.post(
-        f"{BASE_URL}/evals",
-        headers=HEADERS,
+    response = CLIENT.post(
+        "/evals",
         json=eval_config
     )
     
@@ -283,9 +265,8 @@ def create_comprehensive_test_data() -> str:
         files = {"file": ("best_practices_test_data.jsonl", f, "application/jsonl")}
         data = {"purpose": "evals"}
         
-        response = requests.post(
-            f"{BASE_URL}/files",
-            headers={"Authorization": f"Bearer {API_KEY}"},
+        response = CLIENT.post(
+            "/files",
             files=files,
             data=data
         )
@@ -404,9 +385,8 @@ For this evaluation, output a single JSON object (not an array) with:
         }
     }
     
-    response = requests.post(
-        f"{BASE_URL}/evals/{eval_id}/runs",
-        headers=HEADERS,
+    response = CLIENT.post(
+        f"/evals/{eval_id}/runs",
         json=run_config
     )
     
@@ -423,10 +403,7 @@ For this evaluation, output a single JSON object (not an array) with:
 def check_run_status(eval_id: str, run_id: str):
     """Check the status of an evaluation run with detailed analysis"""
     
-    response = requests.get(
-        f"{BASE_URL}/evals/{eval_id}/runs/{run_id}",
-        headers=HEADERS
-    )
+    response = CLIENT.get(f"/evals/{eval_id}/runs/{run_id}")
     
     if response.status_code == 200:
         result = response.json()
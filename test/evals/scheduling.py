@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Fail-first ordering of eval cases
+
+The results warehouse holds every graded case of every run, so each case
+has a pass/fail history across this runner's past runs of the model. Only
+finished runs that covered the whole dataset count (not filtered, budget
+or early-stopped ones), and a case only counts in the runs that graded it:
+errors and timeouts are no outcome. With --fail-first, the cases that
+failed the last time they were graded run first, then the rest in order of
+their smoothed historical failure rate plus their flakiness (how often the
+outcome flipped between consecutive runs). Unseen cases count as a coin
+flip. Because the engine's workers take cases in list order, the cases
+most likely to have changed are answered first. The partial pass rate,
+overall and for the previously failing cases, is printed as results
+arrive, so a regression or a fix shows up within the first few seconds
+rather than at the end of the run.
+"""
+
+from typing import Callable, Dict, List, Optional, Sequence, TypeVar
+
+from warehouse import ResultsWarehouse
+
+DEFAULT_REPORT_EVERY = 5
+
+T = TypeVar("T")
+
+
+class FailureHistory:
+    """Per-case pass/fail sequences (oldest first), keyed by input text"""
+
+    def __init__(self, runs: Sequence[Dict[str, bool]] = ()):
+        # runs: {input text: passed} of the cases each past run graded, oldest first
+        self.runs = list(runs)
+        self._outcomes: Dict[str, List[bool]] = {}
+        for run in self.runs:
+            for input_text, passed in run.items():
+                self._outcomes.setdefault(input_text, []).append(passed)
+
+    @classmethod
+    def from_warehouse(cls, warehouse: ResultsWarehouse, model: str, script: Optional[str] = None,
+                       run_ids: Optional[List[int]] = None) -> "FailureHistory":
+        """History of the model's complete runs by `script` (or just `run_ids`)"""
+        if not warehouse.enabled:
+            return cls()
+        runs: Dict[int, Dict[str, bool]] = {}
+        for run_id, input_text, passed in warehouse.outcome_history(model, script, run_ids):
+            runs.setdefault(run_id, {})[input_text] = bool(passed)
+        return cls(runs[run_id] for run_id in sorted(runs))
+
+    @classmethod
+    def from_args(cls, args, warehouse: ResultsWarehouse, model: str, script: str) -> "FailureHistory":
+        """History for --history (default: every complete run of this script and model)"""
+        if not warehouse.enabled:
+            print("Fail-first: the results warehouse is disabled, so there is no history")
+            return cls()
+        if not args.history:
+            return cls.from_warehouse(warehouse, model, script)
+        run_ids = []
+        for spec in args.history:
+            run_id = warehouse.resolve_run(spec, model)
+            if run_id is None:
+                raise ValueError(f"No run matches {spec!r} for {model}")
+            run_ids.append(run_id)
+        return cls.from_warehouse(warehouse, model, run_ids=run_ids)
+
+    def outcomes(self, input_text: str) -> List[bool]:
+        """Whether the case passed in each past run that graded it, oldest first"""
+        return self._outcomes.get(input_text, [])
+
+    def failure_rate(self, input_text: str) -> float:
+        """Laplace-smoothed failure rate; 0.5 for a case with no history"""
+        history = self.outcomes(input_text)
+        return (history.count(False) + 1) / (len(history) + 2)
+
+    def flakiness(self, input_text: str) -> float:
+        """Fraction of consecutive runs whose outcome differed"""
+        history = self.outcomes(input_text)
+        if len(history) < 2:
+            return 0.0
+        return sum(a != b for a, b in zip(history, history[1:])) / (len(history) - 1)
+
+    def priority(self, input_text: str) -> float:
+        """Higher runs sooner; failing last time outranks any history (both terms are at most 1)"""
+        return (2.0 * self.previously_failed(input_text) +
+                self.failure_rate(input_text) + self.flakiness(input_text))
+
+    def previously_failed(self, input_text: str) -> bool:
+        """Did the case fail the last time it was graded?"""
+        history = self.outcomes(input_text)
+        return bool(history) and not history[-1]
+
+    def order(self, cases: Sequence[T], input_text: Callable[[T], str]) -> List[T]:
+        """Cases sorted most-likely-to-fail first (stable, so ties keep dataset order)"""
+        return sorted(cases, key=lambda case: -self.priority(input_text(case)))
+
+    def print_summary(self, cases: Sequence[T], input_text: Callable[[T], str]) -> None:
+        texts = [input_text(case) for case in cases]
+        failing = sum(self.previously_failed(text) for text in texts)
+        flaky = sum(self.flakiness(text) > 0 for text in texts)
+        unseen = sum(not self.outcomes(text) for text in texts)
+        print(f"Fail-first order from {len(self.runs)} past runs: {failing} cases failed last time, "
+              f"{flaky} flip-flopped, {unseen} never graded")
+
+
+class PartialPassRate:
+    """Running pass rate, overall and for cases that failed in the last run"""
+
+    def __init__(self, history: FailureHistory, total: int, report_every: int = DEFAULT_REPORT_EVERY):
+        self.history = history
+        self.total = total
+        self.report_every = report_every
+        self.done = 0
+        self.passed = 0
+        self.previously_failing = 0
+        self.now_passing = 0
+        self.timeline: List[Dict] = []
+
+    def record(self, input_text: str, passed: bool) -> None:
+        """Fold in one finished case and print the partial pass rates every few cases"""
+        self.done += 1
+        self.passed += passed
+        if self.history.previously_failed(input_text):
+            self.previously_failing += 1
+            self.now_passing += passed
+        point = {"done": self.done, "pass_rate": round(self.passed / self.done * 100, 1),
+                 "previously_failing": self.previously_failing, "now_passing": self.now_passing}
+        self.timeline.append(point)
+        if self.done % self.report_every == 0 or self.done == self.total:
+            fixed = (f", previously failing {self.now_passing}/{self.previously_failing} now pass"
+                     if self.previously_failing else "")
+            print(f"  [partial] {self.done}/{self.total}: {point['pass_rate']:.1f}% pass{fixed}")
+
+
+def add_scheduling_arguments(parser) -> None:
+    """Add the shared --fail-first options to an argparse parser"""
+    parser.add_argument("--fail-first", action="store_true",
+                        help="run cases that failed or flip-flopped in past results first and "
+                             "print partial pass rates as they finish")
+    parser.add_argument("--history", nargs="+", default=None, metavar="RUN",
+                        help="warehouse runs to take the failure history from: run ids, labels or prompt "
+                             "hash prefixes (default: every complete run of this script and model)")
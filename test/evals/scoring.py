@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Vectorized scoring of many runs against the expected labels
+
+Each runner scores its cases one at a time with `if` checks. The only
+breakdown it gives is analyze_failures' "category only / task only / both
+wrong" count. This module reads the expected and actual entries of any
+number of warehouse runs into padded NumPy arrays, shaped runs x cases x
+entries, and scores them all in one pass. It computes:
+- a pass matrix (run x case x criterion) for four criteria:
+  - category: the first entry's category is right
+  - is_task: the first entry's is_task is right
+  - entry_count: the answer has the expected number of entries
+  - entries: every entry matches, which is how the Responses API runners
+    score
+- a confusion matrix of the first entry's category, per run
+- is_task precision, recall and F1, per run
+- pass counts per test_type, per run
+
+A case that errored or timed out has no entries, so it fails every
+criterion. Scoring 100 runs of 100k cases takes a few hundred milliseconds.
+Loading them out of SQLite takes longer.
+
+    python scoring.py iteration_6 iteration_7 --model gpt-4.1
+    python scoring.py 14 15 16 --test-types 5
+"""
+
+import argparse
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from warehouse import DEFAULT_WAREHOUSE_PATH, ResultsWarehouse
+
+CRITERIA = ("category", "is_task", "entry_count", "entries")
+MISSING = -1  # Padding past the last entry, and labels an answer left out
+NO_CATEGORY = "(none)"  # Confusion matrix column for answers without a category
+MAX_PATTERN_BINS = 1 << 25  # Largest (run, test_type, pattern) table score() counts in one bincount
+
+
+@dataclass
+class Labels:
+    """Expected and actual labels of several runs, padded to the most entries (E) in any case or answer"""
+    runs: List[Dict]
+    case_ids: List[str]
+    categories: List[str]
+    test_types: List[str]
+    test_type: np.ndarray          # [C] index into test_types
+    expected_category: np.ndarray  # [C, E] index into categories
+    expected_task: np.ndarray      # [C, E] 0/1
+    actual_category: np.ndarray    # [R, C, E]
+    actual_task: np.ndarray        # [R, C, E]
+    actual_text: np.ndarray        # [R, C, E] the entry has a non-empty text_segment
+    actual_count: np.ndarray       # [R, C] entries in the answer
+    ran: np.ndarray                # [R, C] the run has an outcome for the case
+
+    @property
+    def expected_count(self) -> np.ndarray:
+        return (self.expected_category != MISSING).sum(axis=-1)
+
+
+def _task_label(value) -> int:
+    return int(value) if isinstance(value, bool) else MISSING
+
+
+def load_labels(warehouse: ResultsWarehouse, run_ids: Sequence[int]) -> Labels:
+    """Labels of every case graded in these runs (the union of their cases)"""
+    rows = warehouse.case_outcomes(list(run_ids))
+    run_index = {run_id: index for index, run_id in enumerate(run_ids)}
+    case_index: Dict[str, int] = {}
+    categories: Dict[str, int] = {}
+    test_types: Dict[str, int] = {}
+    expected: Dict[int, List[Dict]] = {}
+    case_type: Dict[int, int] = {}
+    answers = []
+    width = 1
+    for run_id, case_id, test_type, expected_json, output_json, _ in rows:
+        case = case_index.setdefault(case_id, len(case_index))
+        if case not in expected:
+            expected[case] = json.loads(expected_json)
+            case_type[case] = test_types.setdefault(test_type or "unknown", len(test_types))
+            for entry in expected[case]:
+                categories.setdefault(str(entry.get("category")), len(categories))
+            width = max(width, len(expected[case]))
+        output = json.loads(output_json) if output_json else None
+        entries = [entry for entry in output if isinstance(entry, dict)] if isinstance(output, list) else []
+        answers.append((run_index[run_id], case, entries))
+        width = max(width, len(entries))
+
+    runs, cases = len(run_ids), len(case_index)
+    labels = Labels(
+        runs=[warehouse.run(run_id) for run_id in run_ids],
+        case_ids=list(case_index),
+        categories=[],
+        test_types=list(test_types),
+        test_type=np.array([case_type[case] for case in range(cases)], dtype=np.int32),
+        expected_category=np.full((cases, width), MISSING, dtype=np.int16),
+        expected_task=np.full((cases, width), MISSING, dtype=np.int8),
+        actual_category=np.full((runs, cases, width), MISSING, dtype=np.int16),
+        actual_task=np.full((runs, cases, width), MISSING, dtype=np.int8),
+        actual_text=np.zeros((runs, cases, width), dtype=bool),
+        actual_count=np.zeros((runs, cases), dtype=np.int16),
+        ran=np.zeros((runs, cases), dtype=bool),
+    )
+    for case, entries in expected.items():
+        for position, entry in enumerate(entries):
+            labels.expected_category[case, position] = categories[str(entry.get("category"))]
+            labels.expected_task[case, position] = _task_label(entry.get("is_task"))
+    for run, case, entries in answers:
+        labels.ran[run, case] = True
+        labels.actual_count[run, case] = len(entries)
+        for position, entry in enumerate(entries):
+            category = entry.get("category")
+            labels.actual_category[run, case, position] = (categories.setdefault(category, len(categories))
+                                                           if isinstance(category, str) else MISSING)
+            labels.actual_task[run, case, position] = _task_label(entry.get("is_task"))
+            labels.actual_text[run, case, position] = bool(str(entry.get("text_segment") or "").strip())
+    labels.categories = list(categories)  # Expected ones first, then any others the models answered with
+    return labels
+
+
+@dataclass
+class Scores:
+    """Every metric for every run, computed in one vectorized pass by score()"""
+    labels: Labels
+    passed: np.ndarray            # [R, C, K] bool, K = len(CRITERIA)
+    pass_rate: np.ndarray         # [R, K] percent of the cases each run ran
+    confusion: np.ndarray         # [R, L, L + 1] expected x answered first category; last column = none
+    task_counts: np.ndarray       # [R, 3] is_task true positives, false positives, false negatives
+    test_type_cases: np.ndarray   # [R, T]
+    test_type_passed: np.ndarray  # [R, T, K]
+
+    @property
+    def task_precision(self) -> np.ndarray:
+        tp, fp, _ = self.task_counts.T
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(tp + fp > 0, tp / (tp + fp), np.nan)
+
+    @property
+    def task_recall(self) -> np.ndarray:
+        tp, _, fn = self.task_counts.T
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(tp + fn > 0, tp / (tp + fn), np.nan)
+
+    @property
+    def task_f1(self) -> np.ndarray:
+        precision, recall = self.task_precision, self.task_recall
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), np.nan)
+
+    def summary(self, run: int) -> Dict:
+        """JSON-friendly metrics of the run at index `run`"""
+        labels = self.labels
+        columns = labels.categories + [NO_CATEGORY]
+        cases = self.test_type_cases[run]
+        return {
+            "run": labels.runs[run],
+            "cases": int(labels.ran[run].sum()),
+            "pass_rate": {criterion: round(float(rate), 1) for criterion, rate in zip(CRITERIA, self.pass_rate[run])},
+            "is_task": {"precision": _rounded(self.task_precision[run]), "recall": _rounded(self.task_recall[run]),
+                        "f1": _rounded(self.task_f1[run])},
+            "confusion": {expected: {actual: int(count) for actual, count in zip(columns, row) if count}
+                          for expected, row in zip(labels.categories, self.confusion[run]) if row.any()},
+            "test_types": {labels.test_types[t]: {"cases": int(cases[t]),
+                                                  **{criterion: int(self.test_type_passed[run, t, k])
+                                                     for k, criterion in enumerate(CRITERIA)}}
+                           for t in np.flatnonzero(cases)},
+        }
+
+    def print_summary(self, top_test_types: int = 10) -> None:
+        labels = self.labels
+        print("\n%-8s | %-24s | %-14s | %-6s | " % ("Run", "Label", "Model", "Cases") +
+              " | ".join("%-11s" % criterion for criterion in CRITERIA) + " | is_task P/R/F1")
+        print("-" * 136)
+        for run, meta in enumerate(labels.runs):
+            rates = " | ".join("%-11s" % f"{rate:.1f}%" for rate in self.pass_rate[run])
+            prf = "/".join(_format_ratio(value) for value in
+                           (self.task_precision[run], self.task_recall[run], self.task_f1[run]))
+            print("%-8s | %-24s | %-14s | %-6d | %s | %s" % (f"#{meta['run_id']}", meta["label"][:24],
+                                                             meta["model"][:14], labels.ran[run].sum(), rates, prf))
+
+        columns = [category[:8] for category in labels.categories] + [NO_CATEGORY]
+        for run, meta in enumerate(labels.runs):
+            print(f"\nRun #{meta['run_id']} category confusion (rows expected, columns first entry's category):")
+            print("  %-10s " % "" + " ".join("%8s" % column for column in columns))
+            for category, row in zip(labels.categories, self.confusion[run]):
+                if not row.any():
+                    continue  # Only ever answered, never expected
+                print("  %-10s " % category[:10] + " ".join("%8d" % count for count in row))
+
+            cases = self.test_type_cases[run]
+            ran = np.flatnonzero(cases)
+            if not len(ran) or not top_test_types:
+                continue
+            entries = CRITERIA.index("entries")
+            rates = self.test_type_passed[run, ran, entries] / cases[ran]
+            worst = ran[np.argsort(rates, kind="stable")[:top_test_types]]
+            print(f"  Lowest pass rates by test type:")
+            for t in worst:
+                passes = self.test_type_passed[run, t]
+                print(f"    {labels.test_types[t][:36]:36} {passes[entries]}/{cases[t]} pass "
+                      f"(category {passes[0]}, is_task {passes[1]}, entry count {passes[2]})")
+
+
+def _rounded(value: float) -> Optional[float]:
+    return None if np.isnan(value) else round(float(value), 3)
+
+
+def _format_ratio(value: float) -> str:
+    return "-" if np.isnan(value) else f"{value:.2f}"
+
+
+def score(labels: Labels) -> Scores:
+    """Pass matrix, confusion matrices, is_task counts and test_type breakdowns for every run at once"""
+    runs, cases, width = labels.actual_category.shape
+    ran = labels.ran
+    expected_count = labels.expected_count
+
+    # One runs x cases array per criterion. Entries are compared as whole arrays, then the short
+    # entries axis is folded a column at a time, which is several times faster than np.all over it.
+    category_ok = labels.actual_category == labels.expected_category[None]
+    task_ok = labels.actual_task == labels.expected_task[None]
+    entry_ok = category_ok & task_ok & labels.actual_text
+    entry_ok |= (np.arange(width)[None, :] >= expected_count[:, None])[None]
+    count_ok = labels.actual_count == expected_count[None, :]
+    all_entries = count_ok.copy()
+    for position in range(width):
+        all_entries &= entry_ok[:, :, position]
+    criteria = [category_ok[:, :, 0], task_ok[:, :, 0], count_ok, all_entries]
+    criteria = [passed & ran for passed in criteria]
+    ran_count = ran.sum(axis=1)
+    pass_counts = np.stack([passed.sum(axis=1) for passed in criteria], axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pass_rate = np.where(ran_count[:, None] > 0, pass_counts / ran_count[:, None] * 100, 0.0)
+
+    # Confusion matrices: one bincount over (run, expected, answered) cells, with a spare bin for
+    # the cases a run didn't have
+    n_labels = len(labels.categories)
+    size = n_labels * (n_labels + 1)
+    actual = labels.actual_category[:, :, 0].astype(np.int32)
+    actual[actual == MISSING] = n_labels
+    cells = actual + labels.expected_category[None, :, 0].astype(np.int32) * (n_labels + 1)
+    cells += (np.arange(runs, dtype=np.int32) * size)[:, None]
+    cells[~ran] = runs * size
+    confusion = np.bincount(cells.ravel(), minlength=runs * size + 1)[:-1].reshape(runs, n_labels, n_labels + 1)
+
+    # is_task on the first entry
+    expected_task = (labels.expected_task[:, 0] == 1)[None, :]
+    actual_task = labels.actual_task[:, :, 0] == 1
+    task_counts = np.stack([(expected_task & actual_task & ran).sum(axis=1),
+                            (~expected_task & actual_task & ran).sum(axis=1),
+                            (expected_task & ~actual_task & ran).sum(axis=1)], axis=1)
+
+    # Per test_type counts. Each cell's criteria form a bit pattern, so one bincount over
+    # (run, test_type, pattern) counts them all; with very many test types that table would be too
+    # big, so each criterion gets its own bincount instead.
+    n_types = len(labels.test_types)
+    n_groups = runs * n_types
+    n_patterns = 1 << len(CRITERIA)
+    if n_groups * (n_patterns + 1) <= MAX_PATTERN_BINS:
+        groups = labels.test_type[None, :] + (np.arange(runs, dtype=np.int32) * n_types)[:, None]
+        pattern = np.zeros((runs, cases), dtype=np.uint8)
+        for bit, passed in enumerate(criteria):
+            pattern |= passed.view(np.uint8) << bit
+        pattern[~ran] = n_patterns  # Spare bin for cases the run didn't have
+        counts = np.bincount((groups * (n_patterns + 1) + pattern).ravel(),
+                             minlength=n_groups * (n_patterns + 1)).reshape(runs, n_types, n_patterns + 1)
+        bits = (np.arange(n_patterns)[:, None] >> np.arange(len(CRITERIA))[None, :]) & 1
+        test_type_cases = counts[..., :n_patterns].sum(axis=-1)
+        test_type_passed = counts[..., :n_patterns] @ bits
+    else:
+        groups = labels.test_type[None, :].astype(np.int64) + (np.arange(runs) * n_types)[:, None]
+        test_type_cases = np.bincount(groups[ran], minlength=n_groups).reshape(runs, n_types)
+        test_type_passed = np.stack([np.bincount(groups[passed], minlength=n_groups) for passed in criteria],
+                                    axis=-1).reshape(runs, n_types, len(CRITERIA))
+
+    return Scores(labels, np.stack(criteria, axis=-1), pass_rate, confusion, task_counts,
+                  test_type_cases, test_type_passed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score warehouse runs by criterion, category and test type")
+    parser.add_argument("runs", nargs="+", help="run ids, labels or prompt hash prefixes (latest matching run)")
+    parser.add_argument("--model", help="only consider runs of this model when resolving labels")
+    parser.add_argument("--warehouse", type=Path, default=DEFAULT_WAREHOUSE_PATH, metavar="PATH")
+    parser.add_argument("--test-types", type=int, default=10, metavar="N",
+                        help="show the N test types with the lowest pass rate per run (default: 10)")
+    parser.add_argument("--output", type=Path, default=None, help="also write the metrics as JSON")
+    args = parser.parse_args()
+
+    if not args.warehouse.exists():
+        print(f"No results warehouse at {args.warehouse}")
+        exit(1)
+    warehouse = ResultsWarehouse(args.warehouse)
+    try:
+        run_ids = []
+        for spec in args.runs:
+            run_id = warehouse.resolve_run(spec, args.model)
+            if run_id is None:
+                print(f"No run matches {spec!r}" + (f" for {args.model}" if args.model else ""))
+                exit(1)
+            run_ids.append(run_id)
+        labels = load_labels(warehouse, run_ids)
+    finally:
+        warehouse.close()
+
+    scores = score(labels)
+    scores.print_summary(args.test_types)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump([scores.summary(run) for run in range(len(run_ids))], f, indent=2)
+        print(f"\nMetrics saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
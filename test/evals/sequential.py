@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Sequential paired test for stopping a prompt comparison early
+
+Every case that has a stored outcome from the previous iteration forms a
+pair. Only discordant pairs carry information: fixed (failed before, passes
+now) and broken (passed before, fails now). If nothing changed, each
+discordant pair is a fair coin. The test tracks the Bayes factor of "the
+coin is biased" (uniform prior on the bias) against "fair". Under "fair",
+its reciprocal is a martingale, so stopping the first time it reaches
+1 / (1 - confidence) keeps the false-decision rate below 1 - confidence
+however often it is checked. That check runs after every case.
+
+Cases must arrive in random order for this to hold. Fail-first ordering
+would put the only cases that can be "fixed" at the front.
+"""
+
+import math
+from typing import Dict, Optional
+
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_MIN_CASES = 20
+
+
+class PairedSequentialTest:
+    """Anytime-valid paired comparison of this run against a stored baseline"""
+
+    def __init__(self, baseline: Dict[str, bool], confidence: float = DEFAULT_CONFIDENCE,
+                 min_cases: int = DEFAULT_MIN_CASES):
+        # baseline: case key -> passed in the previous run
+        self.baseline = baseline
+        self.confidence = confidence
+        self.min_cases = min_cases
+        self.paired = 0
+        self.fixed = 0
+        self.broken = 0
+        self.passed_now = 0
+        self.passed_before = 0
+        self.decision: Optional[str] = None
+        self.decided_at: Optional[int] = None
+
+    def log_bayes_factor(self) -> float:
+        """log BF of a biased coin (Beta(1, 1) prior) over a fair one, for the discordant pairs"""
+        n = self.fixed + self.broken
+        log_marginal = math.lgamma(self.fixed + 1) + math.lgamma(self.broken + 1) - math.lgamma(n + 2)
+        return log_marginal + n * math.log(2)
+
+    def record(self, key: str, passed: bool) -> Optional[str]:
+        """Add one finished case; returns "better"/"worse" once the difference is decided"""
+        if self.decision or key not in self.baseline:
+            return self.decision
+        before = self.baseline[key]
+        self.paired += 1
+        self.passed_now += passed
+        self.passed_before += before
+        if passed and not before:
+            self.fixed += 1
+        elif before and not passed:
+            self.broken += 1
+        if (self.paired >= self.min_cases and self.fixed != self.broken and
+                self.log_bayes_factor() >= -math.log(1 - self.confidence)):
+            self.decision = "better" if self.fixed > self.broken else "worse"
+            self.decided_at = self.paired
+        return self.decision
+
+    def summary(self) -> Dict:
+        return {
+            "decision": self.decision,
+            "confidence": self.confidence,
+            "paired_cases": self.paired,
+            "fixed": self.fixed,
+            "broken": self.broken,
+            "pass_rate_now": round(self.passed_now / self.paired * 100, 1) if self.paired else None,
+            "pass_rate_before": round(self.passed_before / self.paired * 100, 1) if self.paired else None,
+            "bayes_factor": round(math.exp(self.log_bayes_factor()), 2),
+        }
+
+    def print_summary(self, skipped: int, cost_per_case: Optional[float]) -> None:
+        """Print the decision and what stopping early saved"""
+        stats = self.summary()
+        if not self.paired:
+            print("\nEarly stop: no cases in common with the previous iteration")
+            return
+        print(f"\nEarly stop ({self.confidence:.0%}): "
+              f"{'decided ' + self.decision if self.decision else 'not decided'} "
+              f"after {self.paired} paired cases "
+              f"({self.fixed} fixed, {self.broken} broken, Bayes factor {stats['bayes_factor']:.1f})")
+        print(f"  Pass rate on those cases: {stats['pass_rate_before']:.1f}% before, "
+              f"{stats['pass_rate_now']:.1f}% now")
+        if self.decision:
+            saved = f", ~${skipped * cost_per_case:.4f}" if cost_per_case is not None else ""
+            print(f"  Saved {skipped} cases{saved}")
+
+
+def add_early_stop_arguments(parser) -> None:
+    """Add the shared --early-stop options to an argparse parser"""
+    parser.add_argument("--early-stop", action="store_true",
+                        help="run cases in random order and stop once the pass rate is decidedly "
+                             "better or worse than the previous iteration's")
+    parser.add_argument("--early-stop-confidence", type=float, default=DEFAULT_CONFIDENCE, metavar="P",
+                        help=f"confidence required to stop (default: {DEFAULT_CONFIDENCE:g})")
+    parser.add_argument("--early-stop-min-cases", type=int, default=DEFAULT_MIN_CASES, metavar="N",
+                        help=f"paired cases to see before stopping (default: {DEFAULT_MIN_CASES})")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="random seed for the --early-stop case order")
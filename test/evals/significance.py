@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Bootstrap confidence intervals and McNemar tests for pass rates
+
+A pass rate on 61 cases moves by several points when one or two answers
+change, so a bare "+X% vs baseline" doesn't show whether a model or prompt
+is better. Outcomes are resampled by case (the bootstrap), and the
+percentile interval of the statistic is reported.
+
+Resampling whole cases only changes how often each pattern of outcomes
+occurs. For one run the patterns are passed and failed. For a paired
+comparison they are both passed, only the baseline passed, only the
+candidate passed, and both failed. So a resample is one multinomial draw
+of pattern counts. All resamples are drawn as a single array, whatever
+the number of cases, and 10k resamples take a few milliseconds.
+
+McNemar's test uses only the discordant pairs ("fixed" and "broken" cases,
+as in sequential.py). It is exact (binomial) for up to EXACT_MCNEMAR_LIMIT
+discordant pairs, and the continuity-corrected chi-square above that.
+"""
+
+import math
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+DEFAULT_RESAMPLES = 10_000
+DEFAULT_CONFIDENCE = 0.95
+EXACT_MCNEMAR_LIMIT = 10_000
+
+
+def _interval(samples: np.ndarray, confidence: float) -> Dict[str, Optional[float]]:
+    """Percentile interval of the finite samples, in percent"""
+    samples = samples[np.isfinite(samples)]
+    if not len(samples):
+        return {"low": None, "high": None}
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(samples, [tail, 100 - tail])
+    return {"low": round(float(low) * 100, 1), "high": round(float(high) * 100, 1)}
+
+
+def pass_rate_interval(outcomes: Iterable[bool], confidence: float = DEFAULT_CONFIDENCE,
+                       resamples: int = DEFAULT_RESAMPLES, seed: Optional[int] = 0) -> Dict:
+    """Pass rate of one run with its bootstrap confidence interval (percentages)"""
+    outcomes = np.fromiter(outcomes, dtype=bool)
+    cases, passed = len(outcomes), int(outcomes.sum())
+    if not cases:
+        return {"cases": 0, "pass_rate": None, "low": None, "high": None, "confidence": confidence}
+    rng = np.random.default_rng(seed)
+    samples = rng.binomial(cases, passed / cases, size=resamples) / cases
+    return {"cases": cases, "pass_rate": round(passed / cases * 100, 1), **_interval(samples, confidence),
+            "confidence": confidence}
+
+
+def mcnemar_p(fixed: int, broken: int) -> float:
+    """Two-sided McNemar p-value for `fixed` vs `broken` discordant pairs"""
+    n = fixed + broken
+    if not n:
+        return 1.0
+    if n > EXACT_MCNEMAR_LIMIT:
+        chi2 = (abs(fixed - broken) - 1) ** 2 / n
+        return math.erfc(math.sqrt(chi2 / 2))
+    # Exact: twice the binomial(n, 1/2) tail at the smaller count
+    log_half = n * math.log(0.5)
+    tail = sum(math.exp(math.lgamma(n + 1) - math.lgamma(k + 1) - math.lgamma(n - k + 1) + log_half)
+               for k in range(min(fixed, broken) + 1))
+    return min(1.0, 2 * tail)
+
+
+def compare_paired(baseline: Dict[str, bool], candidate: Dict[str, bool],
+                   confidence: float = DEFAULT_CONFIDENCE, resamples: int = DEFAULT_RESAMPLES,
+                   seed: Optional[int] = 0) -> Dict:
+    """Paired bootstrap and McNemar test of `candidate` against `baseline` (case key -> passed)
+
+    Only cases with an outcome in both are compared. "difference" is the
+    candidate's pass rate minus the baseline's, in percentage points.
+    "relative" is the change relative to the baseline's pass rate, in
+    percent, as compare_models prints it.
+    """
+    keys = [key for key in candidate if key in baseline]
+    before = np.fromiter((baseline[key] for key in keys), dtype=bool, count=len(keys))
+    after = np.fromiter((candidate[key] for key in keys), dtype=bool, count=len(keys))
+    cases = len(keys)
+    both = int((before & after).sum())
+    broken = int((before & ~after).sum())
+    fixed = int((~before & after).sum())
+    result = {"cases": cases, "fixed": fixed, "broken": broken, "confidence": confidence,
+              "mcnemar_p": round(mcnemar_p(fixed, broken), 4)}
+    if not cases:
+        return {**result, "pass_rate_baseline": None, "pass_rate": None,
+                "difference": {"estimate": None, "low": None, "high": None},
+                "relative": {"estimate": None, "low": None, "high": None}}
+
+    counts = np.array([both, broken, fixed, cases - both - broken - fixed])
+    samples = np.random.default_rng(seed).multinomial(cases, counts / cases, size=resamples)
+    rate_before = (samples[:, 0] + samples[:, 1]) / cases
+    rate_after = (samples[:, 0] + samples[:, 2]) / cases
+    with np.errstate(invalid="ignore", divide="ignore"):
+        relative = rate_after / rate_before - 1
+
+    passed_before, passed_after = both + broken, both + fixed
+    return {
+        **result,
+        "pass_rate_baseline": round(passed_before / cases * 100, 1),
+        "pass_rate": round(passed_after / cases * 100, 1),
+        "difference": {"estimate": round((fixed - broken) / cases * 100, 1),
+                       **_interval(rate_after - rate_before, confidence)},
+        "relative": {"estimate": round((passed_after / passed_before - 1) * 100, 1) if passed_before else None,
+                     **_interval(relative, confidence)},
+    }
+
+
+def format_interval(interval: Dict, unit: str = "%", signed: bool = False) -> str:
+    """`[low, high]` of an interval dict, or "" when there is none"""
+    if interval.get("low") is None:
+        return ""
+    sign = "+" if signed else ""
+    return f"[{interval['low']:{sign}.1f}{unit}, {interval['high']:{sign}.1f}{unit}]"
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Streaming (SSE) Responses API consumption with latency metrics
+
+Mirrors SseParser in lib/utils/sse_parser.dart and the event handling of
+OpenAiService.streamChatResponse: output_text deltas are accumulated until
+response.completed. Each request records time to first token, the gaps
+between deltas and total time. The partial output is checked against the
+entry JSON schema as it arrives, so a response that can no longer be valid
+is aborted instead of being read to the end.
+"""
+
+import json
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import httpx
+
+from http_client import AsyncEvalHttpClient
+
+
+@dataclass
+class SseEvent:
+    type: str
+    data: str
+
+    @property
+    def json_data(self) -> Optional[Dict]:
+        try:
+            return json.loads(self.data)
+        except ValueError:
+            return None
+
+
+class SseParser:
+    """Incremental Server-Sent Events parser; feed() returns the events completed by a chunk"""
+
+    def __init__(self):
+        self._buffer = ""
+        self._event_type: Optional[str] = None
+        self._data_lines: List[str] = []
+
+    def feed(self, chunk: str) -> List[SseEvent]:
+        self._buffer += chunk
+        lines = self._buffer.split("\n")
+        # Keep a trailing partial line for the next chunk
+        self._buffer = lines.pop()
+        events = []
+        for line in lines:
+            event = self._process_line(line)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def close(self) -> List[SseEvent]:
+        """Flush a final event that wasn't followed by a blank line"""
+        events = self.feed("\n") if self._buffer else []
+        event = self._dispatch()
+        return events + ([event] if event is not None else [])
+
+    def _process_line(self, line: str) -> Optional[SseEvent]:
+        if line.endswith("\r"):
+            line = line[:-1]
+        # Empty line ends the event
+        if not line:
+            return self._dispatch()
+        if line.startswith(":"):
+            return None
+        name, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if name == "event":
+            self._event_type = value
+        elif name == "data":
+            self._data_lines.append(value)
+        return None
+
+    def _dispatch(self) -> Optional[SseEvent]:
+        if not self._data_lines:
+            self._event_type = None
+            return None
+        event = SseEvent(self._event_type or "message", "\n".join(self._data_lines))
+        self._event_type = None
+        self._data_lines = []
+        return event
+
+
+class SchemaViolation(Exception):
+    pass
+
+
+class StreamingSchemaValidator:
+    """Checks partial JSON text against a (strict) JSON schema one character at a time
+
+    Handles the subset used by the entry schema: objects with properties,
+    required and additionalProperties false, arrays with items, and scalar
+    types. feed() returns the first violation found, or None while the text
+    can still turn into a valid document.
+    """
+
+    _LITERAL_CHARS = set("truefalsn0123456789+-.eE")
+
+    def __init__(self, schema: Dict):
+        self.schema = schema
+        self.violation: Optional[str] = None
+        # Frames: {"kind": "object"|"array", "schema", "state", "key", "seen"}
+        self._stack: List[Dict] = []
+        self._done = False
+        self._in_string = False
+        self._escape = False
+        self._string = ""
+        self._string_is_key = False
+        self._literal = ""
+        self._literal_schema: Optional[Dict] = None
+
+    def feed(self, text: str) -> Optional[str]:
+        if self.violation is None:
+            try:
+                for char in text:
+                    self._char(char)
+            except SchemaViolation as e:
+                self.violation = str(e)
+        return self.violation
+
+    def _expected_schema(self) -> Optional[Dict]:
+        """Schema of the value about to start at the current position"""
+        if not self._stack:
+            return self.schema
+        frame = self._stack[-1]
+        if frame["kind"] == "array":
+            return frame["schema"].get("items", {})
+        return frame["schema"].get("properties", {}).get(frame["key"], {})
+
+    @staticmethod
+    def _check_type(schema: Dict, actual: str) -> None:
+        expected = schema.get("type")
+        if expected is None:
+            return
+        allowed = expected if isinstance(expected, list) else [expected]
+        if actual == "integer":
+            actual_types = {"integer", "number"}
+        else:
+            actual_types = {actual}
+        if not actual_types & set(allowed):
+            raise SchemaViolation(f"expected {expected}, got {actual}")
+
+    def _start_value(self, char: str) -> None:
+        schema = self._expected_schema()
+        if char == "{":
+            self._check_type(schema, "object")
+            self._stack.append({"kind": "object", "schema": schema, "state": "key_or_end",
+                                "key": None, "seen": set()})
+        elif char == "[":
+            self._check_type(schema, "array")
+            self._stack.append({"kind": "array", "schema": schema, "state": "value_or_end"})
+        elif char == '"':
+            self._check_type(schema, "string")
+            self._in_string = True
+            self._string_is_key = False
+            self._string = ""
+        elif char in self._LITERAL_CHARS:
+            # The first character already tells boolean, null and number apart
+            self._check_type(schema, {"t": "boolean", "f": "boolean", "n": "null"}.get(char, "integer"))
+            self._literal = char
+            self._literal_schema = schema
+        else:
+            raise SchemaViolation(f"unexpected {char!r} where a value should start")
+
+    def _value_done(self) -> None:
+        if not self._stack:
+            self._done = True
+            return
+        frame = self._stack[-1]
+        frame["state"] = "comma_or_end"
+
+    def _finish_literal(self) -> None:
+        literal, self._literal = self._literal, ""
+        if literal in ("true", "false"):
+            self._check_type(self._literal_schema, "boolean")
+        elif literal == "null":
+            self._check_type(self._literal_schema, "null")
+        else:
+            try:
+                number = float(literal)
+            except ValueError:
+                raise SchemaViolation(f"invalid literal {literal!r}")
+            self._check_type(self._literal_schema, "integer" if number.is_integer() and "." not in literal
+                             else "number")
+        self._value_done()
+
+    def _close_object(self, frame: Dict) -> None:
+        missing = [key for key in frame["schema"].get("required", []) if key not in frame["seen"]]
+        if missing:
+            raise SchemaViolation(f"object closed without required {missing}")
+
+    def _char(self, char: str) -> None:
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                if self._string_is_key:
+                    self._key_done(self._string)
+                else:
+                    self._value_done()
+                return
+            if self._string_is_key:
+                self._string += char
+            return
+
+        if self._literal:
+            if char in self._LITERAL_CHARS:
+                self._literal += char
+                if self._literal[0].isalpha() and not any(
+                        word.startswith(self._literal) for word in ("true", "false", "null")):
+                    raise SchemaViolation(f"invalid literal {self._literal!r}")
+                return
+            self._finish_literal()
+
+        if char in " \t\r\n":
+            return
+        if self._done:
+            raise SchemaViolation(f"unexpected {char!r} after the top-level value")
+        if not self._stack:
+            self._start_value(char)
+            return
+
+        frame = self._stack[-1]
+        state = frame["state"]
+        if frame["kind"] == "object":
+            if state in ("key_or_end", "key") and char == '"':
+                self._in_string = True
+                self._string_is_key = True
+                self._string = ""
+            elif state == "key_or_end" and char == "}":
+                self._close_object(frame)
+                self._stack.pop()
+                self._value_done()
+            elif state == "colon" and char == ":":
+                frame["state"] = "value"
+            elif state == "value":
+                self._start_value(char)
+            elif state == "comma_or_end" and char == ",":
+                frame["state"] = "key"
+            elif state == "comma_or_end" and char == "}":
+                self._close_object(frame)
+                self._stack.pop()
+                self._value_done()
+            else:
+                raise SchemaViolation(f"unexpected {char!r} in object")
+        else:
+            if state == "value_or_end" and char == "]":
+                self._stack.pop()
+                self._value_done()
+            elif state in ("value_or_end", "value"):
+                self._start_value(char)
+            elif state == "comma_or_end" and char == ",":
+                frame["state"] = "value"
+            elif state == "comma_or_end" and char == "]":
+                self._stack.pop()
+                self._value_done()
+            else:
+                raise SchemaViolation(f"unexpected {char!r} in array")
+
+    def _key_done(self, key: str) -> None:
+        frame = self._stack[-1]
+        schema = frame["schema"]
+        properties = schema.get("properties", {})
+        if schema.get("additionalProperties") is False and key not in properties:
+            raise SchemaViolation(f"unexpected property {key!r}")
+        frame["key"] = key
+        frame["seen"].add(key)
+        frame["state"] = "colon"
+
+
+@dataclass
+class StreamResult:
+    """Outcome of one streamed request"""
+    status_code: int
+    response: Optional[Dict] = None
+    text: str = ""
+    error: Optional[str] = None
+    aborted: Optional[str] = None
+    headers: Dict[str, str] = field(default_factory=dict)
+    ttft: Optional[float] = None
+    total: float = 0.0
+    gaps: List[float] = field(default_factory=list)
+
+    def timing(self) -> Dict:
+        """Per-case timing summary kept in the results"""
+        return {
+            "ttft": round(self.ttft, 4) if self.ttft is not None else None,
+            "total": round(self.total, 4),
+            "deltas": len(self.gaps) + (1 if self.ttft is not None else 0),
+            "mean_gap": round(sum(self.gaps) / len(self.gaps), 4) if self.gaps else None,
+            "max_gap": round(max(self.gaps), 4) if self.gaps else None,
+        }
+
+
+async def stream_response(client: AsyncEvalHttpClient, body: Dict,
+                          validator: Optional[StreamingSchemaValidator] = None,
+                          timeout=httpx.USE_CLIENT_DEFAULT) -> StreamResult:
+    """POST a Responses API request with stream=true and consume its events
+
+    The request is abandoned (and the connection closed) as soon as the
+    validator reports a schema violation. A connection dropped after the
+    response started is a stream error, not an exception, so a retry policy
+    only ever repeats requests that produced no events.
+    """
+    start = time.perf_counter()
+    parser = SseParser()
+    text_parts: List[str] = []
+    last_delta: Optional[float] = None
+
+    async with client.stream("POST", "/responses", json={**body, "stream": True}, timeout=timeout) as response:
+        result = StreamResult(status_code=response.status_code, headers=dict(response.headers))
+        if response.status_code != 200:
+            await response.aread()
+            result.error = f"API Error {response.status_code}: {response.text[:200]}"
+            result.total = time.perf_counter() - start
+            return result
+
+        try:
+            async for chunk in response.aiter_text():
+                for event in parser.feed(chunk):
+                    data = event.json_data or {}
+                    event_type = data.get("type", event.type)
+                    if event_type == "response.output_text.delta":
+                        now = time.perf_counter()
+                        if last_delta is None:
+                            result.ttft = now - start
+                        else:
+                            result.gaps.append(now - last_delta)
+                        last_delta = now
+                        delta = data.get("delta", "")
+                        text_parts.append(delta)
+                        if validator is not None and validator.feed(delta):
+                            result.aborted = validator.violation
+                            result.text = "".join(text_parts)
+                            result.total = time.perf_counter() - start
+                            return result
+                    elif event_type == "response.completed":
+                        result.response = data.get("response")
+                    elif event_type in ("response.failed", "error"):
+                        error = data.get("error") or (data.get("response") or {}).get("error") or {}
+                        result.error = (error.get("message", "Stream failed") if isinstance(error, dict)
+                                        else str(error))
+        except httpx.TimeoutException:
+            raise
+        except httpx.TransportError as e:
+            result.error = f"Stream interrupted: {type(e).__name__}: {e}"
+
+    result.text = "".join(text_parts)
+    result.total = time.perf_counter() - start
+    if result.response is None and result.error is None:
+        result.error = "Stream ended without response.completed"
+    return result
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile, q in [0, 100]"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize_timings(timings: List[Dict]) -> Dict:
+    """Run-level TTFT, inter-token gap and total time statistics from per-case timing()"""
+    ttfts = [t["ttft"] for t in timings if t.get("ttft") is not None]
+    totals = [t["total"] for t in timings if t.get("total") is not None]
+    gaps = [t["mean_gap"] for t in timings if t.get("mean_gap") is not None]
+    max_gaps = [t["max_gap"] for t in timings if t.get("max_gap") is not None]
+
+    def stats(values):
+        if not values:
+            return None
+        return {
+            "mean": round(sum(values) / len(values), 4),
+            "p50": round(percentile(values, 50), 4),
+            "p90": round(percentile(values, 90), 4),
+            "p99": round(percentile(values, 99), 4),
+        }
+
+    return {
+        "cases": len(timings),
+        "ttft": stats(ttfts),
+        "mean_inter_token_gap": stats(gaps),
+        "max_inter_token_gap": stats(max_gaps),
+        "total": stats(totals),
+    }
+
+
+def print_timing_summary(summary: Dict) -> None:
+    """Print the streaming latency table for the run summary"""
+    print(f"\nStreaming latency ({summary['cases']} cases):")
+    for label, key in (("Time to first token", "ttft"), ("Mean inter-token gap", "mean_inter_token_gap"),
+                       ("Max inter-token gap", "max_inter_token_gap"), ("Total time", "total")):
+        stats = summary.get(key)
+        if stats:
+            print(f"  {label:21} p50 {stats['p50']*1000:7.0f} ms | p90 {stats['p90']*1000:7.0f} ms | "
+                  f"p99 {stats['p99']*1000:7.0f} ms")
+
+
+def add_streaming_arguments(parser) -> None:
+    """Add the shared --stream option to an argparse parser"""
+    parser.add_argument("--stream", action="store_true",
+                        help="stream responses (SSE) to measure time to first token and abort "
+                             "outputs that break the entry schema; cached responses are not read")
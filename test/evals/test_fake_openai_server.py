@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Smoke tests: the eval HTTP stack against fake_openai_server.py
+
+Each test starts the fake server on a free port and points
+OPENAI_BASE_URL at it, so nothing leaves the machine.
+
+Usage:
+    python -m pytest -q test/evals/test_fake_openai_server.py
+"""
+
+import asyncio
+
+import pytest
+
+import http_client
+from fake_openai_server import start_server
+from http_client import AsyncEvalHttpClient
+from providers import ENTRY_SCHEMA, build_request_body, extract_entries
+from retry import RetryPolicy, attempts_of
+from streaming import StreamingSchemaValidator, stream_response
+
+MODEL = "gpt-5-mini"
+INPUTS = [
+    "Need to pay the electricity bill by Friday",
+    "Remind me to call mom about dinner",
+    "Dentist appointment next Tuesday at 3pm",
+    "Finish the quarterly report for the client meeting",
+    "Bought groceries for the week",
+    "Must renew my gym membership",
+]
+
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    """Start a fake server with the given options; yields a factory returning a client for it"""
+    servers = []
+
+    def start(**options) -> AsyncEvalHttpClient:
+        server, _ = start_server(port=0, delta_delay=0.0, **options)
+        servers.append(server)
+        base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+        monkeypatch.setenv("OPENAI_BASE_URL", base_url)
+        # http_client reads OPENAI_BASE_URL once, at import
+        monkeypatch.setattr(http_client, "BASE_URL", base_url)
+        return AsyncEvalHttpClient(api_key="sk-test")
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_injected_429s_are_retried_until_they_succeed(fake_api):
+    client = fake_api(error_rate=0.5, error_statuses=[429], retry_after=0.01, seed=1)
+    retries = RetryPolicy(max_retries=10, base_delay=0.01, min_budget=100)  # no per-run cap here
+
+    async def send_all():
+        async def send_one(input_text):
+            body = build_request_body(MODEL, "Extract entries", input_text)
+            return await retries.run(lambda: client.post("/responses", json=body))
+        return await asyncio.gather(*(send_one(text) for text in INPUTS))
+
+    responses = asyncio.run(send_all())
+
+    assert [response.status_code for response in responses] == [200] * len(INPUTS)
+    assert retries.retries_by_cause.get("429", 0) > 0
+    assert retries.recovered > 0
+    assert max(attempts_of(response) for response in responses) > 1
+
+
+def test_responses_stream_yields_deltas_then_completed(fake_api):
+    client = fake_api()
+    body = build_request_body(MODEL, "Extract entries", INPUTS[0])
+
+    result = asyncio.run(stream_response(client, body, StreamingSchemaValidator(ENTRY_SCHEMA)))
+
+    assert result.status_code == 200
+    assert result.error is None and result.aborted is None
+    assert result.ttft is not None and result.gaps
+    assert result.response["status"] == "completed"
+    assert extract_entries(result.response)
+    assert result.text
+
+
+def test_stream_failing_before_its_first_event_is_retried(fake_api):
+    client = fake_api(error_rate=0.5, error_statuses=[503], retry_after=0.01, seed=1)
+    retries = RetryPolicy(max_retries=10, base_delay=0.01, min_budget=100)  # no per-run cap here
+
+    async def stream_all():
+        async def stream_one(input_text):
+            body = build_request_body(MODEL, "Extract entries", input_text)
+
+            def attempt():
+                return stream_response(client, body, StreamingSchemaValidator(ENTRY_SCHEMA))
+            return await retries.run(attempt)
+        return await asyncio.gather(*(stream_one(text) for text in INPUTS))
+
+    results = asyncio.run(stream_all())
+
+    assert all(result.response and result.response["status"] == "completed" for result in results)
+    assert retries.retries_by_cause.get("503", 0) > 0
+    assert max(attempts_of(result) for result in results) > 1
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Per-model request timeouts derived from past latencies
+
+Completed request latencies are kept per model (with the input length that
+produced them and, when usage is known, the request's cost) in a JSON file
+that persists across runs. A model's timeout is a high quantile of its
+history plus a fixed margin, stretched for inputs longer than the model's
+typical input, and clamped to a sane range. Until a model has enough history
+the runner's old fixed value is used. Timeouts are counted per model so they
+can be reported apart from other errors. The same history gives the mean
+latency and cost per request that budgeted runs plan with.
+"""
+
+import json
+import os
+import statistics
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from pricing import cost_usd
+from streaming import percentile
+
+DEFAULT_HISTORY_PATH = Path(__file__).parent / ".cache" / "latency_history.json"
+DEFAULT_QUANTILE = 99.0
+DEFAULT_MARGIN = 5.0
+DEFAULT_MIN_SAMPLES = 30
+DEFAULT_WINDOW = 2000
+MIN_TIMEOUT = 5.0
+MAX_TIMEOUT = 300.0
+MAX_LENGTH_SCALE = 4.0
+
+
+class TimeoutPolicy:
+    """Timeouts from a persisted per-model latency history"""
+
+    def __init__(self, path: Path = DEFAULT_HISTORY_PATH, default: float = 60.0,
+                 quantile: float = DEFAULT_QUANTILE, margin: float = DEFAULT_MARGIN,
+                 fixed: Optional[float] = None, min_samples: int = DEFAULT_MIN_SAMPLES,
+                 window: int = DEFAULT_WINDOW):
+        # fixed overrides the history with one timeout for every request
+        self.path = Path(path)
+        self.default = default
+        self.quantile = quantile
+        self.margin = margin
+        self.fixed = fixed
+        self.min_samples = min_samples
+        self.window = window
+        # Samples are [seconds, input chars, cost in USD or None]
+        self.history: Dict[str, List[List]] = self._load()
+        self.new_samples: Dict[str, List[List]] = {}
+        self.timeouts: Dict[str, int] = {}
+        self._models_used: Dict[str, None] = {}
+        self._bases: Dict[str, Optional[Tuple[float, float]]] = {}
+
+    @classmethod
+    def from_args(cls, args, default: float = 60.0) -> "TimeoutPolicy":
+        """Policy for the --timeout* options; `default` is used until a model has history"""
+        return cls(args.latency_history or DEFAULT_HISTORY_PATH, default=default,
+                   quantile=args.timeout_quantile, margin=args.timeout_margin, fixed=args.timeout)
+
+    def _load(self) -> Dict[str, List[List]]:
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f).get("models", {})
+        except (OSError, ValueError):
+            print(f"⚠️  Could not read latency history {self.path}; starting fresh")
+            return {}
+
+    def _base(self, model: str) -> Optional[Tuple[float, float]]:
+        """(quantile latency, median input length) for `model`, or None without enough history"""
+        if model not in self._bases:
+            samples = self.history.get(model, [])
+            if len(samples) < self.min_samples:
+                self._bases[model] = None
+            else:
+                latencies = [sample[0] for sample in samples]
+                self._bases[model] = (percentile(latencies, self.quantile),
+                                      max(1.0, statistics.median(sample[1] for sample in samples)))
+        return self._bases[model]
+
+    def timeout(self, model: str, input_text: str = "") -> float:
+        """Seconds to allow one request to `model` with this input"""
+        self._models_used[model] = None
+        if self.fixed is not None:
+            return self.fixed
+        base = self._base(model)
+        if base is None:
+            return self.default
+        latency, typical_chars = base
+        scale = min(MAX_LENGTH_SCALE, max(1.0, len(input_text) / typical_chars))
+        return min(MAX_TIMEOUT, max(MIN_TIMEOUT, (latency + self.margin) * scale))
+
+    def record(self, model: str, input_text: str, seconds: float, usage: Optional[Dict] = None) -> None:
+        """Add the latency (and cost, from `usage`) of one completed request, not cached or timed out"""
+        cost = cost_usd(model, usage)
+        self.new_samples.setdefault(model, []).append(
+            [round(seconds, 3), len(input_text), round(cost, 8) if cost is not None else None])
+
+    def record_timeout(self, model: str) -> None:
+        self.timeouts[model] = self.timeouts.get(model, 0) + 1
+
+    def _samples(self, model: str) -> List[List]:
+        return self.history.get(model, []) + self.new_samples.get(model, [])
+
+    def mean_latency(self, model: str) -> Optional[float]:
+        """Mean seconds per request to `model` over its history, or None without any"""
+        latencies = [sample[0] for sample in self._samples(model)]
+        return statistics.fmean(latencies) if latencies else None
+
+    def mean_cost(self, model: str) -> Optional[float]:
+        """Mean USD per request to `model` over the samples that recorded a cost"""
+        costs = [sample[2] for sample in self._samples(model) if len(sample) > 2 and sample[2] is not None]
+        return statistics.fmean(costs) if costs else None
+
+    def save(self) -> None:
+        """Merge this run's samples into the history file, keeping the newest `window` per model"""
+        if not any(self.new_samples.values()):
+            return
+        # Re-read so runs that finished since we loaded aren't overwritten
+        merged = self._load()
+        for model, samples in self.new_samples.items():
+            merged[model] = (merged.get(model, []) + samples)[-self.window:]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"models": merged}, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+        self.history = merged
+        self.new_samples = {}
+        self._bases = {}
+
+    def summary(self) -> Dict:
+        models = sorted(self._models_used)
+        return {
+            model: {
+                "timeout_seconds": round(self.timeout(model), 1),
+                "history_samples": len(self.history.get(model, [])),
+                "new_samples": len(self.new_samples.get(model, [])),
+                "timeouts": self.timeouts.get(model, 0),
+            }
+            for model in models
+        }
+
+    def print_summary(self) -> None:
+        """Print each model's base timeout and how many requests hit it"""
+        stats = self.summary()
+        if not stats:
+            return
+        source = "fixed" if self.fixed is not None else f"p{self.quantile:g} + {self.margin:g}s"
+        print(f"\nTimeouts ({source}):")
+        for model, model_stats in stats.items():
+            print(f"  {model}: {model_stats['timeout_seconds']:.1f}s base, "
+                  f"{model_stats['timeouts']} timed out "
+                  f"({model_stats['history_samples']} past latencies, {model_stats['new_samples']} new)")
+
+
+def add_timeout_arguments(parser) -> None:
+    """Add the shared --timeout* options to an argparse parser"""
+    parser.add_argument("--timeout", type=float, default=None, metavar="SECONDS",
+                        help="fixed per-request timeout instead of one derived from latency history")
+    parser.add_argument("--timeout-quantile", type=float, default=DEFAULT_QUANTILE, metavar="Q",
+                        help=f"latency percentile the timeout is based on (default: {DEFAULT_QUANTILE:g})")
+    parser.add_argument("--timeout-margin", type=float, default=DEFAULT_MARGIN, metavar="SECONDS",
+                        help=f"seconds added to that percentile (default: {DEFAULT_MARGIN:g})")
+    parser.add_argument("--latency-history", type=Path, default=None, metavar="PATH",
+                        help=f"per-model latency history file (default: {DEFAULT_HISTORY_PATH})")
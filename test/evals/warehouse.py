@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+SQLite warehouse of per-case eval results
+
+Each runner writes its own results JSON, in its own shape, and those files
+only keep the failures. So a question like "which cases regressed between
+two runs of gpt-5-mini" meant diffing failure lists by input text. The
+warehouse keeps every case of every run in one SQLite file, opened in WAL
+mode so queries can run while a runner is writing. It has five tables:
+- runs: label, script, model, prompt hash, dataset version and summary
+- cases: the dataset items, keyed by the checkpoint case hash
+- outputs: what the model returned
+- timings: latency, tokens, cost and attempts
+- grades: passed/failed/error/timeout and the mismatch details
+
+The per-case tables carry (run_id, case_id, model, prompt_hash) and are
+indexed on them. Runners buffer rows and write them in batched transactions
+as cases finish, so a crashed run still leaves its finished cases behind.
+A run that only covered part of the dataset (a filter, a budget subset
+or an early stop) is marked partial when it finishes; --fail-first takes
+its history from the finished, complete runs, and --early-stop falls back
+on a run's grades when there is no journal. The results JSON files are
+still written for the scripts that summarize them.
+
+    python warehouse.py runs --model gpt-5-mini
+    python warehouse.py regressions iteration_6 iteration_7 --model gpt-4.1
+"""
+
+import argparse
+import json
+import socket
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from checkpoint import case_hash
+from pricing import cost_usd, token_counts
+
+DEFAULT_WAREHOUSE_PATH = Path(__file__).parent / "results.sqlite3"
+DEFAULT_BATCH_SIZE = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    label TEXT NOT NULL,
+    script TEXT,
+    model TEXT NOT NULL,
+    prompt_hash TEXT,
+    dataset_version TEXT,
+    host TEXT,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    cases INTEGER,
+    passed INTEGER,
+    config TEXT,
+    summary TEXT,
+    partial INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_label_model ON runs (label, model);
+CREATE INDEX IF NOT EXISTS runs_model_prompt ON runs (model, prompt_hash);
+
+CREATE TABLE IF NOT EXISTS cases (
+    case_id TEXT PRIMARY KEY,
+    input_text TEXT NOT NULL,
+    test_type TEXT,
+    expected TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS outputs (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    case_id TEXT NOT NULL REFERENCES cases (case_id),
+    model TEXT NOT NULL,
+    prompt_hash TEXT,
+    output TEXT,
+    error TEXT,
+    PRIMARY KEY (run_id, case_id)
+);
+
+CREATE TABLE IF NOT EXISTS timings (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    case_id TEXT NOT NULL REFERENCES cases (case_id),
+    model TEXT NOT NULL,
+    prompt_hash TEXT,
+    seconds REAL,
+    ttft REAL,
+    cached INTEGER,
+    attempts INTEGER,
+    input_tokens INTEGER,
+    output_tokens INTEGER,
+    cost_usd REAL,
+    PRIMARY KEY (run_id, case_id)
+);
+
+CREATE TABLE IF NOT EXISTS grades (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    case_id TEXT NOT NULL REFERENCES cases (case_id),
+    model TEXT NOT NULL,
+    prompt_hash TEXT,
+    status TEXT NOT NULL,
+    passed INTEGER,
+    detail TEXT,
+    PRIMARY KEY (run_id, case_id)
+);
+"""
+
+PER_CASE_TABLES = ("outputs", "timings", "grades")
+RUN_COLUMNS = ("run_id", "label", "model", "prompt_hash", "dataset_version", "started_at", "finished_at", "cases",
+               "passed")
+
+
+class ResultsWarehouse:
+    """Runs and per-case outputs, timings and grades in one WAL-mode SQLite file"""
+
+    def __init__(self, path: Path = DEFAULT_WAREHOUSE_PATH, enabled: bool = True,
+                 batch_size: int = DEFAULT_BATCH_SIZE):
+        self.path = Path(path)
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.rows_written = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._runs: Dict[int, Tuple[str, Optional[str]]] = {}  # run_id -> (model, prompt_hash)
+        self._pending: Dict[str, List[Tuple]] = {table: [] for table in ("cases",) + PER_CASE_TABLES}
+        self._buffered = 0
+        if enabled:
+            self._open()
+
+    @classmethod
+    def from_args(cls, args) -> "ResultsWarehouse":
+        return cls(path=args.warehouse or DEFAULT_WAREHOUSE_PATH, enabled=not args.no_warehouse)
+
+    def _open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Several runners may write at once; wait for the lock rather than fail
+        self._db = sqlite3.connect(self.path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        # Warehouses from before dataset versions were recorded
+        if "dataset_version" not in {row[1] for row in self._db.execute("PRAGMA table_info(runs)")}:
+            self._db.execute("ALTER TABLE runs ADD COLUMN dataset_version TEXT")
+        # ... and before partial runs were marked
+        if "partial" not in {row[1] for row in self._db.execute("PRAGMA table_info(runs)")}:
+            self._db.execute("ALTER TABLE runs ADD COLUMN partial INTEGER")
+        for table in PER_CASE_TABLES:
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS {table}_run_case_model_prompt "
+                             f"ON {table} (run_id, case_id, model, prompt_hash)")
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS {table}_model_prompt_case "
+                             f"ON {table} (model, prompt_hash, case_id)")
+        self._db.commit()
+
+    # Writing
+
+    def start_run(self, label: str, model: str, prompt_hash: Optional[str] = None,
+                  script: Optional[str] = None, config: Optional[Dict] = None,
+                  dataset_version: Optional[str] = None) -> Optional[int]:
+        """Register a run and return its id (None when the warehouse is disabled)
+
+        `dataset_version` is dataset.dataset_version of the cases the run
+        was given.
+        """
+        if not self.enabled:
+            return None
+        with self._db:
+            cursor = self._db.execute(
+                "INSERT INTO runs (label, script, model, prompt_hash, dataset_version, host, started_at, config) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (label, script, model, prompt_hash, dataset_version, socket.gethostname(),
+                 datetime.now().isoformat(), json.dumps(config) if config is not None else None)
+            )
+        self._runs[cursor.lastrowid] = (model, prompt_hash)
+        return cursor.lastrowid
+
+    def record(self, run_id: Optional[int], item: Dict, status: str, output=None, error: Optional[str] = None,
+               timing: Optional[Dict] = None, usage: Optional[Dict] = None, attempts: Optional[int] = None,
+               detail: Optional[Dict] = None) -> None:
+        """Buffer one case's output, timing and grade; written once batch_size rows are waiting
+
+        `status` is passed, failed, error or timeout. `timing` may hold
+        seconds (or total), ttft, cached, input_tokens, output_tokens and
+        cost_usd; tokens and cost are otherwise worked out from `usage`.
+        """
+        if not self.enabled or run_id is None:
+            return
+        model, prompt_hash = self._runs[run_id]
+        case_id = case_hash(item)
+        timing = timing or {}
+        seconds = timing.get("seconds") if timing.get("seconds") is not None else timing.get("total")
+        input_tokens, output_tokens = token_counts(usage)
+        cost = timing.get("cost_usd")
+        if cost is None and usage:
+            cost = cost_usd(model, usage)
+        self._pending["cases"].append((case_id, item.get("input_text", ""), item.get("test_type"),
+                                       json.dumps(item.get("expected_entries", []))))
+        self._pending["outputs"].append((run_id, case_id, model, prompt_hash,
+                                         json.dumps(output) if output is not None else None, error))
+        self._pending["timings"].append((
+            run_id, case_id, model, prompt_hash, seconds, timing.get("ttft"),
+            int(timing["cached"]) if timing.get("cached") is not None else None, attempts,
+            timing.get("input_tokens", input_tokens if usage else None),
+            timing.get("output_tokens", output_tokens if usage else None), cost,
+        ))
+        passed = {"passed": 1, "failed": 0}.get(status)
+        self._pending["grades"].append((run_id, case_id, model, prompt_hash, status, passed,
+                                        json.dumps(detail) if detail else None))
+        self._buffered += 1
+        if self._buffered >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered rows in one transaction"""
+        if not self.enabled or not self._buffered:
+            return
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO cases VALUES (?, ?, ?, ?)", self._pending["cases"])
+            self._db.executemany("INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?, ?)",
+                                 self._pending["outputs"])
+            self._db.executemany("INSERT OR REPLACE INTO timings VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                 self._pending["timings"])
+            self._db.executemany("INSERT OR REPLACE INTO grades VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                 self._pending["grades"])
+        self.rows_written += self._buffered
+        self._buffered = 0
+        for rows in self._pending.values():
+            rows.clear()
+
+    def finish_run(self, run_id: Optional[int], summary: Optional[Dict] = None, partial: bool = False) -> None:
+        """Flush the run's remaining rows and store its counts and summary
+
+        `partial` marks a run that left dataset cases out on purpose.
+        """
+        if not self.enabled or run_id is None:
+            return
+        self.flush()
+        cases, passed = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(passed), 0) FROM grades WHERE run_id = ?", (run_id,)).fetchone()
+        with self._db:
+            self._db.execute(
+                "UPDATE runs SET finished_at = ?, cases = ?, passed = ?, summary = ?, partial = ? WHERE run_id = ?",
+                (datetime.now().isoformat(), cases, passed,
+                 json.dumps(summary, default=str) if summary is not None else None, int(partial), run_id)
+            )
+
+    # Queries
+
+    def runs(self, model: Optional[str] = None, label: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """Most recent runs first"""
+        query = (f"SELECT {', '.join(RUN_COLUMNS)} "
+                 "FROM runs WHERE (? IS NULL OR model = ?) AND (? IS NULL OR label = ?) "
+                 "ORDER BY run_id DESC LIMIT ?")
+        rows = self._db.execute(query, (model, model, label, label, limit)).fetchall()
+        return [dict(zip(RUN_COLUMNS, row)) for row in rows]
+
+    def run(self, run_id: int) -> Optional[Dict]:
+        """Metadata of one run"""
+        row = self._db.execute(f"SELECT {', '.join(RUN_COLUMNS)} "
+                               "FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return dict(zip(RUN_COLUMNS, row)) if row else None
+
+    def case_outcomes(self, run_ids: List[int]) -> List[Tuple[int, str, Optional[str], str, Optional[str], str]]:
+        """(run_id, case_id, test_type, expected JSON, output JSON, status) for every case of these runs"""
+        marks = ", ".join("?" * len(run_ids))
+        return self._db.execute(f"""
+            SELECT g.run_id, g.case_id, c.test_type, c.expected, o.output, g.status
+            FROM grades g
+            JOIN cases c ON c.case_id = g.case_id
+            LEFT JOIN outputs o ON o.run_id = g.run_id AND o.case_id = g.case_id
+            WHERE g.run_id IN ({marks})
+        """, list(run_ids)).fetchall()
+
+    def resolve_run(self, spec: str, model: Optional[str] = None) -> Optional[int]:
+        """Run id for `spec`: a run id, or the latest run with that label or prompt hash prefix"""
+        if spec.isdigit():
+            return int(spec) if self.run(int(spec)) else None
+        row = self._db.execute(
+            "SELECT run_id FROM runs WHERE (label = ? OR prompt_hash LIKE ? || '%') AND (? IS NULL OR model = ?) "
+            "ORDER BY run_id DESC LIMIT 1", (spec, spec, model, model)).fetchone()
+        return row[0] if row else None
+
+    def graded_outputs(self, model: str, prompt_hash: Optional[str], script: str) -> List[Tuple]:
+        """(run_id, input_text, case_id, output JSON, passed, seconds, cost_usd, cached) of every passed or
+        failed case this script recorded for the model and prompt, oldest run first"""
+        return self._db.execute("""
+            SELECT o.run_id, c.input_text, o.case_id, o.output, g.passed, t.seconds, t.cost_usd, t.cached
+            FROM outputs o
+            JOIN runs r ON r.run_id = o.run_id
+            JOIN cases c ON c.case_id = o.case_id
+            JOIN grades g ON g.run_id = o.run_id AND g.case_id = o.case_id
+            LEFT JOIN timings t ON t.run_id = o.run_id AND t.case_id = o.case_id
+            WHERE o.model = ? AND o.prompt_hash IS ? AND r.script = ? AND g.status IN ('passed', 'failed')
+            ORDER BY o.run_id
+        """, (model, prompt_hash, script)).fetchall()
+
+    def outcome_history(self, model: str, script: Optional[str] = None,
+                        run_ids: Optional[List[int]] = None) -> List[Tuple[int, str, int]]:
+        """(run_id, input_text, passed) of every passed or failed case in the model's finished,
+        complete runs (of `script`, or only `run_ids`), oldest run first"""
+        if run_ids is not None:
+            scope, params = f"r.run_id IN ({', '.join('?' * len(run_ids))})", list(run_ids)
+        else:
+            scope, params = "(? IS NULL OR r.script = ?)", [script, script]
+        return self._db.execute(f"""
+            SELECT g.run_id, c.input_text, g.passed
+            FROM grades g
+            JOIN runs r ON r.run_id = g.run_id
+            JOIN cases c ON c.case_id = g.case_id
+            WHERE r.model = ? AND r.finished_at IS NOT NULL AND NOT COALESCE(r.partial, 0)
+              AND g.status IN ('passed', 'failed') AND {scope}
+            ORDER BY g.run_id
+        """, [model] + params).fetchall()
+
+    def graded_inputs(self, script: Optional[str] = None, model: Optional[str] = None) -> List[Tuple]:
+        """(script, model, prompt_hash, input_text, case_id, last started_at) of every passed or failed case"""
+        return self._db.execute("""
+            SELECT r.script, o.model, o.prompt_hash, c.input_text, o.case_id, MAX(r.started_at)
+            FROM outputs o
+            JOIN runs r ON r.run_id = o.run_id
+            JOIN cases c ON c.case_id = o.case_id
+            JOIN grades g ON g.run_id = o.run_id AND g.case_id = o.case_id
+            WHERE g.status IN ('passed', 'failed') AND (? IS NULL OR r.script = ?) AND (? IS NULL OR o.model = ?)
+            GROUP BY r.script, o.model, o.prompt_hash, c.input_text, o.case_id
+        """, (script, script, model, model)).fetchall()
+
+    def changes(self, before: int, after: int, fixed: bool = False) -> List[Dict]:
+        """Cases that passed in `before` and failed in `after` (or the reverse with fixed=True)"""
+        was, now = (0, 1) if fixed else (1, 0)
+        rows = self._db.execute("""
+            SELECT c.case_id, c.input_text, c.test_type, o.output, g.detail
+            FROM grades b
+            JOIN grades g ON g.run_id = ? AND g.case_id = b.case_id
+            JOIN cases c ON c.case_id = b.case_id
+            LEFT JOIN outputs o ON o.run_id = g.run_id AND o.case_id = g.case_id
+            WHERE b.run_id = ? AND b.passed = ? AND g.passed = ?
+            ORDER BY c.test_type, c.case_id
+        """, (after, before, was, now)).fetchall()
+        return [{"case_id": case_id, "input_text": input_text, "test_type": test_type,
+                 "output": json.loads(output) if output else None, "detail": json.loads(detail) if detail else None}
+                for case_id, input_text, test_type, output, detail in rows]
+
+    def summary(self) -> Dict:
+        return {"enabled": self.enabled, "path": str(self.path), "runs": sorted(self._runs),
+                "rows_written": self.rows_written}
+
+    def print_summary(self) -> None:
+        if not self.enabled or not self._runs:
+            return
+        runs = ", ".join(f"#{run_id}" for run_id in sorted(self._runs))
+        print(f"\nResults warehouse: run {runs}, {self.rows_written} case rows in {self.path.name}")
+
+    def close(self) -> None:
+        if self._db is not None:
+            self.flush()
+            self._db.close()
+            self._db = None
+
+
+def add_warehouse_arguments(parser) -> None:
+    """Add the shared --warehouse/--no-warehouse options to an argparse parser"""
+    parser.add_argument("--warehouse", type=Path, default=None, metavar="PATH",
+                        help=f"results warehouse to write to (default: {DEFAULT_WAREHOUSE_PATH.name} in test/evals)")
+    parser.add_argument("--no-warehouse", action="store_true",
+                        help="don't record this run in the results warehouse")
+
+
+def print_runs(runs: List[Dict]) -> None:
+    print("%-6s | %-24s | %-14s | %-16s | %-16s | %-19s | %-10s" %
+          ("Run", "Label", "Model", "Prompt", "Dataset", "Started", "Pass"))
+    print("-" * 121)
+    for run in runs:
+        graded = f"{run['passed']}/{run['cases']}" if run["cases"] is not None else "running"
+        print("%-6s | %-24s | %-14s | %-16s | %-16s | %-19s | %-10s" % (
+            run["run_id"], run["label"][:24], run["model"][:14], run["prompt_hash"] or "-",
+            run["dataset_version"] or "-", run["started_at"][:19], graded))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the eval results warehouse")
+    parser.add_argument("--warehouse", type=Path, default=DEFAULT_WAREHOUSE_PATH, metavar="PATH")
+    commands = parser.add_subparsers(dest="command", required=True)
+    runs_parser = commands.add_parser("runs", help="list recent runs")
+    runs_parser.add_argument("--model")
+    runs_parser.add_argument("--label")
+    runs_parser.add_argument("--limit", type=int, default=20)
+    changes_parser = commands.add_parser("regressions", help="cases that passed in one run and fail in another")
+    changes_parser.add_argument("before", help="run id, label or prompt hash prefix (latest matching run)")
+    changes_parser.add_argument("after", help="run id, label or prompt hash prefix (latest matching run)")
+    changes_parser.add_argument("--model", help="only consider runs of this model")
+    changes_parser.add_argument("--fixed", action="store_true", help="list the cases that were fixed instead")
+    args = parser.parse_args()
+
+    if not args.warehouse.exists():
+        print(f"No results warehouse at {args.warehouse}")
+        exit(1)
+    warehouse = ResultsWarehouse(args.warehouse)
+    try:
+        if args.command == "runs":
+            print_runs(warehouse.runs(args.model, args.label, args.limit))
+            return
+        before, after = (warehouse.resolve_run(args.before, args.model),
+                         warehouse.resolve_run(args.after, args.model))
+        for spec, run_id in ((args.before, before), (args.after, after)):
+            if run_id is None:
+                print(f"No run matches {spec!r}" + (f" for {args.model}" if args.model else ""))
+                exit(1)
+        changed = warehouse.changes(before, after, fixed=args.fixed)
+        print(f"{'Fixed' if args.fixed else 'Regressed'} between run #{before} and run #{after}: {len(changed)} cases")
+        for case in changed:
+            print(f"  [{case['test_type']}] {case['input_text'][:70]}")
+            detail = case["detail"] or {}
+            if "expected_category" in detail:
+                entries = f" ({len(case['output'])} entries)" if isinstance(case["output"], list) else ""
+                print(f"      expected {detail.get('expected_category')}/{detail.get('expected_is_task')}, "
+                      f"got {detail.get('actual_category')}/{detail.get('actual_is_task')}{entries}")
+    finally:
+        warehouse.close()
+
+
+if __name__ == "__main__":
+    main()